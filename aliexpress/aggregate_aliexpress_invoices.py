@@ -2,11 +2,25 @@
 # Process a folder of AliExpress invoice PDFs and create a spreadsheet
 #
 # usage:
-#   python aggregate_aliexpress_invoices.py /path/to/folder [output.xlsx]
-#   python aggregate_aliexpress_invoices.py --by-fy /path/to/folder [output_dir]
+#   python aggregate_aliexpress_invoices.py /path/to/folder [-o output.xlsx] [--jobs N] [--force]
+#   python aggregate_aliexpress_invoices.py --by-fy /path/to/folder [-o output_dir] [--jobs N] [--force]
 #
 # options:
 #   --by-fy          Create one XLSX per financial year (FY spans Jul 1 - Jun 30)
+#   -j, --jobs N     Parse PDFs in N worker processes (default: 1, no pool)
+#   --force          Ignore the parse cache and re-parse every PDF
+#
+# Invoices are processed in three stages: every PDF is parsed (in parallel with
+# --jobs), exchange rates for all invoice dates are then prefetched (one
+# timeseries request per currency, or one request per date when that is fewer),
+# and finally all items are converted to AUD in one batch (convert_invoices):
+# one rate lookup per distinct (date, currency), joined onto the items, with
+# vectorised rounding, delivery pro-rating and totals. Workers only parse PDFs, so they never wait on the network.
+#
+# Parsed invoices (original-currency amounts, before conversion) are cached in
+# .aliexpress_invoice_cache.json in the folder, keyed by the PDF's SHA-256 and
+# the parser version. Reruns only parse new or changed PDFs; every invoice is
+# still converted afresh, so rate changes apply to cached invoices too.
 #
 # author:
 # Mark Cowley, 2025-12-01
@@ -14,10 +28,22 @@
 import os
 import sys
 import glob
+import json
+import hashlib
 import argparse
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from aliexpress2json import extract_invoice_data
+
+try:
+    from aliexpress2json import (PARSER_VERSION, convert_invoices, format_exchange_rate_stats,
+                                 invoice_number_from_filename, invoice_totals, parse_invoice, prefetch_exchange_rates)
+except ImportError:
+    from aliexpress.aliexpress2json import (PARSER_VERSION, convert_invoices, format_exchange_rate_stats,
+                                            invoice_number_from_filename, invoice_totals, parse_invoice,
+                                            prefetch_exchange_rates)
+
+INVOICE_CACHE_NAME = ".aliexpress_invoice_cache.json"
 
 def get_financial_year(date_str):
     """Determine the financial year (Jul 1 - Jun 30) for a given date.
@@ -37,7 +63,159 @@ def get_financial_year(date_str):
     except Exception:
         return None
 
-def process_folder(folder_path, output_file=None):
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_invoice_cache(folder_path):
+    """Return the folder's parse cache {sha256: {"parser_version", "file", "invoice", "error"}}."""
+    path = os.path.join(folder_path, INVOICE_CACHE_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable invoice cache {path}: {e}", file=sys.stderr)
+        return {}
+
+def save_invoice_cache(folder_path, cache):
+    """Write the parse cache atomically (temp file + os.replace)."""
+    path = os.path.join(folder_path, INVOICE_CACHE_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def parse_invoice_safe(pdf_path):
+    """Parse one PDF, returning (raw invoice, None) or (None, error message). Runs in worker processes."""
+    try:
+        return parse_invoice(pdf_path), None
+    except Exception as e:
+        return None, str(e)
+
+def cache_entry(pdf_path, invoice, error):
+    """Return the parse cache entry for a parse_invoice() result (or error) of pdf_path."""
+    return {"parser_version": PARSER_VERSION, "file": os.path.basename(pdf_path), "invoice": invoice, "error": error}
+
+def cached_invoice(cache, digest, pdf_path):
+    """Return the cached (invoice, error) for a PDF hash, or None if it must be parsed again."""
+    entry = cache.get(digest)
+    if not entry or entry.get("parser_version") != PARSER_VERSION:
+        return None
+    invoice = entry.get("invoice")
+    if invoice:
+        # The invoice number comes from the file name, which may have changed since it was cached
+        invoice_number = invoice_number_from_filename(pdf_path)
+        for item in invoice["items"]:
+            item["Invoice Number"] = invoice_number
+    return invoice, entry.get("error")
+
+def extract_invoices(pdf_files, jobs=1, cache=None):
+    """Parse, prefetch rates for and convert every PDF.
+
+    If cache is a dict (see load_invoice_cache), PDFs whose hash is cached for the
+    current parser version are not parsed again, and the cache is updated in
+    place to hold exactly the PDFs in pdf_files.
+
+    Returns (all_items, errors): a DataFrame of converted items in pdf_files
+    order (see convert_invoices) and one error entry per PDF that failed or had
+    no items.
+    """
+    parsed = [None] * len(pdf_files)
+    digests = [None] * len(pdf_files)
+    if cache is not None:
+        for i, pdf_path in enumerate(pdf_files):
+            digests[i] = file_sha256(pdf_path)
+            parsed[i] = cached_invoice(cache, digests[i], pdf_path)
+        hits = sum(result is not None for result in parsed)
+        if hits:
+            print(f"Reusing {hits} cached invoice(s) from {INVOICE_CACHE_NAME}")
+
+    todo = [i for i, result in enumerate(parsed) if result is None]
+    todo_files = [pdf_files[i] for i in todo]
+    if jobs and jobs > 1 and len(todo_files) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # map() yields results in input order
+            results = list(executor.map(parse_invoice_safe, todo_files, chunksize=max(1, len(todo_files) // (jobs * 4))))
+    else:
+        results = [parse_invoice_safe(pdf_path) for pdf_path in todo_files]
+    for i, result in zip(todo, results):
+        parsed[i] = result
+
+    if cache is not None:
+        entries = {}
+        for pdf_path, digest, (invoice, error) in zip(pdf_files, digests, parsed):
+            entries[digest] = cache_entry(pdf_path, invoice, error)
+        cache.clear()
+        cache.update(entries)
+
+    requests_made = prefetch_exchange_rates(
+        [(invoice["invoice_date"], invoice["currency"]) for invoice, _ in parsed if invoice and invoice["items"]])
+    if requests_made:
+        print(f"Prefetched exchange rates with {requests_made} API request(s)")
+
+    invoices = []
+    errors = []
+    for pdf_path, (invoice, error) in zip(pdf_files, parsed):
+        filename = os.path.basename(pdf_path)
+        print(f"Processing: {filename}...", end=" ")
+
+        if error is not None:
+            print(f"ERROR: {error}")
+            errors.append(f"{filename}: {error}")
+            continue
+
+        if not invoice.get("items"):
+            print(f"WARNING: No items found")
+            errors.append(f"{filename}: No items found")
+            continue
+
+        invoices.append(invoice)
+        print(f"✓ {len(invoice['items'])} item(s)")
+
+    # Convert every item in one batch
+    all_items = convert_invoices(invoices)
+    print(f"Exchange rates: {format_exchange_rate_stats()}")
+    return all_items, errors
+
+def fy_workbook_path(output_dir, fy):
+    """Per-financial-year spreadsheet: AliExpress Transactions FY2025.xlsx."""
+    return os.path.join(output_dir, f"AliExpress Transactions FY{fy}.xlsx")
+
+def append_to_fy_workbooks(items, output_dir):
+    """Add converted items to the per-financial-year spreadsheets in output_dir, creating them as needed.
+
+    Rows already in a workbook for the same invoice numbers are replaced, so
+    importing an invoice twice does not duplicate it. Returns {fy: workbook path}.
+    """
+    df = pd.DataFrame(items)
+    df["Invoice Date"] = pd.to_datetime(df["Invoice Date"], errors="coerce")
+    df["Financial Year"] = df["Invoice Date"].apply(lambda x: get_financial_year(x) if pd.notna(x) else None)
+
+    written = {}
+    for fy, fy_df in df.groupby("Financial Year", sort=True):
+        fy = int(fy)
+        fy_df = fy_df.drop(columns=["Financial Year"])
+        output_file = fy_workbook_path(output_dir, fy)
+        if os.path.exists(output_file):
+            existing = pd.read_excel(output_file, sheet_name="transactions", dtype={"Invoice Number": str})
+            existing["Invoice Date"] = pd.to_datetime(existing["Invoice Date"], errors="coerce")
+            existing = existing[~existing["Invoice Number"].isin(fy_df["Invoice Number"].astype(str))]
+            fy_df = pd.concat([existing, fy_df], ignore_index=True)
+        fy_df = fy_df.sort_values(["Invoice Date", "Invoice Number"], na_position="last")
+        fy_df["Invoice Date"] = fy_df["Invoice Date"].dt.strftime("%Y-%m-%d")
+        fy_df.to_excel(output_file, sheet_name="transactions", index=False)
+        written[fy] = output_file
+    if df["Financial Year"].isna().any():
+        print("  Skipping items with invalid dates")
+    return written
+
+def process_folder(folder_path, output_file=None, jobs=1, use_cache=True):
     """Process all PDF files in a folder and create a spreadsheet."""
     if not os.path.isdir(folder_path):
         print(f"Error: Folder not found: {folder_path}")
@@ -53,32 +231,12 @@ def process_folder(folder_path, output_file=None):
     
     print(f"Found {len(pdf_files)} PDF file(s)")
     
-    all_items = []
-    errors = []
-    
-    # Process each PDF
-    for pdf_path in sorted(pdf_files):
-        filename = os.path.basename(pdf_path)
-        print(f"Processing: {filename}...", end=" ")
-        
-        try:
-            data = extract_invoice_data(pdf_path)
-            
-            if not data.get("items"):
-                print(f"WARNING: No items found")
-                errors.append(f"{filename}: No items found")
-                continue
-            
-            # Add all items to the list
-            all_items.extend(data["items"])
-            print(f"✓ {len(data['items'])} item(s)")
-            
-        except Exception as e:
-            print(f"ERROR: {str(e)}")
-            errors.append(f"{filename}: {str(e)}")
-            continue
+    # Process each PDF (reusing cached parses unless use_cache is False, which rebuilds the cache)
+    cache = load_invoice_cache(folder_path) if use_cache else {}
+    all_items, errors = extract_invoices(sorted(pdf_files), jobs, cache)
+    save_invoice_cache(folder_path, cache)
     
-    if not all_items:
+    if all_items.empty:
         print("\nNo items found in any PDF files.")
         if errors:
             print("\nErrors encountered:")
@@ -86,8 +244,7 @@ def process_folder(folder_path, output_file=None):
                 print(f"  - {error}")
         sys.exit(1)
     
-    # Create DataFrame
-    df = pd.DataFrame(all_items)
+    df = all_items
     
     # Sort by invoice date (oldest to newest), then by invoice number for consistency
     if "Invoice Date" in df.columns:
@@ -110,14 +267,17 @@ def process_folder(folder_path, output_file=None):
     
     print(f"\n✓ Spreadsheet created: {output_file}")
     print(f"  Total items: {len(df)}")
-    print(f"  Total invoices: {df['Invoice Number'].nunique()}")
+    # Totals are per source PDF (the index), so two PDFs with the same invoice number both count
+    totals = invoice_totals(df)
+    print(f"  Total invoices: {len(totals)}")
+    print(f"  Total AUD: {totals.sum():.2f}")
     
     if errors:
         print(f"\n⚠ {len(errors)} error(s) encountered:")
         for error in errors:
             print(f"  - {error}")
 
-def process_folder_by_fy(folder_path, output_dir=None):
+def process_folder_by_fy(folder_path, output_dir=None, jobs=1, use_cache=True):
     """Process all PDF files in a folder and create separate spreadsheets per financial year."""
     if not os.path.isdir(folder_path):
         print(f"Error: Folder not found: {folder_path}")
@@ -138,32 +298,12 @@ def process_folder_by_fy(folder_path, output_dir=None):
     
     print(f"Found {len(pdf_files)} PDF file(s)")
     
-    all_items = []
-    errors = []
-    
-    # Process each PDF
-    for pdf_path in sorted(pdf_files):
-        filename = os.path.basename(pdf_path)
-        print(f"Processing: {filename}...", end=" ")
-        
-        try:
-            data = extract_invoice_data(pdf_path)
-            
-            if not data.get("items"):
-                print(f"WARNING: No items found")
-                errors.append(f"{filename}: No items found")
-                continue
-            
-            # Add all items to the list
-            all_items.extend(data["items"])
-            print(f"✓ {len(data['items'])} item(s)")
-            
-        except Exception as e:
-            print(f"ERROR: {str(e)}")
-            errors.append(f"{filename}: {str(e)}")
-            continue
+    # Process each PDF (reusing cached parses unless use_cache is False, which rebuilds the cache)
+    cache = load_invoice_cache(folder_path) if use_cache else {}
+    all_items, errors = extract_invoices(sorted(pdf_files), jobs, cache)
+    save_invoice_cache(folder_path, cache)
     
-    if not all_items:
+    if all_items.empty:
         print("\nNo items found in any PDF files.")
         if errors:
             print("\nErrors encountered:")
@@ -171,8 +311,7 @@ def process_folder_by_fy(folder_path, output_dir=None):
                 print(f"  - {error}")
         sys.exit(1)
     
-    # Create DataFrame
-    df = pd.DataFrame(all_items)
+    df = all_items
     
     # Convert invoice date to datetime
     if "Invoice Date" in df.columns:
@@ -207,12 +346,12 @@ def process_folder_by_fy(folder_path, output_dir=None):
         fy_df = fy_df.drop(columns=["Financial Year"])
         
         # Create output filename: AliExpress Transactions FY2025.xlsx
-        output_file = os.path.join(output_dir, f"AliExpress Transactions FY{fy}.xlsx")
+        output_file = fy_workbook_path(output_dir, fy)
         fy_df.to_excel(output_file, sheet_name="transactions", index=False)
         
         print(f"  ✓ FY{fy} ({fy_df['Invoice Date'].min()} to {fy_df['Invoice Date'].max()})")
         print(f"    {output_file}")
-        print(f"    Total items: {len(fy_df)}, Total invoices: {fy_df['Invoice Number'].nunique()}")
+        print(f"    Total items: {len(fy_df)}, Total invoices: {fy_df.index.nunique()}")
     
     if errors:
         print(f"\n⚠ {len(errors)} error(s) encountered:")
@@ -242,10 +381,23 @@ if __name__ == "__main__":
         help="Create one XLSX per financial year (FY spans Jul 1 - Jun 30)"
     )
     
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Parse PDFs in this many worker processes (default: 1)"
+    )
+    
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help=f"Ignore {INVOICE_CACHE_NAME} and re-parse every PDF"
+    )
+    
     args = parser.parse_args()
     
     if args.by_fy:
-        process_folder_by_fy(args.folder, args.output)
+        process_folder_by_fy(args.folder, args.output, args.jobs, not args.force)
     else:
-        process_folder(args.folder, args.output)
+        process_folder(args.folder, args.output, args.jobs, not args.force)
 
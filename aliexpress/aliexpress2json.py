@@ -10,6 +10,9 @@
 #   2. Create a .env file in the same folder as this script
 #   3. Add the following line to .env:
 #      API_KEY=your_api_key_here
+#   4. Optionally set EXCHANGE_RATE_API_URL to use a different API host
+#   5. Optionally limit API use with EXCHANGE_RATE_RATE_LIMIT (requests/sec)
+#      and EXCHANGE_RATE_BUDGET (most requests per run)
 #
 # Usage:
 #   python aliexpress2json.py /path/to/invoice.pdf [--debug]
@@ -20,7 +23,11 @@
 # Output:
 #   - Prints JSON to stdout
 #   - Saves JSON file with same name as PDF (e.g., invoice.pdf -> invoice.json)
-#   - Caches exchange rates in exchange_rate_cache.json to avoid repeated API calls
+#   - Caches exchange rates in exchange_rate_cache.sqlite to avoid repeated API calls
+#     (each rate is saved as soon as it is fetched; set EXCHANGE_RATE_DB to use another file;
+#     an existing exchange_rate_cache.json is imported the first time)
+#   - Uses an offline historical rate table instead of the API where it has the date
+#     (build one from RBA F11 CSVs with: python exchange_rates.py import-rba f11.1-data.csv)
 #
 # Features:
 #   - Extracts all items from invoice
@@ -36,47 +43,388 @@ import re
 import sys
 import fitz  # PyMuPDF
 import json
+import numpy as np
+import pandas as pd
+import threading
+from bisect import bisect_right
 from datetime import datetime, timedelta
-import requests
-from dotenv import load_dotenv
 
-# Load API key from .env
-load_dotenv()
-ACCESS_KEY = os.getenv("API_KEY")
-if not ACCESS_KEY:
-    raise ValueError("API_KEY not found. Please create a .env file with API_KEY=your_api_key_here")
+try:
+    from exchange_rates import (AsyncExchangeRateResolver, ExchangeRateCache, ExchangeRateResolver,
+                                ExchangeRateStore, OfflineRateTable, RequestBudgetExceeded, make_cache_key,
+                                timeseries_windows)
+except ImportError:
+    from aliexpress.exchange_rates import (AsyncExchangeRateResolver, ExchangeRateCache, ExchangeRateResolver,
+                                           ExchangeRateStore, OfflineRateTable, RequestBudgetExceeded,
+                                           make_cache_key, timeseries_windows)
 
-# Debug flag
-DEBUG = "--debug" in sys.argv
+# Nothing below touches .env, the API key or the rate store at import time. They
+# are loaded on first use (see get_access_key, get_rate_store and
+# get_exchange_rate_cache), so importing this module for PDF parsing, or
+# converting with rates that are already cached, never needs an API key.
+# ACCESS_KEY, rate_store, exchange_rate_cache and offline_rates can still be read
+# (or replaced) as module attributes; module __getattr__ loads them on first access.
+
+# Debug flag (set by --debug when run as a script)
+DEBUG = False
 
 # Exchange rate scaling factor to adjust for real-world pricing differences
 # Based on comparison with actual AliExpress charges
 EXCHANGE_RATE_SCALE_FACTOR = 1.0165  # ~1.65% increase
 
+# Exchange rate API base URL (None: EXCHANGE_RATE_API_URL from the environment/.env, else exchangerate.host)
+API_BASE_URL = None
+DEFAULT_API_BASE_URL = "https://api.exchangerate.host"
+
 # Script directory
 SCRIPT_DIR = os.path.dirname(__file__)
 
-# Exchange rate cache file (stored next to this script)
+# Legacy exchange rate cache file (stored next to this script); imported into the store once
 CACHE_FILE = os.path.join(SCRIPT_DIR, "exchange_rate_cache.json")
 
-# Load existing cache if available
-if os.path.exists(CACHE_FILE):
-    try:
-        with open(CACHE_FILE, "r") as f:
-            exchange_rate_cache = json.load(f)
-    except Exception:
-        exchange_rate_cache = {}
-else:
-    exchange_rate_cache = {}
+# Durable SQLite store of fetched rates, shared safely by concurrent processes
+# (None: EXCHANGE_RATE_DB from the environment/.env, else exchange_rate_cache.sqlite next to this script)
+RATE_STORE_FILE = None
+
+# Offline historical rate table built by `exchange_rates.py import-rba`, consulted before any HTTP
+# (None: EXCHANGE_RATE_OFFLINE from the environment/.env, else offline_rates.npz next to this script)
+OFFLINE_RATES_FILE = None
+
+# Offline rates are used for dates up to this many days from the nearest table date (weekends, holidays)
+OFFLINE_MAX_DAYS = 7
+
+# Optional rate store limits applied when the cache is first loaded (None: no limit).
+# Also settable with EXCHANGE_RATE_KEEP_DAYS / EXCHANGE_RATE_MAX_ROWS.
+RATE_STORE_KEEP_DAYS = None
+RATE_STORE_MAX_ROWS = None
+
+# API request limits for the shared resolver (None: no limit): requests per second (token
+# bucket, bursts of up to RATE_LIMIT_BURST) and the most requests one run may send.
+# Also settable with EXCHANGE_RATE_RATE_LIMIT / EXCHANGE_RATE_BUDGET.
+RATE_LIMIT = None
+RATE_LIMIT_BURST = None
+REQUEST_BUDGET = None
+
+_UNSET = object()
+_lazy_lock = threading.RLock()
+_env_loaded = False
+_missing_key_warned = False
+_fallback_warned = set()
+
+# How get_exchange_rate() lookups were answered this run (see exchange_rate_stats)
+RATE_SOURCES = ("cache", "offline", "nearest cached", "api", "latest cached", "default")
+_lookup_stats = dict.fromkeys(RATE_SOURCES, 0)
+_stats_lock = threading.Lock()
 
 def log_debug(message):
     if DEBUG:
         print(f"[DEBUG] {message}")
 
+def load_env():
+    """Load .env into the environment (once)."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def get_access_key():
+    """Return the exchangerate.host API key from API_KEY in the environment or .env, or None."""
+    with _lazy_lock:
+        key = globals().get("ACCESS_KEY", _UNSET)
+        if key is _UNSET:
+            load_env()
+            key = os.getenv("API_KEY") or None
+            globals()["ACCESS_KEY"] = key
+        return key
+
+def get_api_base_url():
+    if API_BASE_URL:
+        return API_BASE_URL
+    load_env()
+    return os.getenv("EXCHANGE_RATE_API_URL", DEFAULT_API_BASE_URL)
+
+def get_rate_store():
+    """Return the shared ExchangeRateStore (opened on first use)."""
+    with _lazy_lock:
+        store = globals().get("rate_store")
+        if store is None:
+            path = RATE_STORE_FILE
+            if not path:
+                load_env()
+                path = os.getenv("EXCHANGE_RATE_DB", os.path.join(SCRIPT_DIR, "exchange_rate_cache.sqlite"))
+            store = ExchangeRateStore(path)
+            globals()["rate_store"] = store
+        return store
+
+def load_exchange_rate_cache(store, legacy_json=None, keep_days=None, max_rows=None):
+    """Open the rate store (importing the legacy JSON cache into a new store) and load it into memory.
+
+    Rates with a known raw rate are loaded at the current EXCHANGE_RATE_SCALE_FACTOR,
+    so changing the factor takes effect without refetching. keep_days / max_rows
+    prune and bound the store first. ExchangeRateCache is a dict that also keeps a
+    sorted date list per currency, so nearest/most-recent lookups are bisects.
+    """
+    try:
+        is_new = not os.path.exists(store.path)
+        if is_new and legacy_json and os.path.exists(legacy_json):
+            store.import_json(legacy_json)
+        if keep_days is not None:
+            store.prune(keep_days)
+        if max_rows is not None:
+            store.evict(max_rows)
+        return ExchangeRateCache(store.load(scale_factor=EXCHANGE_RATE_SCALE_FACTOR))
+    except Exception as e:
+        print(f"Warning: could not load exchange rate store {store.path}: {e}", file=sys.stderr)
+        return ExchangeRateCache()
+
+def _env_int(name):
+    value = os.getenv(name)
+    try:
+        return int(value) if value else None
+    except ValueError:
+        print(f"Warning: ignoring non-integer {name}={value}", file=sys.stderr)
+        return None
+
+def _env_float(name):
+    value = os.getenv(name)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        print(f"Warning: ignoring non-numeric {name}={value}", file=sys.stderr)
+        return None
+
+def get_exchange_rate_cache():
+    """Return the in-memory exchange rate cache, loading it from the store on first use."""
+    with _lazy_lock:
+        cache = globals().get("exchange_rate_cache")
+        if cache is None:
+            load_env()
+            keep_days = RATE_STORE_KEEP_DAYS if RATE_STORE_KEEP_DAYS is not None else _env_int("EXCHANGE_RATE_KEEP_DAYS")
+            max_rows = RATE_STORE_MAX_ROWS if RATE_STORE_MAX_ROWS is not None else _env_int("EXCHANGE_RATE_MAX_ROWS")
+            cache = load_exchange_rate_cache(get_rate_store(), CACHE_FILE, keep_days, max_rows)
+            globals()["exchange_rate_cache"] = cache
+        return cache
+
+def get_offline_rates():
+    """Return the OfflineRateTable if one has been built, else None (loaded on first use)."""
+    with _lazy_lock:
+        table = globals().get("offline_rates", _UNSET)
+        if table is _UNSET:
+            path = OFFLINE_RATES_FILE
+            if not path:
+                load_env()
+                path = os.getenv("EXCHANGE_RATE_OFFLINE", os.path.join(SCRIPT_DIR, "offline_rates.npz"))
+            table = None
+            if os.path.exists(path):
+                try:
+                    table = OfflineRateTable.load(path)
+                except Exception as e:
+                    print(f"Warning: could not load offline rate table {path}: {e}", file=sys.stderr)
+            globals()["offline_rates"] = table
+        return table
+
+def offline_rate(date_str, currency):
+    """Return (scaled rate, rate date) from the offline table, or (None, None)."""
+    table = get_offline_rates()
+    if table is None:
+        return None, None
+    rate, rate_date = table.lookup(date_str, currency, max_days=OFFLINE_MAX_DAYS)
+    if rate is None:
+        return None, None
+    return rate * EXCHANGE_RATE_SCALE_FACTOR, rate_date
+
+def __getattr__(name):
+    # Lazily loaded module attributes (PEP 562)
+    if name == "ACCESS_KEY":
+        return get_access_key()
+    if name == "rate_store":
+        return get_rate_store()
+    if name == "exchange_rate_cache":
+        return get_exchange_rate_cache()
+    if name == "offline_rates":
+        return get_offline_rates()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def cache_fetched_rate(date_str, currency, raw_rate, source="api"):
+    """Scale a freshly fetched rate, add it to the in-memory cache and persist it (with provenance) straight away.
+
+    Returns the scaled rate.
+    """
+    rate = raw_rate * EXCHANGE_RATE_SCALE_FACTOR
+    get_exchange_rate_cache()[make_cache_key(date_str, currency)] = rate
+    try:
+        get_rate_store().put(date_str, currency, raw_rate, EXCHANGE_RATE_SCALE_FACTOR, source=source)
+    except Exception as e:
+        log_debug(f"Failed to persist exchange rate {currency} on {date_str}: {e}")
+    return rate
+
+# Shared HTTP resolver (pooled session, timeouts, retries), created on first use
+_resolver = None
+
+def get_resolver():
+    """Return the shared ExchangeRateResolver, or None (with a warning, once) if there is no API key.
+
+    The resolver is recreated if the API key or base URL has changed.
+    """
+    global _resolver, _missing_key_warned
+    access_key = get_access_key()
+    if not access_key:
+        if not _missing_key_warned:
+            print("Warning: API_KEY not found, so exchange rates can only come from the cache. "
+                  "Create a .env file with API_KEY=your_api_key_here to fetch missing rates.", file=sys.stderr)
+            _missing_key_warned = True
+        return None
+    base_url = get_api_base_url()
+    with _lazy_lock:
+        if _resolver is None or _resolver.base_url != base_url or _resolver.access_key != access_key:
+            if _resolver is not None:
+                _resolver.close()
+            rate_limit = RATE_LIMIT if RATE_LIMIT is not None else _env_float("EXCHANGE_RATE_RATE_LIMIT")
+            budget = REQUEST_BUDGET if REQUEST_BUDGET is not None else _env_int("EXCHANGE_RATE_BUDGET")
+            _resolver = ExchangeRateResolver(access_key, base_url, log=log_debug, rate_limit=rate_limit,
+                                             burst=RATE_LIMIT_BURST, budget=budget)
+        return _resolver
+
+def _count_lookup(source):
+    with _stats_lock:
+        _lookup_stats[source] += 1
+
+def exchange_rate_stats():
+    """Return this run's rate lookup counts by source plus the resolver's request counts."""
+    with _stats_lock:
+        stats = dict(_lookup_stats)
+    resolver = _resolver
+    requests_stats = dict(resolver.stats) if resolver is not None else {}
+    stats["requests"] = requests_stats.get("requests", 0)
+    stats["retries"] = requests_stats.get("retries", 0)
+    stats["throttled"] = requests_stats.get("throttled", 0)
+    stats["over_budget"] = requests_stats.get("over_budget", 0)
+    return stats
+
+def format_exchange_rate_stats(stats=None):
+    """One-line summary of exchange_rate_stats(), e.g. "3 API request(s) for 40 lookup(s): 37 cache, 3 api"."""
+    stats = stats or exchange_rate_stats()
+    lookups = sum(stats[source] for source in RATE_SOURCES)
+    summary = f"{stats['requests']} API request(s) for {lookups} lookup(s)"
+    answered = [f"{stats[source]} {source}" for source in RATE_SOURCES if stats[source]]
+    if answered:
+        summary += ": " + ", ".join(answered)
+    extras = [f"{stats[name]} {label}" for name, label in
+              (("retries", "retried"), ("throttled", "throttled (429)"), ("over_budget", "refused by the request budget"))
+              if stats[name]]
+    if extras:
+        summary += " (" + ", ".join(extras) + ")"
+    return summary
+
+def warn_fallback(currency, message):
+    """Print a fallback-rate warning to stderr once per currency."""
+    if currency not in _fallback_warned:
+        _fallback_warned.add(currency)
+        print(f"Warning: {message}", file=sys.stderr)
+
+# Coalesces concurrent API lookups of the same (date, currency), created on first use
+_async_resolver = None
+
+def get_async_resolver():
+    global _async_resolver
+    if _async_resolver is None:
+        _async_resolver = AsyncExchangeRateResolver(fetch_exchange_rate)
+    return _async_resolver
+
+def cached_or_stored_rate(date_str, currency):
+    """Return the rate for exactly this (date, currency) from the cache or the store, or None.
+
+    The store is checked because another process may have fetched the rate since
+    this one loaded its cache.
+    """
+    cache = get_exchange_rate_cache()
+    cache_key = make_cache_key(date_str, currency)
+    if cache_key in cache:
+        return cache[cache_key]
+    try:
+        stored = get_rate_store().get(date_str, currency, scale_factor=EXCHANGE_RATE_SCALE_FACTOR)
+    except Exception as e:
+        stored = None
+        log_debug(f"Exchange rate store lookup failed: {e}")
+    if stored is not None:
+        cache[cache_key] = stored
+    return stored
+
+def fetch_exchange_rate(date_str, currency):
+    """Fetch and cache a rate from the API: exact date, then the nearest of +-7 days.
+
+    Returns (rate, rate_date), or (None, None) if the API has nothing. Runs via the
+    async resolver, so concurrent requests for the same (date, currency) share one fetch.
+    """
+    # An identical lookup that finished just before this one may already have cached it
+    stored = cached_or_stored_rate(date_str, currency)
+    if stored is not None:
+        return stored, date_str
+
+    resolver = get_resolver()
+    if resolver is None:
+        return None, None
+    # Try the exchangerate.host convert API for the exact date first
+    try:
+        # Apply scaling factor to adjust for real-world pricing
+        rate = cache_fetched_rate(date_str, currency, resolver.fetch_rate(date_str, currency))
+        log_debug(f"Exchange rate for {currency} on {date_str}: {rate} (scaled by {EXCHANGE_RATE_SCALE_FACTOR}, cached)")
+        return rate, date_str
+    except RequestBudgetExceeded as e:
+        warn_fallback("budget", f"{e}; further rates come from the cache only")
+        return None, None
+    except Exception as e:
+        log_debug(f"Exchange rate fetch failed: {e}")
+
+    # If the API failed for the exact date, probe outward from it (up to 7 days either side)
+    # and use the nearest date that has a rate
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None, None
+    rate, try_date = resolver.probe_nearest(date_str, currency, max_days=7)
+    if rate is not None:
+        # Cached under the date the rate is actually for, not the requested date
+        rate = cache_fetched_rate(try_date, currency, rate, source="fallback")
+        log_debug(f"Exchange rate for {currency} on {try_date}: {rate} (from API fallback, cached)")
+    return rate, try_date
+
+def fetch_exchange_rates_for_date(date_str, currencies):
+    """Fetch and cache several currencies' rates for one date with a single API request.
+
+    Returns {currency: (rate, date_str)} for the currencies found, including any
+    already cached; get_exchange_rate() falls back to fetch_exchange_rate() for
+    the rest. Raises RequestBudgetExceeded if the request would exceed the budget.
+    """
+    found = {}
+    missing = []
+    for currency in currencies:
+        stored = cached_or_stored_rate(date_str, currency)
+        if stored is not None:
+            found[currency] = (stored, date_str)
+        else:
+            missing.append(currency)
+    resolver = get_resolver() if missing else None
+    if resolver is None:
+        return found
+    try:
+        raw_rates = resolver.fetch_rates_for_date(date_str, missing)
+    except RequestBudgetExceeded:
+        raise
+    except Exception as e:
+        log_debug(f"Exchange rate batch fetch failed for {', '.join(missing)} on {date_str}: {e}")
+        return found
+    for currency, raw_rate in raw_rates.items():
+        rate = cache_fetched_rate(date_str, currency, raw_rate, source="historical")
+        log_debug(f"Exchange rate for {currency} on {date_str}: {rate} (batch of {len(missing)}, cached)")
+        found[currency] = (rate, date_str)
+    return found
+
 def get_exchange_rate(date_str, currency, return_date=False):
     """Fetch historical exchange rate to AUD for given currency and date, with caching."""
     if not currency or currency == "AUD":
-        return 1.0
+        return (1.0, date_str) if return_date else 1.0
     
     # Normalize date string
     try:
@@ -86,393 +434,637 @@ def get_exchange_rate(date_str, currency, return_date=False):
         date_obj = None
 
     # Check cache first for exact date
+    exchange_rate_cache = get_exchange_rate_cache()
     cache_key = f"{date_str}_{currency}"
     if cache_key in exchange_rate_cache:
         cached_rate = exchange_rate_cache[cache_key]
         log_debug(f"Exchange rate for {currency} on {date_str}: {cached_rate} (from cache)")
+        _count_lookup("cache")
         return (cached_rate, date_str) if return_date else cached_rate
 
+    # Then the offline historical table, if one has been imported
+    if date_obj:
+        offline, offline_date = offline_rate(date_str, currency)
+        if offline is not None:
+            log_debug(f"Exchange rate for {currency} on {date_str}: {offline} (offline table, {offline_date})")
+            _count_lookup("offline")
+            return (offline, offline_date) if return_date else offline
+
     # If no exact cached rate, look for a nearby cached rate for the currency
     nearest_cached_rate = None
     nearest_cached_date = None
     if date_obj:
-        best_diff = None
-        for key, value in exchange_rate_cache.items():
-            if not key.endswith(f"_{currency}"):
-                continue
-            # key format: YYYY-MM-DD_CURRENCY
-            try:
-                k_date_str = key.split("_")[0]
-                k_date = datetime.strptime(k_date_str, "%Y-%m-%d")
-                diff = abs((k_date - date_obj).days)
-                if best_diff is None or diff < best_diff:
-                    best_diff = diff
-                    nearest_cached_rate = value
-                    nearest_cached_date = k_date_str
-            except Exception:
-                continue
+        nearest_cached_rate, nearest_cached_date = exchange_rate_cache.nearest(date_str, currency)
         if nearest_cached_rate is not None:
             log_debug(f"No exact exchange rate cached for {currency} on {date_str}; using nearest cached {nearest_cached_date} rate {nearest_cached_rate}")
+            _count_lookup("nearest cached")
             return (nearest_cached_rate, nearest_cached_date) if return_date else nearest_cached_rate
     
-    # Use exchangerate.host convert API with access key
-    # Convert 1 unit to get the exchange rate
-    url = f"https://api.exchangerate.host/convert?from={currency}&to=AUD&date={date_str}&amount=1&access_key={ACCESS_KEY}"
-    # Try API call for the exact date first
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("success", False):
-                # The result is the converted amount (1 unit * rate = rate)
-                rate = data.get("result", 1.0)
-                # Apply scaling factor to adjust for real-world pricing
-                rate = rate * EXCHANGE_RATE_SCALE_FACTOR
-                # Cache the result
-                exchange_rate_cache[cache_key] = rate
-                log_debug(f"Exchange rate for {currency} on {date_str}: {rate} (scaled by {EXCHANGE_RATE_SCALE_FACTOR}, cached)")
-                return (rate, date_str) if return_date else rate
-            else:
-                log_debug(f"Exchange rate API returned success=false: {data}")
-    except Exception as e:
-        log_debug(f"Exchange rate fetch failed: {e}")
-    
-    # If the API failed for the exact date, try surrounding dates (up to 7 days) to find a usable rate
-    if date_obj:
-        for offset in range(1, 8):
-            for sign in (1, -1):
-                try_date = (date_obj + timedelta(days=sign * offset)).strftime("%Y-%m-%d")
-                try_key = f"{try_date}_{currency}"
-                # First use any cached nearby date
-                if try_key in exchange_rate_cache:
-                    cached_rate = exchange_rate_cache[try_key]
-                    log_debug(f"Using cached rate for {currency} on {try_date} (nearest to requested {date_str}): {cached_rate}")
-                    return (cached_rate, try_date) if return_date else cached_rate
-                # Otherwise try API for that date
-                url2 = f"https://api.exchangerate.host/convert?from={currency}&to=AUD&date={try_date}&amount=1&access_key={ACCESS_KEY}"
-                try:
-                    resp2 = requests.get(url2)
-                    if resp2.status_code == 200:
-                        data2 = resp2.json()
-                        if data2.get("success", False):
-                            rate2 = data2.get("result", 1.0) * EXCHANGE_RATE_SCALE_FACTOR
-                            exchange_rate_cache[try_key] = rate2
-                            log_debug(f"Exchange rate for {currency} on {try_date}: {rate2} (from API fallback, cached)")
-                            return (rate2, try_date) if return_date else rate2
-                except Exception as e:
-                    log_debug(f"Exchange rate fetch failed for fallback date {try_date}: {e}")
+    # Not cached: ask the API (identical concurrent lookups share one request)
+    rate, rate_date = get_async_resolver().resolve_sync(date_str, currency)
+    if rate is not None:
+        _count_lookup("api")
+        return (rate, rate_date) if return_date else rate
 
     # Try to use any existing cached rate for this currency (most recent)
-    last_cached_rate = None
-    last_cached_date = None
-    for key, value in exchange_rate_cache.items():
-        if not key.endswith(f"_{currency}"):
-            continue
-        k_date_str = key.split("_")[0]
-        if last_cached_date is None or k_date_str > last_cached_date:
-            last_cached_date = k_date_str
-            last_cached_rate = value
+    last_cached_rate, last_cached_date = exchange_rate_cache.latest(currency)
     if last_cached_rate is not None:
         log_debug(f"Using most recent cached rate for {currency} (date {last_cached_date}): {last_cached_rate}")
+        warn_fallback(currency, f"no {currency} rate available for {date_str}; using the most recent cached rate "
+                                f"({last_cached_date}) for this and any other missing {currency} dates")
+        _count_lookup("latest cached")
         return (last_cached_rate, last_cached_date) if return_date else last_cached_rate
 
     # As a final resort, fallback to 1.0 and log a warning
     log_debug(f"Using fallback exchange rate of 1.0 for {currency}")
+    warn_fallback(currency, f"no {currency} rate available for {date_str}; using 1.0 for this and any other missing {currency} dates")
+    _count_lookup("default")
     return (1.0, None) if return_date else 1.0
 
+def prefetch_exchange_rates(date_currency_pairs):
+    """Fill the cache for many (date, currency) pairs in as few API requests as possible.
+
+    Dates already cached are skipped. The rest are fetched either with one
+    timeseries request per currency, as padded date ranges (see
+    timeseries_windows) so the nearby dates get_exchange_rate() falls back to
+    are cached too, or with one multi-currency request per date (see
+    fetch_exchange_rates_for_date), whichever takes fewer requests; a folder
+    mixing currencies on a few dates takes the second. Returns the number of
+    API requests made; failures are logged and left for get_exchange_rate() to retry.
+    """
+    exchange_rate_cache = get_exchange_rate_cache()
+    needed = {}
+    for date_str, currency in date_currency_pairs:
+        if not date_str or not currency or currency == "AUD":
+            continue
+        if make_cache_key(date_str, currency) in exchange_rate_cache:
+            continue
+        if offline_rate(date_str, currency)[0] is not None:
+            continue
+        needed.setdefault(currency, set()).add(date_str)
+
+    resolver = get_resolver() if needed else None
+    if resolver is None:
+        return 0
+
+    windows = {currency: timeseries_windows(sorted(dates)) for currency, dates in needed.items()}
+    by_date = {}
+    for currency, dates in needed.items():
+        for date_str in dates:
+            by_date.setdefault(date_str, []).append(currency)
+    if len(by_date) < sum(map(len, windows.values())):
+        return prefetch_by_date(by_date)
+
+    requests_made = 0
+    for currency in sorted(needed):
+        for start_date, end_date in windows[currency]:
+            requests_made += 1
+            try:
+                rates = resolver.fetch_timeseries(currency, start_date, end_date)
+            except RequestBudgetExceeded as e:
+                warn_fallback("budget", f"{e}; further rates come from the cache only")
+                return requests_made - 1
+            except Exception as e:
+                log_debug(f"Exchange rate timeseries fetch failed for {currency} {start_date} to {end_date}: {e}")
+                continue
+            new_rates = [(day, currency, raw_rate) for day, raw_rate in rates.items()
+                         if make_cache_key(day, currency) not in exchange_rate_cache]
+            for day, _, raw_rate in new_rates:
+                exchange_rate_cache[make_cache_key(day, currency)] = raw_rate * EXCHANGE_RATE_SCALE_FACTOR
+            try:
+                get_rate_store().put_many(new_rates, EXCHANGE_RATE_SCALE_FACTOR, source="timeseries", replace=False)
+            except Exception as e:
+                log_debug(f"Failed to persist prefetched {currency} rates: {e}")
+            log_debug(f"Prefetched {len(rates)} {currency} rate(s) for {start_date} to {end_date}")
+    return requests_made
+
+def prefetch_by_date(currencies_by_date):
+    """Fetch {date: [currency, ...]} with one multi-currency request per date; returns the request count."""
+    requests_made = 0
+    for date_str in sorted(currencies_by_date):
+        requests_made += 1
+        try:
+            found = fetch_exchange_rates_for_date(date_str, sorted(currencies_by_date[date_str]))
+        except RequestBudgetExceeded as e:
+            warn_fallback("budget", f"{e}; further rates come from the cache only")
+            return requests_made - 1
+        log_debug(f"Prefetched {len(found)} rate(s) for {date_str}")
+    return requests_made
+
+# Bump when parse_invoice() output changes, so cached parse results are refreshed
+PARSER_VERSION = "1.0"
+
+# Item table patterns
+CURRENCY_HEADER_RE = re.compile(r"^\(([A-Z]{3})\)$")
+DESCRIPTION_RE = re.compile(r"^[\w\s,.&'/()\[\]\"-]+$", re.UNICODE)
+DATE_RE = re.compile(r"\d{4}[-/]\d{2}[-/]\d{2}")
+DELIVERY_KEYWORDS = ("delivery charge", "delivery fee", "shipping")
+
 def clean_description(lines):
     """Combine lines into a single description, allowing alphanumeric, unicode, and common punctuation."""
     description_parts = []
     for line in lines:
         # Allow letters, digits, unicode characters, and common punctuation including parentheses and quotes
-        if re.match(r"^[\w\s,.&'/()\[\]\"-]+$", line.strip(), re.UNICODE):
+        if DESCRIPTION_RE.match(line.strip()):
             description_parts.append(line.strip())
         else:
             break
     return " ".join(description_parts)
 
-def extract_delivery_fee(lines, invoice_date, default_currency):
-    """Extract delivery fee from invoice lines."""
+def _is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+def parse_invoice_lines(lines, items=True):
+    """Walk the invoice text lines once and return the invoice header, items and delivery fee.
+
+    The item table follows "Transaction" ... "Price inclusive of GST" and the
+    currency-only header lines such as "(CNY)". Each item row is description
+    line(s), then quantity, price exclusive, GST rate (with %), GST amount and
+    price inclusive of GST. A delivery row has no quantity: "Delivery Charge",
+    price exclusive, GST rate, GST amount, price inclusive. The table ends at
+    "Total amount".
+
+    Returns {"invoice_date", "supplier_name", "currency", "delivery_fee", "items"},
+    where items are (description, quantity, price inclusive) tuples. With
+    items=False the table rows are skipped and only the header fields are read.
+    """
+    invoice_date = None
+    supplier_name = "Unknown Supplier"
+    supplier_found = False
+    currency = None
     delivery_fee = None
-    delivery_currency = None
-    
-    for i, line in enumerate(lines):
-        if "delivery charge" in line.lower() or "delivery fee" in line.lower() or "shipping" in line.lower():
-            # Pattern: Delivery Charge -> price exclusive -> GST rate -> GST amount -> price inclusive
-            # Price inclusive is 4 lines after "Delivery Charge"
-            if i + 4 < len(lines):
+    rows = []
+
+    # header -> columns ("Transaction" seen) -> currencies ("Price inclusive of GST" seen) -> items -> done
+    state = "header"
+    n = len(lines)
+    i = 0
+    while i < n:
+        line = lines[i]
+        lower = line.lower()
+
+        if invoice_date is None:
+            date_match = DATE_RE.search(line)
+            if date_match:
+                invoice_date = date_match.group(0).replace("/", "-")
+        if not supplier_found and lower.startswith("supplier name"):
+            supplier_found = True
+            if i + 1 < n:
+                supplier_name = lines[i + 1]
+
+        if state == "header":
+            if "transaction" in lower:
+                state = "columns"
+            i += 1
+        elif state == "columns":
+            if "price inclusive of gst" in lower:
+                state = "currencies"
+            i += 1
+        elif state == "currencies":
+            currency_match = CURRENCY_HEADER_RE.match(line)
+            if currency_match:
+                currency = currency_match.group(1)
+                i += 1
+            else:
+                # First line after the currency headers is the first item row
+                state = "items" if currency and items else "done"
+        elif state == "items":
+            if "total amount" in lower:
+                state = "done"
+                i += 1
+                continue
+            if CURRENCY_HEADER_RE.match(line):
+                i += 1
+                continue
+
+            # Delivery row: keyword line followed directly by price exclusive and GST rate
+            if (delivery_fee is None and any(k in lower for k in DELIVERY_KEYWORDS)
+                    and i + 4 < n and _is_number(lines[i + 1]) and "%" in lines[i + 2]):
                 try:
-                    # Verify GST rate line has %
-                    if "%" in lines[i + 2]:
-                        fee = float(lines[i + 4])
-                        delivery_fee = fee
-                        delivery_currency = default_currency  # Use currency from items
-                        log_debug(f"Found delivery fee: {fee} {delivery_currency}")
-                except (ValueError, IndexError):
+                    delivery_fee = float(lines[i + 4])
+                    log_debug(f"Found delivery fee: {delivery_fee} {currency}")
+                    i += 5
+                    continue
+                except ValueError:
                     pass
-            break
-    
-    return delivery_fee, delivery_currency
 
-def extract_invoice_data(pdf_path):
-    """Extract invoice data and return as JSON array."""
-    with fitz.open(pdf_path) as doc:
-        text = "".join(page.get_text() for page in doc)
+            # Collect description lines (English-like text, not numbers or percentages)
+            j = i
+            while j < n:
+                text = lines[j]
+                if _is_number(text) or "%" in text or "total amount" in text.lower() or not DESCRIPTION_RE.match(text):
+                    break
+                j += 1
+            if j == i:
+                i += 1
+                continue
 
-    # Validate that this is an AliExpress invoice
-    if "alibaba.com" not in text.lower():
-        raise ValueError(f"Error: This does not appear to be an AliExpress invoice. Expected 'Alibaba.com' in the PDF but not found. File: {pdf_path}")
+            # After the description: quantity, price exclusive, GST rate (has %), GST amount, price inclusive
+            if j + 4 < n and "%" in lines[j + 2]:
+                try:
+                    price = float(lines[j + 4])
+                except ValueError:
+                    i += 1
+                    continue
+                try:
+                    quantity = int(lines[j])
+                except ValueError:
+                    quantity = 1  # Default to 1 if parsing fails
+                description = clean_description(lines[i:j])
+                log_debug(f"Item parsed: desc='{description}' qty={quantity} price={price} {currency}")
+                rows.append((description, quantity, price))
+                # Move to next item (skip quantity + 4 price fields)
+                i = j + 5
+            else:
+                i += 1
+        else:
+            # Table finished: only the header fields can still be missing
+            if invoice_date is not None and supplier_found:
+                break
+            i += 1
 
-    if DEBUG:
-        print("[DEBUG] Raw text preview:")
-        print(text.replace("\n", "\\n")[:1000])  # Show first 1000 chars with newline markers
+    return {
+        "invoice_date": invoice_date,
+        "supplier_name": supplier_name,
+        "currency": currency,
+        "delivery_fee": delivery_fee,
+        "items": rows,
+    }
+
+# Item table column labels (lower case) -> column name, for the word-box parser
+TABLE_COLUMN_LABELS = (
+    ("quantity", "quantity"),
+    ("exclusive", "price_exclusive"),
+    ("gst rate", "gst_rate"),
+    ("gst amount", "gst_amount"),
+    ("inclusive", "price_inclusive"),
+)
+# Words whose vertical centres are this close (points) are on the same visual line
+LINE_TOLERANCE = 2.0
 
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
+def _visual_lines(words):
+    """Group PyMuPDF word boxes into visual lines: [(y_centre, words sorted left to right)], top to bottom."""
+    lines = []
+    for word in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        centre = (word[1] + word[3]) / 2
+        if lines and centre - lines[-1][0] <= LINE_TOLERANCE:
+            lines[-1][1].append(word)
+        else:
+            lines.append((centre, [word]))
+    return [(centre, sorted(line_words, key=lambda w: w[0])) for centre, line_words in lines]
 
-    # Invoice date
-    date_match = re.search(r"\d{4}[-/]\d{2}[-/]\d{2}", text)
-    invoice_date = date_match.group(0).replace("/", "-") if date_match else None
+def _table_columns(line_words):
+    """Return (description_right_edge, column_names, boundaries) from the table header line, or None.
 
-    # Supplier name
-    supplier_name = "Unknown Supplier"
-    for i, line in enumerate(lines):
-        if line.lower().startswith("supplier name"):
-            if i + 1 < len(lines):
-                supplier_name = lines[i + 1].strip()
+    Each column label ("Price exclusive of GST", ...) is one PyMuPDF text line, so
+    words are grouped into labels by (block_no, line_no). The numbers under each
+    label are right-aligned with it.
+    """
+    labels = {}
+    for word in line_words:
+        labels.setdefault((word[5], word[6]), []).append(word)
+    columns = {}
+    description_edge = None
+    for label_words in labels.values():
+        label = " ".join(w[4] for w in label_words).lower()
+        for keyword, column in TABLE_COLUMN_LABELS:
+            if keyword in label and column not in columns:
+                columns[column] = max(w[2] for w in label_words)
+                if column == "quantity":
+                    description_edge = min(w[0] for w in label_words)
+                break
+    if description_edge is None or len(columns) != len(TABLE_COLUMN_LABELS):
+        return None
+    # A word belongs to the column whose right edge is nearest: bisect on the midpoints between edges
+    names = sorted(columns, key=columns.get)
+    edges = [columns[name] for name in names]
+    boundaries = [(left + right) / 2 for left, right in zip(edges, edges[1:])]
+    return description_edge, names, boundaries
+
+def parse_invoice_words(pages):
+    """Parse the item table from PyMuPDF word boxes (one list per page), assigning cells by x-position.
+
+    The header line ("Transaction ... Price inclusive of GST") gives the column
+    positions. Words left of the Quantity column are description; every other
+    word goes to the column whose right edge is nearest. A row is anchored on its
+    price-inclusive cell, and description lines (a wrapped description is centred
+    around its numbers) belong to the nearest anchor on the page. A row without a
+    quantity whose description mentions delivery/shipping is the delivery fee.
+
+    Returns {"currency", "delivery_fee", "items"} like parse_invoice_lines(), or
+    None if no positional table header is found (e.g. text laid out as one column),
+    so the caller can fall back to the line parser.
+    """
+    table = None
+    currency = None
+    delivery_fee = None
+    items = []
+
+    for words in pages:
+        anchors = []             # [y_centre, cells, [(y, description)]]
+        descriptions = []        # [(y, description)] lines without numbers
+        finished = False
+        for centre, line_words in _visual_lines(words):
+            text = " ".join(w[4] for w in line_words)
+            lower = text.lower()
+            if "transaction" in lower and "quantity" in lower and "inclusive" in lower:
+                table = _table_columns(line_words) or table
+                anchors, descriptions = [], []   # anything above a (repeated) header is not table content
+                continue
+            if table is None:
+                continue
+            if lower.startswith("total amount"):
+                finished = True
+                break
+            if all(CURRENCY_HEADER_RE.match(w[4]) for w in line_words):
+                currency = CURRENCY_HEADER_RE.match(line_words[0][4]).group(1)
+                continue
+
+            description_edge, names, boundaries = table
+            description_words = []
+            cells = {}
+            for word in line_words:
+                if word[2] <= description_edge:
+                    description_words.append(word[4])
+                else:
+                    cells.setdefault(names[bisect_right(boundaries, word[2])], []).append(word[4])
+            cells = {column: " ".join(parts) for column, parts in cells.items()}
+            description = " ".join(description_words)
+
+            if "price_inclusive" in cells:
+                anchors.append([centre, cells, [(centre, description)] if description else []])
+            elif description:
+                descriptions.append((centre, description))
+
+        if anchors:
+            for centre, description in descriptions:
+                # Ties go to the earlier row
+                nearest = min(anchors, key=lambda a: abs(a[0] - centre))
+                nearest[2].append((centre, description))
+        for _, cells, description_lines in anchors:
+            description = " ".join(d for _, d in sorted(description_lines))
+            try:
+                price = float(cells["price_inclusive"])
+            except ValueError:
+                continue
+            if "quantity" not in cells and any(k in description.lower() for k in DELIVERY_KEYWORDS):
+                if delivery_fee is None:
+                    delivery_fee = price
+                    log_debug(f"Found delivery fee: {delivery_fee} {currency}")
+                continue
+            try:
+                quantity = int(cells.get("quantity", ""))
+            except ValueError:
+                quantity = 1  # Default to 1 if parsing fails
+            log_debug(f"Item parsed: desc='{description}' qty={quantity} price={price} {currency}")
+            items.append((description, quantity, price))
+        if finished:
             break
 
-    # Invoice number from filename (format: "YYYY-MM-DD AliExpress INVOICE_NUMBER.pdf")
+    if table is None:
+        return None
+    return {"currency": currency, "delivery_fee": delivery_fee, "items": items}
+
+def read_invoice_lines(pdf_path, doc=None):
+    """Return (text, lines, pages) for a PDF from a single word extraction per page.
+
+    pages holds the PyMuPDF word boxes of each page; lines are the non-empty
+    text lines rebuilt from them (in PyMuPDF block/line order) and text is the
+    lines joined with newlines. An already open fitz document can be passed as
+    doc to avoid reopening the file.
+    """
+    if doc is None:
+        with fitz.open(pdf_path) as doc:
+            return read_invoice_lines(pdf_path, doc)
+    pages = []
+    lines = []
+    for page in doc:
+        words = page.get_text("words")
+        pages.append(words)
+        current = None
+        for word in words:
+            key = (word[5], word[6])
+            if key != current:
+                lines.append([])
+                current = key
+            lines[-1].append(word[4])
+    lines = [" ".join(line_words) for line_words in lines]
+    return "\n".join(lines), lines, pages
+
+def extract_invoice_header(pdf_path):
+    """Return (invoice_date, currency) for an invoice without converting prices.
+
+    Used to collect every date/currency in a folder up front so exchange rates can
+    be prefetched in bulk. Either value is None if it cannot be found.
+    """
+    _, lines, _ = read_invoice_lines(pdf_path)
+    parsed = parse_invoice_lines(lines, items=False)
+    return parsed["invoice_date"], parsed["currency"]
+
+def invoice_number_from_filename(pdf_path):
+    """Invoice number from the filename (format: "YYYY-MM-DD AliExpress INVOICE_NUMBER.pdf")."""
     filename = os.path.basename(pdf_path).replace(".pdf", "")
     filename_parts = filename.split()
     # Look for a long numeric string (invoice number) in the filename
-    invoice_number = None
     for part in filename_parts:
         # Invoice numbers are typically long numeric strings
         if part.isdigit() and len(part) > 10:
-            invoice_number = part
-            break
+            return part
     # Fallback to first part if no invoice number found
-    if not invoice_number:
-        invoice_number = filename_parts[0] if filename_parts else "Unknown"
+    return filename_parts[0] if filename_parts else "Unknown"
 
-    # Extract items first to get currency, then extract delivery fee
-    # (We'll extract items twice - once to get currency, then properly with delivery fee)
-    # Actually, let's extract currency from headers first
-    currency = None
-    for i, line in enumerate(lines):
-        if "transaction" in line.lower():
-            j = i + 1
-            while j < len(lines):
-                if "price inclusive of gst" in lines[j].lower():
-                    k = j + 1
-                    while k < len(lines) and re.match(r"^\([A-Z]{3}\)$", lines[k].strip()):
-                        currency_match = re.match(r"^\(([A-Z]{3})\)$", lines[k].strip())
-                        if currency_match:
-                            currency = currency_match.group(1)
-                        k += 1
-                    break
-                j += 1
-            break
+def parse_invoice(pdf_path, doc=None):
+    """Parse an invoice PDF into a raw invoice, without any currency conversion.
 
-    # Extract delivery fee (needs currency)
-    delivery_fee, delivery_currency = extract_delivery_fee(lines, invoice_date, currency)
+    Returns {"invoice_date", "currency", "delivery_fee", "delivery_currency", "items"},
+    where items carry the original-currency "Item Cost". This never touches the
+    network, so it is safe to run in worker processes; convert_invoice() adds
+    the AUD amounts. The invoice number is taken from pdf_path's file name; pass
+    an open fitz document as doc to parse it without reopening the file.
+    """
+    text, lines, pages = read_invoice_lines(pdf_path, doc)
 
-    # Extract items
-    # Find where items start (after "Transaction" and headers)
-    items_start_idx = -1
-    currency = None
-    
-    for i, line in enumerate(lines):
-        if "transaction" in line.lower():
-            # Look for the pattern: Price inclusive of GST header, then currency headers, then items
-            j = i + 1
-            while j < len(lines):
-                if "price inclusive of gst" in lines[j].lower():
-                    # Find currency from header lines (lines with just currency in parentheses)
-                    k = j + 1
-                    while k < len(lines) and re.match(r"^\([A-Z]{3}\)$", lines[k].strip()):
-                        currency_match = re.match(r"^\(([A-Z]{3})\)$", lines[k].strip())
-                        if currency_match:
-                            currency = currency_match.group(1)
-                        k += 1
-                    items_start_idx = k
-                    break
-                j += 1
-            break
-    
-    rows = []
-    # Track exchange rates used during parsing (key: date_currency, value: rate)
-    used_exchange_rates = {}
-    if items_start_idx > 0 and currency:
-        i = items_start_idx
-        while i < len(lines):
-            # Stop at "Total amount" line
-            if "total amount" in lines[i].lower():
-                break
-            
-            # Skip currency-only lines
-            if re.match(r"^\([A-Z]{3}\)$", lines[i].strip()):
-                i += 1
-                continue
-            
-            # Collect description lines (English-like text, not numbers or percentages)
-            desc_lines = []
-            j = i
-            while j < len(lines):
-                line_stripped = lines[j].strip()
-                # Stop if we hit a number (quantity or price)
-                try:
-                    float(line_stripped)
-                    break
-                except ValueError:
-                    pass
-                # Stop if it's a percentage
-                if "%" in line_stripped:
-                    break
-                # Stop if it's "Total amount"
-                if "total amount" in line_stripped.lower():
-                    break
-                # Include if it looks like description text
-                if re.match(r"^[\w\s,.&'/()\[\]\"-]+$", line_stripped, re.UNICODE):
-                    desc_lines.append(line_stripped)
-                else:
-                    break
-                j += 1
-            
-            if not desc_lines:
-                i += 1
-                continue
-            
-            description = clean_description(desc_lines)
-            
-            # After description, pattern is: quantity, price exclusive, GST rate, GST amount, price inclusive
-            # j is the index where we stopped (quantity line, first number after description)
-            # We want the price inclusive (4 values after quantity)
-            if j < len(lines):
-                try:
-                    # j = quantity
-                    try:
-                        quantity = int(lines[j])
-                    except ValueError:
-                        quantity = 1  # Default to 1 if parsing fails
-
-                    # j+1 = price exclusive
-                    # j+2 = GST rate (has %)
-                    # j+3 = GST amount
-                    # j+4 = price inclusive (this is what we want)
-                    if j + 4 < len(lines):
-                        # Verify GST rate line has %
-                        if "%" in lines[j + 2]:
-                            price = float(lines[j + 4])
-                            rate, rate_date = get_exchange_rate(invoice_date, currency, return_date=True)
-                            if not rate_date:
-                                rate_date = invoice_date
-                            used_exchange_rates[f"{rate_date}_{currency}"] = rate
-                            price_aud = round(price * rate, 2)
-                            log_debug(f"Item parsed: desc='{description}' qty={quantity} price={price} {currency} -> {price_aud} AUD using rate={rate}")
-                            
-                            rows.append({
-                                "Invoice Date": invoice_date,
-                                "Invoice Number": invoice_number,
-                                "Shop": "AliExpress",
-                                "Branch": supplier_name,
-                                "Description": description,
-                                "Quantity": quantity,
-                                "Original Currency": currency,
-                                "Item Cost": price,
-                                "Item Cost (AUD)": price_aud
-                            })
-                            
-                            # Move to next item (skip quantity + 4 price fields, j already points to quantity)
-                            i = j + 5
-                        else:
-                            i += 1
-                    else:
-                        i += 1
-                except (ValueError, IndexError):
-                    i += 1
-            else:
-                i += 1
-    # NOTE: Removed fallback parsing method (duplicate logic). If invoice parsing using the
-    # main 'items_start_idx' detection fails, the invoice format likely doesn't match the
-    # expected structure. Consider adding more robust parsing or explicit patterns for
-    # edge-case invoices rather than maintaining two near-duplicate parsing branches.
-
-    # Pro-rate delivery fee across items
-    if delivery_fee and delivery_currency and rows:
-        delivery_rate, delivery_rate_date = get_exchange_rate(invoice_date, delivery_currency, return_date=True)
-        if not delivery_rate_date:
-            delivery_rate_date = invoice_date
-        used_exchange_rates[f"{delivery_rate_date}_{delivery_currency}"] = delivery_rate
-        delivery_fee_aud = round(delivery_fee * delivery_rate, 2)
-        num_items = len(rows)
-        prorated_delivery_aud = delivery_fee_aud / num_items
-        
-        log_debug(f"Pro-rating delivery fee: {delivery_fee_aud} AUD across {num_items} items = {prorated_delivery_aud:.4f} AUD per item")
-        
-        # Add prorated delivery fee to each item, handling rounding to ensure total matches
-        total_added = 0.0
-        prorated_delivery_original = delivery_fee / num_items
-        
-        for idx, row in enumerate(rows):
-            # Store original cost before adding delivery fee
-            original_cost_aud = row["Item Cost (AUD)"]
-            
-            if idx == len(rows) - 1:
-                # Last item gets any remainder to ensure exact total
-                amount_to_add_aud = round(delivery_fee_aud - total_added, 2)
-                prorated_delivery_original_item = round(delivery_fee - (prorated_delivery_original * (num_items - 1)), 2)
-            else:
-                amount_to_add_aud = round(prorated_delivery_aud, 2)
-                prorated_delivery_original_item = round(prorated_delivery_original, 2)
-            
-            # Add prorated delivery fee in original currency and AUD
-            row["Prorated Delivery Fee"] = prorated_delivery_original_item
-            row["Prorated Delivery Fee (AUD)"] = amount_to_add_aud
-            
-            # Calculate total item cost including delivery
-            total_item_cost_aud = round(original_cost_aud + amount_to_add_aud, 2)
-            row["Total Item Cost (AUD)"] = total_item_cost_aud
-            
-            # Keep Item Cost (AUD) as base cost (before delivery)
-            total_added += amount_to_add_aud
+    # Validate that this is an AliExpress invoice
+    if "alibaba.com" not in text.lower():
+        raise ValueError(f"Error: This does not appear to be an AliExpress invoice. Expected 'Alibaba.com' in the PDF but not found. File: {pdf_path}")
+
+    if DEBUG:
+        print("[DEBUG] Raw text preview:")
+        print(text.replace("\n", "\\n")[:1000])  # Show first 1000 chars with newline markers
+
+    # Prefer the positional table (tolerates wrapped descriptions); fall back to line offsets
+    table = parse_invoice_words(pages)
+    if table is not None:
+        parsed = parse_invoice_lines(lines, items=False)
+        parsed.update(table)
     else:
-        # No delivery fee - add consistent fields with zero values
-        for row in rows:
-            row["Prorated Delivery Fee"] = 0.0
-            row["Prorated Delivery Fee (AUD)"] = 0.0
-            row["Total Item Cost (AUD)"] = row["Item Cost (AUD)"]
+        log_debug("No positional item table found, using the line parser")
+        parsed = parse_invoice_lines(lines)
+    invoice_date = parsed["invoice_date"]
+    currency = parsed["currency"]
+    invoice_number = invoice_number_from_filename(pdf_path)
+
+    rows = [{
+        "Invoice Date": invoice_date,
+        "Invoice Number": invoice_number,
+        "Shop": "AliExpress",
+        "Branch": parsed["supplier_name"],
+        "Description": description,
+        "Quantity": quantity,
+        "Original Currency": currency,
+        "Item Cost": price
+    } for description, quantity, price in parsed["items"]]
 
     if DEBUG and not rows:
         print("[DEBUG] No items found. Check invoice structure.")
 
-    # Consolidate AUD values - use Total Item Cost (always present now)
-    total_aud = round(sum(row["Total Item Cost (AUD)"] for row in rows), 2)
-    
-    result = {
+    delivery_fee = parsed["delivery_fee"]
+    return {
+        "invoice_date": invoice_date,
+        "currency": currency,
+        "delivery_fee": delivery_fee,
+        # Delivery is charged in the same currency as the items
+        "delivery_currency": currency if delivery_fee is not None else None,
         "items": rows,
-        "total_aud": total_aud
     }
-    
-    # Add delivery fee summary if present
-    if delivery_fee and delivery_currency:
-        delivery_rate, delivery_rate_date = get_exchange_rate(invoice_date, delivery_currency, return_date=True)
-        if not delivery_rate_date:
-            delivery_rate_date = invoice_date
-        used_exchange_rates[f"{delivery_rate_date}_{delivery_currency}"] = delivery_rate
-        delivery_fee_aud = round(delivery_fee * delivery_rate, 2)
+
+# Columns added by the AUD conversion (see convert_invoices)
+CONVERTED_COLUMNS = ["Item Cost (AUD)", "Prorated Delivery Fee", "Prorated Delivery Fee (AUD)", "Total Item Cost (AUD)"]
+
+def round_cents(values):
+    """Round an array to 2 decimal places exactly as Python's round() does.
+
+    np.round() scales by 100 before rounding, which can tip values within float
+    error of a half cent the other way; those few are rounded with round().
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, 2)
+    near_half = np.abs(np.abs(values * 100) % 1 - 0.5) < 1e-6
+    rounded[near_half] = [round(value, 2) for value in values[near_half].tolist()]
+    return rounded
+
+def _delivery_charged(invoice):
+    """Only a non-zero delivery fee with a known currency is pro-rated."""
+    return bool(invoice["delivery_fee"] and invoice["delivery_currency"])
+
+def exchange_rate_table(invoices):
+    """Look up each distinct (date, currency) the invoices need once.
+
+    Returns a DataFrame with columns date, currency (missing values as ""),
+    rate and rate_date (the date the rate is actually for).
+    """
+    keys = []
+    for invoice in invoices:
+        date_str = invoice["invoice_date"] or ""
+        if invoice["items"]:
+            keys.append((date_str, invoice["currency"] or ""))
+        if _delivery_charged(invoice):
+            keys.append((date_str, invoice["delivery_currency"]))
+    rates = pd.DataFrame(list(dict.fromkeys(keys)), columns=["date", "currency"])
+    looked_up = [get_exchange_rate(date_str or None, currency or None, return_date=True)
+                 for date_str, currency in zip(rates["date"], rates["currency"])]
+    rates["rate"] = [rate for rate, _ in looked_up]
+    rates["rate_date"] = [rate_date or date_str or None for (_, rate_date), date_str in zip(looked_up, rates["date"])]
+    return rates
+
+def convert_invoices(invoices, rates=None):
+    """Convert raw invoices from parse_invoice() to AUD as one batch. Returns a DataFrame of items.
+
+    The rate for each distinct (invoice date, currency) is looked up once (see
+    exchange_rate_table) and joined onto the invoices, then item costs, the
+    delivery fee pro-rated across each invoice's items (the last item takes the
+    rounding remainder) and item totals are computed as whole columns, rounded
+    with round_cents(). Invoices without items are skipped. The index holds each
+    item's position in `invoices`, so items of different invoices that share an
+    invoice number stay apart (see invoice_totals).
+    """
+    positions = [i for i, invoice in enumerate(invoices) if invoice and invoice["items"]]
+    invoices = [invoices[i] for i in positions]
+    if not invoices:
+        return pd.DataFrame(columns=CONVERTED_COLUMNS, index=pd.Index([], dtype=int, name="invoice"))
+    if rates is None:
+        rates = exchange_rate_table(invoices)
+    rates = rates[["date", "currency", "rate"]]
+
+    heads = pd.DataFrame({
+        "date": [invoice["invoice_date"] or "" for invoice in invoices],
+        "currency": [invoice["currency"] or "" for invoice in invoices],
+        "delivery_currency": [invoice["delivery_currency"] or "" for invoice in invoices],
+        "fee": [float(invoice["delivery_fee"]) if _delivery_charged(invoice) else 0.0 for invoice in invoices],
+        "count": [len(invoice["items"]) for invoice in invoices],
+    })
+    heads = heads.merge(rates, on=["date", "currency"], how="left")
+    heads = heads.merge(rates.rename(columns={"currency": "delivery_currency", "rate": "delivery_rate"}),
+                        on=["date", "delivery_currency"], how="left")
+    heads["fee_aud"] = round_cents(heads["fee"] * heads["delivery_rate"].fillna(0.0))
+
+    counts = heads["count"].to_numpy()
+    invoice_index = np.repeat(np.arange(len(invoices)), counts)
+    items = pd.DataFrame([item for invoice in invoices for item in invoice["items"]],
+                         index=pd.Index(np.asarray(positions)[invoice_index], name="invoice"))
+    n = counts[invoice_index]
+    last = np.arange(len(items)) - np.repeat(np.cumsum(counts) - counts, counts) == n - 1
+    fee = heads["fee"].to_numpy()[invoice_index]
+    fee_aud = heads["fee_aud"].to_numpy()[invoice_index]
+    has_fee = fee != 0
+
+    item_aud = round_cents(items["Item Cost"].to_numpy(dtype=float) * heads["rate"].to_numpy()[invoice_index])
+    share_aud = round_cents(fee_aud / n)
+    share = fee / n
+    delivery_aud = np.where(last, round_cents(fee_aud - share_aud * (n - 1)), share_aud)
+    delivery = np.where(last, round_cents(fee - share * (n - 1)), round_cents(share))
+
+    items["Item Cost (AUD)"] = item_aud
+    items["Prorated Delivery Fee"] = np.where(has_fee, delivery, 0.0)
+    items["Prorated Delivery Fee (AUD)"] = np.where(has_fee, delivery_aud, 0.0)
+    items["Total Item Cost (AUD)"] = np.where(has_fee, round_cents(item_aud + delivery_aud), item_aud)
+    if DEBUG:
+        for description, cost, total_aud in zip(items["Description"], items["Item Cost"], items["Total Item Cost (AUD)"]):
+            log_debug(f"Item converted: desc='{description}' price={cost} -> {total_aud} AUD including delivery")
+    return items
+
+def invoice_totals(items):
+    """AUD total of each source invoice (the index of convert_invoices() items), in first-seen order."""
+    grouped = items.groupby(level="invoice", sort=False)["Total Item Cost (AUD)"]
+    return grouped.agg(lambda totals: round(sum(totals.tolist()), 2))
+
+def convert_invoice(invoice):
+    """Convert a raw invoice from parse_invoice() to AUD and pro-rate its delivery fee.
+
+    Returns the extract_invoice_data() result: items with AUD costs, total_aud,
+    the delivery fee summary and the exchange rates used. A batch of one for
+    convert_invoices().
+    """
+    rates = exchange_rate_table([invoice])
+    items = convert_invoices([invoice], rates)
+    result = {
+        "items": items.to_dict("records"),
+        "total_aud": float(invoice_totals(items).sum()) if len(items) else 0.0,
+    }
+
+    if _delivery_charged(invoice):
+        delivery_rate = float(rates.loc[rates["currency"] == invoice["delivery_currency"], "rate"].iloc[0])
         result["delivery_fee"] = {
-            "amount": delivery_fee,
-            "currency": delivery_currency,
-            "amount_aud": delivery_fee_aud,
-            "prorated_across_items": len(rows)
+            "amount": invoice["delivery_fee"],
+            "currency": invoice["delivery_currency"],
+            "amount_aud": round(invoice["delivery_fee"] * delivery_rate, 2),
+            "prorated_across_items": len(items),
         }
-    # Add a summary of exchange rates used (always include, even if empty)
-    result["exchange_rates"] = used_exchange_rates
-    
+    # A summary of the exchange rates used (always included, even if empty)
+    result["exchange_rates"] = {f"{rate_date}_{currency or None}": rate
+                                for currency, rate, rate_date in zip(rates["currency"], rates["rate"], rates["rate_date"])}
     return result
 
+def extract_invoice_data(pdf_path):
+    """Extract invoice data and return as JSON array."""
+    return convert_invoice(parse_invoice(pdf_path))
+
 if __name__ == "__main__":
+    DEBUG = "--debug" in sys.argv
     if len(sys.argv) < 2:
         print("Usage: python aliexpress2json.py /path/to/invoice.pdf [--debug]")
         sys.exit(1)
@@ -505,10 +1097,3 @@ if __name__ == "__main__":
         f.write(json_output)
 
     print(f"JSON saved to {json_file}")
-    
-    # Save exchange rate cache
-    try:
-        with open(CACHE_FILE, "w") as f:
-            json.dump(exchange_rate_cache, f, indent=2)
-    except Exception as e:
-        log_debug(f"Failed to save exchange rate cache: {e}")
@@ -0,0 +1,912 @@
+#!/usr/bin/env python3
+# Exchange rate cache, store, resolvers and offline tables used by aliexpress2json
+#
+#   ExchangeRateCache         in-memory {"YYYY-MM-DD_CUR": rate} dict with a sorted date index
+#   ExchangeRateStore         durable SQLite (WAL) store shared by concurrent processes
+#   ExchangeRateResolver      HTTP lookups over a pooled session (rate limit, budget, backoff, fallback probes)
+#   TokenBucket               thread-safe request rate limiter used by ExchangeRateResolver
+#   AsyncExchangeRateResolver coalesces concurrent lookups of the same (date, currency)
+#   OfflineRateTable          per-currency numpy arrays imported from RBA F11 CSVs, for offline runs
+#
+# Usage:
+#   python exchange_rates.py import-rba f11.1-data.csv [more.csv ...] [-o offline_rates.npz]
+#   python exchange_rates.py stats|compact [--db exchange_rate_cache.sqlite]
+#   python exchange_rates.py prune --keep-days N | evict --max-rows N | rescale FACTOR [--db ...]
+#
+# The cache is a plain {"YYYY-MM-DD_CUR": rate} dict (the format of
+# exchange_rate_cache.json), so it can be loaded from and saved to the existing
+# JSON file unchanged. Alongside the dict it keeps, per currency, a sorted list of
+# the cached dates so that exact, nearest-date and most-recent lookups are
+# bisect operations instead of scans over every key.
+#
+# ISO dates (YYYY-MM-DD) sort lexicographically in date order, so the index
+# compares date strings directly and only converts the (at most two)
+# neighbouring candidates to dates to measure the distance.
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Cache keys look like "2025-08-29_CNY"
+CACHE_KEY_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})_([A-Z]{3})$")
+
+
+def make_cache_key(date_str, currency):
+    return f"{date_str}_{currency}"
+
+
+def split_cache_key(key):
+    """Return (date_str, currency) for a cache key, or (None, None) if it is not a dated key."""
+    m = CACHE_KEY_RE.match(key) if isinstance(key, str) else None
+    return (m.group(1), m.group(2)) if m else (None, None)
+
+
+class ExchangeRateCache(dict):
+    """{"YYYY-MM-DD_CUR": rate} dict that keeps a sorted date list per currency.
+
+    All mutating dict methods keep the index in step, so callers (and tests) can
+    keep reading and writing it like the plain dict it replaces.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._dates = {}  # {currency: sorted list of "YYYY-MM-DD"}
+        self.update(*args, **kwargs)
+
+    # -- index maintenance -------------------------------------------------
+
+    def _index_add(self, key):
+        date_str, currency = split_cache_key(key)
+        if date_str is not None:
+            insort(self._dates.setdefault(currency, []), date_str)
+
+    def _index_remove(self, key):
+        date_str, currency = split_cache_key(key)
+        dates = self._dates.get(currency)
+        if date_str is None or not dates:
+            return
+        i = bisect_left(dates, date_str)
+        if i < len(dates) and dates[i] == date_str:
+            del dates[i]
+            if not dates:
+                del self._dates[currency]
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._index_add(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._index_remove(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            value = super().pop(key)
+            self._index_remove(key)
+            return value
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._index_remove(key)
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self._dates.clear()
+
+    def copy(self):
+        return ExchangeRateCache(self)
+
+    # -- lookups -----------------------------------------------------------
+
+    def currencies(self):
+        return sorted(self._dates)
+
+    def dates(self, currency):
+        """Sorted list of cached dates for a currency."""
+        return list(self._dates.get(currency, ()))
+
+    def get_rate(self, date_str, currency):
+        """Exact cached rate for (date, currency), or None."""
+        return self.get(make_cache_key(date_str, currency))
+
+    def nearest(self, date_str, currency, max_days=None):
+        """Return (rate, cached_date) for the cached date closest to date_str, or (None, None).
+
+        Ties go to the earlier date. If max_days is given, dates further away are ignored.
+        """
+        dates = self._dates.get(currency)
+        if not dates or not date_str:
+            return None, None
+        try:
+            target = date.fromisoformat(date_str)
+        except (TypeError, ValueError):
+            return None, None
+        i = bisect_left(dates, date_str)
+        best_date = None
+        best_diff = None
+        # Only the neighbours either side of the insertion point can be nearest
+        for candidate in dates[max(0, i - 1):i + 1]:
+            diff = abs((date.fromisoformat(candidate) - target).days)
+            if best_diff is None or diff < best_diff:
+                best_diff = diff
+                best_date = candidate
+        if best_date is None or (max_days is not None and best_diff > max_days):
+            return None, None
+        return self[make_cache_key(best_date, currency)], best_date
+
+    def latest(self, currency):
+        """Return (rate, cached_date) for the most recent cached date of a currency, or (None, None)."""
+        dates = self._dates.get(currency)
+        if not dates:
+            return None, None
+        return self[make_cache_key(dates[-1], currency)], dates[-1]
+
+
+def timeseries_windows(dates, pad_days=7, max_days=365):
+    """Group sorted ISO dates into (start, end) windows no longer than max_days.
+
+    Each window is padded by pad_days either side so nearby fallback dates
+    (weekends, public holidays) come back in the same request.
+    """
+    windows = []
+    start = end = None
+    for date_str in dates:
+        day = date.fromisoformat(date_str)
+        lo = day - timedelta(days=pad_days)
+        hi = day + timedelta(days=pad_days)
+        if start is not None and (hi - start).days < max_days:
+            end = max(end, hi)
+            continue
+        if start is not None:
+            windows.append((start.isoformat(), end.isoformat()))
+        start, end = lo, hi
+    if start is not None:
+        windows.append((start.isoformat(), end.isoformat()))
+    return windows
+
+
+def fetch_timeseries(currency, start_date, end_date, access_key, base_url, timeout=30, session=None):
+    """Fetch daily currency->AUD rates for a date range in one request.
+
+    Returns {"YYYY-MM-DD": rate} (unscaled). Raises on HTTP or API errors.
+    Understands both the "quotes" ({"USDAUD": r}) and "rates" ({"AUD": r}) response shapes.
+    """
+    params = timeseries_params(currency, start_date, end_date, access_key)
+    response = (session or requests).get(f"{base_url}/timeseries", params=params, timeout=timeout)
+    response.raise_for_status()
+    return parse_timeseries(response.json(), currency)
+
+
+def timeseries_params(currency, start_date, end_date, access_key):
+    return {
+        "access_key": access_key,
+        "start_date": start_date,
+        "end_date": end_date,
+        "source": currency,
+        "currencies": "AUD",
+    }
+
+
+def parse_timeseries(data, currency):
+    """Return {"YYYY-MM-DD": rate} from a timeseries response body. Raises if the API reported failure."""
+    if not data.get("success", False):
+        raise ValueError(f"timeseries request failed: {data}")
+    rates = {}
+    if "quotes" in data:
+        pair = f"{currency}AUD"
+        for day, quotes in data["quotes"].items():
+            if pair in quotes:
+                rates[day] = quotes[pair]
+    else:
+        for day, day_rates in data.get("rates", {}).items():
+            if "AUD" in day_rates:
+                rates[day] = day_rates["AUD"]
+    return rates
+
+
+class RequestBudgetExceeded(RuntimeError):
+    """Raised instead of sending a request once a resolver's per-run request budget is used up."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: on average `rate` acquisitions per second, in bursts of up to `capacity`.
+
+    acquire() blocks until a token is available. pause() (used after a 429)
+    empties the bucket and hands out no tokens for the given time, so every
+    thread sharing the bucket backs off together.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self):
+        """Take one token, sleeping until one is available. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return waited
+                    wait = (1.0 - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """Empty the bucket and hand out no tokens for `seconds`."""
+        with self._lock:
+            now = self._clock()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+
+def retry_after_seconds(response, default, limit=60.0):
+    """Seconds to wait from a numeric Retry-After header, else `default` (capped at `limit`)."""
+    try:
+        return min(limit, max(0.0, float(response.headers.get("Retry-After"))))
+    except (TypeError, ValueError):
+        return min(limit, default)
+
+
+class ExchangeRateResolver:
+    """HTTP side of exchange rate lookups, over one pooled keep-alive session.
+
+    Rates returned are the raw API rates (currency -> AUD); scaling and caching
+    are left to the caller. Every request has a (connect, read) timeout and goes
+    through _get(), which:
+
+    - waits for a token from the optional TokenBucket (rate_limit requests/sec,
+      bursts of up to burst)
+    - raises RequestBudgetExceeded once `budget` requests have been sent, so a
+      bulk run cannot burn through the API quota
+    - retries 429/5xx responses with exponential backoff (or the server's
+      Retry-After); a 429 also pauses the shared bucket for every thread
+
+    Connection errors are retried by urllib3. `stats` counts requests sent,
+    retries, 429 responses, requests refused by the budget and time spent
+    waiting for the rate limiter.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, access_key, base_url, timeout=(5, 30), retries=3, backoff=0.5,
+                 max_workers=14, log=None, rate_limit=None, burst=None, budget=None, sleep=time.sleep):
+        self.access_key = access_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self.budget = budget
+        self.log = log or (lambda message: None)
+        self.limiter = TokenBucket(rate_limit, burst, sleep=sleep) if rate_limit else None
+        self._sleep = sleep
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "over_budget": 0, "limiter_wait": 0.0}
+        self._stats_lock = threading.Lock()
+        retry = Retry(total=retries, connect=retries, read=retries, status=0, backoff_factor=backoff,
+                      allowed_methods=("GET",), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _get(self, endpoint, params):
+        """GET base_url/endpoint through the rate limiter and request budget, retrying 429/5xx with backoff."""
+        url = f"{self.base_url}/{endpoint}"
+        for attempt in range(self.retries + 1):
+            with self._stats_lock:
+                if self.budget is not None and self.stats["requests"] >= self.budget:
+                    self.stats["over_budget"] += 1
+                    raise RequestBudgetExceeded(f"exchange rate request budget of {self.budget} used up")
+                self.stats["requests"] += 1
+            if self.limiter is not None:
+                self._count("limiter_wait", self.limiter.acquire())
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                break
+            delay = retry_after_seconds(response, self.backoff * 2 ** attempt)
+            if response.status_code == 429:
+                self._count("throttled")
+                if self.limiter is not None:
+                    self.limiter.pause(delay)
+            self._count("retries")
+            self.log(f"{endpoint} returned {response.status_code}; retrying in {delay:.2f}s")
+            self._sleep(delay)
+        response.raise_for_status()
+        return response
+
+    def fetch_rate(self, date_str, currency):
+        """Return the raw rate for one (date, currency) from the convert API. Raises on failure."""
+        params = {"from": currency, "to": "AUD", "date": date_str, "amount": 1, "access_key": self.access_key}
+        response = self._get("convert", params)
+        data = response.json()
+        if not data.get("success", False):
+            raise ValueError(f"Exchange rate API returned success=false: {data}")
+        # The result is the converted amount (1 unit * rate = rate)
+        return data.get("result", 1.0)
+
+    def fetch_timeseries(self, currency, start_date, end_date):
+        """Return {"YYYY-MM-DD": raw rate} for a date range (see fetch_timeseries)."""
+        params = timeseries_params(currency, start_date, end_date, self.access_key)
+        return parse_timeseries(self._get("timeseries", params).json(), currency)
+
+    def fetch_rates_for_date(self, date_str, currencies):
+        """Return {currency: raw rate} for several currencies on one date in a single request.
+
+        Uses the historical endpoint with AUD as the source currency and inverts
+        the AUD->currency quotes. Currencies the API has no quote for are left out.
+        Raises on HTTP or API errors.
+        """
+        params = {"access_key": self.access_key, "date": date_str, "source": "AUD",
+                  "currencies": ",".join(sorted(currencies))}
+        response = self._get("historical", params)
+        data = response.json()
+        if not data.get("success", False):
+            raise ValueError(f"Exchange rate API returned success=false: {data}")
+        quotes = data.get("quotes") or {}
+        rates = {}
+        for currency in currencies:
+            quote = quotes.get(f"AUD{currency}")
+            if quote:
+                rates[currency] = 1.0 / quote
+        return rates
+
+    def probe_nearest(self, date_str, currency, max_days=7):
+        """Probe outward from date_str (+-1 day, then +-2, ...); return (raw rate, date) of the nearest success.
+
+        The two dates at each distance are probed concurrently, later date
+        preferred, and probing stops at the first distance with an answer, so a
+        rate one day away costs two requests rather than 2 * max_days. Every
+        probe sent is waited for, so only requests actually made count towards
+        the budget; running out of budget ends the search. Returns (None, None)
+        if nothing within max_days has a rate.
+        """
+        target = date.fromisoformat(date_str)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for offset in range(1, max_days + 1):
+                candidates = [(target + timedelta(days=sign * offset)).isoformat() for sign in (1, -1)]
+                futures = [executor.submit(self.fetch_rate, d, currency) for d in candidates]
+                found = None
+                for try_date, future in zip(candidates, futures):
+                    try:
+                        rate = future.result()
+                    except RequestBudgetExceeded as e:
+                        self.log(f"Exchange rate fallback probes stopped: {e}")
+                        return found or (None, None)
+                    except Exception as e:
+                        self.log(f"Exchange rate fetch failed for fallback date {try_date}: {e}")
+                        continue
+                    found = found or (rate, try_date)
+                if found:
+                    return found
+        return None, None
+
+
+class AsyncExchangeRateResolver:
+    """Coalesce concurrent exchange rate lookups and bound how many run at once.
+
+    `lookup(date_str, currency)` is the blocking lookup to run (e.g. the cache +
+    HTTP resolution in aliexpress2json). Lookups for the same (date, currency)
+    that overlap share one in-flight task, so they cost one request; at most
+    `max_concurrency` distinct lookups run at a time.
+
+    The resolver runs its own event loop on a daemon thread, so the in-flight
+    table is shared by every caller: threads use resolve_sync(), coroutines on
+    any event loop use resolve_async().
+    """
+
+    def __init__(self, lookup, max_concurrency=8):
+        self.lookup = lookup
+        self.max_concurrency = max_concurrency
+        self._inflight = {}  # {cache key: asyncio.Task}, only touched on the resolver loop
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._thread = threading.Thread(target=self._loop.run_forever, name="fx-resolver", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    async def _resolve(self, date_str, currency):
+        key = make_cache_key(date_str, currency)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(date_str, currency))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+        # shield: one caller being cancelled must not cancel the shared lookup
+        return await asyncio.shield(task)
+
+    async def _run(self, date_str, currency):
+        async with self._semaphore:
+            return await asyncio.to_thread(self.lookup, date_str, currency)
+
+    def submit(self, date_str, currency):
+        """Schedule a lookup on the resolver loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self._resolve(date_str, currency), self._ensure_loop())
+
+    def resolve_sync(self, date_str, currency):
+        """Blocking lookup, coalesced with any identical lookup already in flight."""
+        return self.submit(date_str, currency).result()
+
+    async def resolve_async(self, date_str, currency):
+        """Awaitable lookup usable from any event loop."""
+        return await asyncio.wrap_future(self.submit(date_str, currency))
+
+    async def resolve_many(self, pairs):
+        """Resolve many (date, currency) pairs concurrently; returns results in input order."""
+        return await asyncio.gather(*(self.resolve_async(d, c) for d, c in pairs))
+
+    def close(self):
+        with self._start_lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = self._thread = self._semaphore = None
+            self._inflight.clear()
+
+
+class ExchangeRateStore:
+    """Durable {date, currency: rate} store in SQLite, safe to share between processes.
+
+    The database runs in WAL mode so readers never block the writer, and each
+    put() commits on its own, so a fetched rate survives a crash or a killed
+    worker. Concurrent writers from other processes wait on SQLite's lock
+    (up to `timeout` seconds) rather than clobbering each other's writes.
+
+    Each row records where its rate came from: the raw API rate, the scale
+    factor applied to it (rate = raw_rate * scale_factor), the date the rate
+    was actually quoted for (source_date, which differs from date when a
+    fallback date was used), the fetch time and the source ("api",
+    "fallback", "timeseries", "historical", "legacy"). Rates imported from the old JSON
+    cache have no raw rate or scale factor.
+
+    A connection is opened lazily per process (and per thread), so a store
+    created before a fork is safe to use in worker processes.
+    """
+
+    COLUMNS = (
+        ("rate", "REAL NOT NULL"),
+        ("raw_rate", "REAL"),
+        ("scale_factor", "REAL"),
+        ("source_date", "TEXT"),
+        ("fetched_at", "TEXT"),
+        ("source", "TEXT"),
+    )
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rates (date TEXT NOT NULL, currency TEXT NOT NULL, "
+            + ", ".join(f"{name} {kind}" for name, kind in self.COLUMNS)
+            + ", PRIMARY KEY (currency, date))"
+        )
+        # Stores created before provenance tracking only have (date, currency, rate)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(rates)")}
+        for name, kind in self.COLUMNS:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE rates ADD COLUMN {name} {kind.replace(' NOT NULL', '')}")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat(timespec="seconds")
+
+    def get(self, date_str, currency, scale_factor=None):
+        """Return the stored rate, or None. With scale_factor, a known raw rate is rescaled to it (as load())."""
+        row = self._connect().execute(
+            "SELECT rate, raw_rate FROM rates WHERE currency = ? AND date = ?", (currency, date_str)).fetchone()
+        if row is None:
+            return None
+        rate, raw_rate = row
+        return raw_rate * scale_factor if scale_factor is not None and raw_rate is not None else rate
+
+    def provenance(self, date_str, currency):
+        """Return the full stored record for (date, currency) as a dict, or None."""
+        cursor = self._connect().execute(
+            "SELECT date, currency, rate, raw_rate, scale_factor, source_date, fetched_at, source "
+            "FROM rates WHERE currency = ? AND date = ?", (currency, date_str))
+        row = cursor.fetchone()
+        return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+    def put(self, date_str, currency, raw_rate, scale_factor=1.0, source_date=None, source="api"):
+        """Insert or replace one rate (stored as raw_rate * scale_factor), committed immediately."""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO rates (date, currency, rate, raw_rate, scale_factor, source_date, fetched_at, source)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (date_str, currency, raw_rate * scale_factor, raw_rate, scale_factor, source_date or date_str,
+             self._now(), source))
+
+    def put_many(self, items, scale_factor=1.0, source="api", replace=True):
+        """Insert (date_str, currency, raw_rate) tuples in one transaction."""
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        now = self._now()
+        rows = [(d, c, raw * scale_factor, raw, scale_factor, d, now, source) for d, c, raw in items]
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                f"{verb} INTO rates (date, currency, rate, raw_rate, scale_factor, source_date, fetched_at, source)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def load(self, scale_factor=None):
+        """Return every stored rate as a {"YYYY-MM-DD_CUR": rate} dict.
+
+        If scale_factor is given, rates with a known raw rate are rescaled to it on
+        the fly (rates without one, e.g. legacy imports, are returned as stored).
+        """
+        if scale_factor is None:
+            rows = self._connect().execute("SELECT date, currency, rate FROM rates")
+        else:
+            rows = self._connect().execute(
+                "SELECT date, currency, CASE WHEN raw_rate IS NULL THEN rate ELSE raw_rate * ? END FROM rates",
+                (scale_factor,))
+        return {make_cache_key(d, c): r for d, c, r in rows}
+
+    def import_json(self, json_path):
+        """Import a legacy exchange_rate_cache.json without overwriting stored rates.
+
+        Returns the number of dated entries read (0 if the file is missing or unreadable).
+        """
+        try:
+            with open(json_path) as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        now = self._now()
+        rows = []
+        for key, rate in legacy.items():
+            date_str, currency = split_cache_key(key)
+            if date_str is not None and isinstance(rate, (int, float)):
+                rows.append((date_str, currency, float(rate), now))
+        if rows:
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO rates (date, currency, rate, fetched_at, source)"
+                    " VALUES (?, ?, ?, ?, 'legacy')", rows)
+        return len(rows)
+
+    # -- maintenance -------------------------------------------------------
+
+    def stats(self):
+        """Return {'rows', 'currencies', 'first_date', 'last_date', 'without_raw_rate', 'by_source'}."""
+        conn = self._connect()
+        rows, currencies, first, last, no_raw = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT currency), MIN(date), MAX(date), "
+            "SUM(raw_rate IS NULL) FROM rates").fetchone()
+        by_source = dict(conn.execute("SELECT COALESCE(source, 'unknown'), COUNT(*) FROM rates GROUP BY 1"))
+        return {"rows": rows, "currencies": currencies, "first_date": first, "last_date": last,
+                "without_raw_rate": no_raw or 0, "by_source": by_source}
+
+    def rescale(self, scale_factor):
+        """Re-apply a new scale factor to every rate with a known raw rate. Returns the number of rows updated."""
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "UPDATE rates SET rate = raw_rate * ?, scale_factor = ? WHERE raw_rate IS NOT NULL",
+                (scale_factor, scale_factor))
+        return cursor.rowcount
+
+    def prune(self, keep_days, today=None):
+        """Retention: delete rates for dates more than keep_days before today. Returns rows deleted."""
+        cutoff = ((today or date.today()) - timedelta(days=keep_days)).isoformat()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute("DELETE FROM rates WHERE date < ?", (cutoff,))
+        return cursor.rowcount
+
+    def evict(self, max_rows):
+        """Bound the store to max_rows, dropping the rates for the oldest dates first. Returns rows deleted.
+
+        Old dates go first because new invoices only ever need recent rates.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "DELETE FROM rates WHERE rowid IN (SELECT rowid FROM rates ORDER BY date DESC, currency"
+                " LIMIT -1 OFFSET ?)", (max_rows,))
+        return cursor.rowcount
+
+    def compact(self):
+        """Drop unusable rows, then checkpoint the WAL and VACUUM to give the space back. Returns rows dropped."""
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute("DELETE FROM rates WHERE rate IS NULL OR rate <= 0 OR date NOT GLOB "
+                                  "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'")
+        dropped = cursor.rowcount
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        return dropped
+
+
+def _parse_rba_date(value):
+    """Parse an RBA table date ("02-Jan-2023") or an ISO date; returns an ISO string or None."""
+    value = value.strip()
+    for fmt in ("%d-%b-%Y", "%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_rba_csv(path):
+    """Read an RBA F11-style CSV of daily AUD crosses.
+
+    The F11 table quotes foreign currency per A$1, one column per currency, with
+    the currency codes in the "Units" header row (or "A$1=USD" style titles).
+    Rates are inverted to AUD per unit of foreign currency, matching the API.
+    Returns {currency: {"YYYY-MM-DD": rate}}; blank and non-numeric cells are skipped.
+    """
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        rows = list(csv.reader(f))
+
+    columns = {}
+    for row in rows:
+        label = row[0].strip().lower() if row else ""
+        if label == "units":
+            columns = {i: v.strip().upper() for i, v in enumerate(row[1:], 1)
+                       if re.fullmatch(r"[A-Z]{3}", v.strip().upper())}
+            break
+        if label == "title" and not columns:
+            for i, v in enumerate(row[1:], 1):
+                m = re.fullmatch(r"A\$1\s*=\s*([A-Z]{3})", v.strip())
+                if m:
+                    columns[i] = m.group(1)
+    if not columns:
+        raise ValueError(f"No currency columns found in {path} (expected a 'Units' or 'Title' header row)")
+
+    rates = {}
+    for row in rows:
+        day = _parse_rba_date(row[0]) if row else None
+        if day is None:
+            continue
+        for i, currency in columns.items():
+            try:
+                value = float(row[i])
+            except (IndexError, ValueError):
+                continue
+            if value > 0:
+                rates.setdefault(currency, {})[day] = 1.0 / value
+    return rates
+
+
+class OfflineRateTable:
+    """Per-currency arrays of historical AUD rates for network-free lookups.
+
+    Each currency has a sorted int32 array of date ordinals and a parallel
+    float64 array of raw (unscaled) AUD-per-unit rates, saved together in one
+    .npz file. Lookups are a binary search, so whole folders convert offline
+    without touching the cache or the network.
+    """
+
+    def __init__(self):
+        self._days = {}   # {currency: np.ndarray of date ordinals, sorted}
+        self._rates = {}  # {currency: np.ndarray of rates}
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        table = cls()
+        with np.load(path) as data:
+            for name in data.files:
+                if name.endswith("_days"):
+                    currency = name[:-len("_days")]
+                    table._days[currency] = data[name]
+                    table._rates[currency] = data[f"{currency}_rates"]
+        return table
+
+    def save(self, path):
+        """Write the table atomically (temp file + os.replace)."""
+        import numpy as np
+        arrays = {}
+        for currency in self._days:
+            arrays[f"{currency}_days"] = self._days[currency]
+            arrays[f"{currency}_rates"] = self._rates[currency]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def add(self, currency, rates_by_date):
+        """Merge {"YYYY-MM-DD": rate} into a currency's arrays; new values win on the same date."""
+        import numpy as np
+        merged = {}
+        if currency in self._days:
+            merged.update(zip(self._days[currency].tolist(), self._rates[currency].tolist()))
+        merged.update((date.fromisoformat(d).toordinal(), r) for d, r in rates_by_date.items())
+        days = sorted(merged)
+        self._days[currency] = np.array(days, dtype=np.int32)
+        self._rates[currency] = np.array([merged[d] for d in days], dtype=np.float64)
+
+    def currencies(self):
+        return sorted(self._days)
+
+    def date_range(self, currency):
+        """Return (first, last) ISO dates held for a currency, or (None, None)."""
+        days = self._days.get(currency)
+        if days is None or not len(days):
+            return None, None
+        return date.fromordinal(int(days[0])).isoformat(), date.fromordinal(int(days[-1])).isoformat()
+
+    def lookup(self, date_str, currency, max_days=7):
+        """Return (raw rate, rate date) for the nearest date within max_days, or (None, None).
+
+        Ties go to the earlier date (as ExchangeRateCache.nearest).
+        """
+        days = self._days.get(currency)
+        if days is None or not len(days) or not date_str:
+            return None, None
+        try:
+            target = date.fromisoformat(date_str).toordinal()
+        except (TypeError, ValueError):
+            return None, None
+        i = int(days.searchsorted(target))
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(days):
+                diff = abs(int(days[j]) - target)
+                if best is None or diff < best[0]:
+                    best = (diff, j)
+        if best is None or best[0] > max_days:
+            return None, None
+        j = best[1]
+        return float(self._rates[currency][j]), date.fromordinal(int(days[j])).isoformat()
+
+
+def import_rba_csv(csv_paths, table_path):
+    """Import RBA F11-style CSVs into the offline table at table_path (merging with it if it exists).
+
+    Later files win where dates overlap. Returns the updated OfflineRateTable.
+    """
+    table = OfflineRateTable.load(table_path) if os.path.exists(table_path) else OfflineRateTable()
+    for csv_path in csv_paths:
+        for currency, rates in parse_rba_csv(csv_path).items():
+            table.add(currency, rates)
+    table.save(table_path)
+    return table
+
+
+def main(argv=None):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Exchange rate cache and offline rate table tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser(
+        "import-rba", help="Import RBA F11-style CSVs of daily AUD crosses into an offline rate table")
+    import_parser.add_argument("csv", nargs="+", help="F11 CSV file(s), e.g. f11.1-data.csv")
+    import_parser.add_argument("-o", "--output", default=os.path.join(script_dir, "offline_rates.npz"),
+                               help="Offline table to create or update (default: offline_rates.npz next to this script)")
+
+    store_help = "Rate store (default: exchange_rate_cache.sqlite next to this script)"
+    default_store = os.path.join(script_dir, "exchange_rate_cache.sqlite")
+    stats_parser = subparsers.add_parser("stats", help="Show what the rate store holds")
+    prune_parser = subparsers.add_parser("prune", help="Delete rates for dates older than --keep-days")
+    prune_parser.add_argument("--keep-days", type=int, required=True, help="Keep rates for this many days back")
+    evict_parser = subparsers.add_parser("evict", help="Bound the store size, dropping the oldest dates first")
+    evict_parser.add_argument("--max-rows", type=int, required=True, help="Maximum number of rates to keep")
+    compact_parser = subparsers.add_parser("compact", help="Drop unusable rows and reclaim disk space")
+    rescale_parser = subparsers.add_parser("rescale", help="Re-apply a new scale factor without refetching")
+    rescale_parser.add_argument("scale_factor", type=float, help="New scale factor, e.g. 1.0165")
+    for sub in (stats_parser, prune_parser, evict_parser, compact_parser, rescale_parser):
+        sub.add_argument("--db", default=default_store, help=store_help)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "import-rba":
+        try:
+            table = import_rba_csv(args.csv, args.output)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        for currency in table.currencies():
+            first, last = table.date_range(currency)
+            print(f"{currency}: {first} to {last}")
+        print(f"Offline rate table saved to {args.output}")
+        return 0
+
+    if not os.path.exists(args.db):
+        print(f"Error: Rate store not found: {args.db}", file=sys.stderr)
+        return 1
+    store = ExchangeRateStore(args.db)
+    if args.command == "stats":
+        for key, value in store.stats().items():
+            print(f"{key}: {value}")
+    elif args.command == "prune":
+        print(f"Deleted {store.prune(args.keep_days)} rate(s)")
+    elif args.command == "evict":
+        print(f"Evicted {store.evict(args.max_rows)} rate(s)")
+    elif args.command == "compact":
+        print(f"Dropped {store.compact()} unusable rate(s)")
+    elif args.command == "rescale":
+        print(f"Rescaled {store.rescale(args.scale_factor)} rate(s) to scale factor {args.scale_factor}")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Import new AliExpress invoice downloads in one pass:
+
+    8158599067129326_payment.pdf -> 2022-11-28 AliExpress 8158599067129326.pdf
+                                  + rows in "AliExpress Transactions FY2023.xlsx"
+
+Each raw download is opened once, in a worker process, and fully parsed
+(aliexpress2json.parse_invoice). The file is renamed from the parsed invoice
+date (as rename_AliExpress_invoices.py would), exchange rates for all new
+invoices are prefetched in bulk, and the converted items are appended to the
+per-financial-year workbooks (see aggregate_aliexpress_invoices.py --by-fy).
+Re-importing an invoice replaces its rows rather than duplicating them.
+
+Downloads that are not AliExpress invoices, or have no items, are left in
+place under their original name. Renames are recorded in .rename_manifest.json
+and logged to rename_log.txt, and the parsed invoices are stored in the
+aggregation parse cache, so later runs of either script do not reopen the PDFs.
+
+Usage:
+    python3 import_aliexpress_invoices.py /path/to/folder [-o output_dir] [--jobs N] [--dry-run]
+"""
+import os
+import sys
+import argparse
+import logging
+
+try:
+    from aliexpress2json import (convert_invoices, format_exchange_rate_stats, invoice_number_from_filename,
+                                 prefetch_exchange_rates)
+    from aggregate_aliexpress_invoices import append_to_fy_workbooks
+    from rename_AliExpress_invoices import (LOG_NAME, file_signature, load_manifest, pending_invoices,
+                                            rename_invoice, save_manifest, scan_invoices, seed_invoice_cache)
+except ImportError:
+    from aliexpress.aliexpress2json import (convert_invoices, format_exchange_rate_stats, invoice_number_from_filename,
+                                            prefetch_exchange_rates)
+    from aliexpress.aggregate_aliexpress_invoices import append_to_fy_workbooks
+    from aliexpress.rename_AliExpress_invoices import (LOG_NAME, file_signature, load_manifest, pending_invoices,
+                                                       rename_invoice, save_manifest, scan_invoices,
+                                                       seed_invoice_cache)
+
+
+def import_invoices(folder_path, output_dir=None, jobs=None, dry_run=False):
+    """Rename, convert and append every new invoice download in a folder. Returns the number not imported."""
+    manifest = load_manifest(folder_path)
+    todo = pending_invoices(folder_path, manifest)
+    if not todo:
+        print(f"No new invoice downloads in {folder_path}")
+        return 0
+
+    failures = 0
+    imported = []   # [(renamed path, scan record)]
+    for filename, record in scan_invoices(folder_path, todo, jobs, extract=True):
+        invoice = record['invoice']
+        error = record['error'] or record['invoice_error'] or (None if invoice and invoice['items'] else 'No items found')
+        if error:
+            failures += 1
+            print(f"Not imported: {filename} ({error})")
+            logging.warning(f"Not imported: {filename} ({error})")
+            if not dry_run:
+                manifest[filename] = dict(file_signature(os.path.join(folder_path, filename)),
+                                          status='not imported', error=error)
+            continue
+
+        new_path = rename_invoice(folder_path, filename, record, manifest, dry_run)
+        if dry_run:
+            print(f"  would import {len(invoice['items'])} item(s)")
+            continue
+        if new_path is None:
+            failures += 1
+            continue
+        invoice_number = invoice_number_from_filename(new_path)
+        for item in invoice['items']:
+            item['Invoice Number'] = invoice_number
+        imported.append((new_path, record))
+
+    if dry_run:
+        return failures
+    save_manifest(folder_path, manifest)
+    if not imported:
+        return failures
+    seed_invoice_cache(folder_path, imported)
+
+    invoices = [record['invoice'] for _, record in imported]
+    requests_made = prefetch_exchange_rates([(invoice['invoice_date'], invoice['currency']) for invoice in invoices])
+    if requests_made:
+        print(f"Prefetched exchange rates with {requests_made} API request(s)")
+    items = convert_invoices(invoices)
+    print(f"Exchange rates: {format_exchange_rate_stats()}")
+
+    for fy, output_file in append_to_fy_workbooks(items, output_dir or folder_path).items():
+        print(f"✓ FY{fy}: {output_file}")
+    print(f"Imported {len(imported)} invoice(s), {len(items)} item(s)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rename new AliExpress invoice downloads and append them to the FY workbooks')
+    parser.add_argument('folder', help='Folder containing invoice PDFs')
+    parser.add_argument('-o', '--output', default=None, help='Directory for the FY workbooks (default: the folder)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would be renamed and imported without changing anything')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f'Error: Folder not found: {args.folder}', file=sys.stderr)
+        sys.exit(1)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    logging.basicConfig(filename=os.path.join(args.folder, LOG_NAME), level=logging.INFO,
+                        format='%(asctime)s - %(message)s')
+    failures = import_invoices(args.folder, args.output, args.jobs, args.dry_run)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,49 +1,270 @@
+#!/usr/bin/env python3
+"""
+Rename AliExpress invoice downloads from the invoice date in the PDF:
+
+    8158599067129326_payment.pdf -> 2022-11-28 AliExpress 8158599067129326.pdf
+
+The invoice number is the part of the file name before the first "_". The date
+is the first YYYY/MM/DD in the PDF; it is looked for on the first page, and
+later pages are only read if the first page has none. PDFs are scanned across a
+process pool.
+
+Renames never overwrite an existing file. Every rename (and every PDF without a
+date) is recorded in .rename_manifest.json in the folder, keyed by file name
+with size and mtime, so reruns skip those files without reopening them. Files
+already named "YYYY-MM-DD ..." are skipped. Renames are logged to
+rename_log.txt in the folder.
+
+With --extract, each invoice is also parsed (see aliexpress2json.parse_invoice)
+from the same open document, and the result is stored in the parse cache used
+by aggregate_aliexpress_invoices.py, so aggregating the folder afterwards does
+not open these PDFs again.
+
+Usage:
+    python3 rename_AliExpress_invoices.py [/path/to/folder] [--dry-run] [--jobs N] [--force] [--extract]
+"""
 import os
 import re
-import fitz  # PyMuPDF
+import sys
+import json
+import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+try:
+    from aliexpress2json import parse_invoice
+except ImportError:
+    from aliexpress.aliexpress2json import parse_invoice
+
+MANIFEST_NAME = '.rename_manifest.json'
+LOG_NAME = 'rename_log.txt'
+DATE_RE = re.compile(r'\d{4}/\d{2}/\d{2}')
+RENAMED_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def extract_date_from_doc(doc):
+    """Return the first YYYY/MM/DD date in an open document, reading one page at a time from the first."""
+    for page in doc:
+        match = DATE_RE.search(page.get_text())
+        if match:
+            return match.group(0)
+    return None
 
-# Configure logging
-logging.basicConfig(filename='rename_log.txt', level=logging.INFO, format='%(asctime)s - %(message)s')
 
 def extract_date_from_pdf(pdf_path):
     """Extracts the first date in YYYY/MM/DD format found in the PDF text."""
     try:
         with fitz.open(pdf_path) as doc:
-            text = "".join(page.get_text() for page in doc)
-        match = re.search(r'\d{4}/\d{2}/\d{2}', text)
-        return match.group(0) if match else None
+            return extract_date_from_doc(doc)
     except Exception as e:
         logging.error(f"Error reading {pdf_path}: {e}")
         return None
 
-def rename_invoices(folder_path):
-    """Renames all PDF files in the folder to 'YYYY-MM-DD AliExpress <invoice_number>.pdf'."""
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith('.pdf'):
-            # Skip files already renamed (start with YYYY-MM-DD)
-            if re.match(r'^\d{4}-\d{2}-\d{2}', filename):
-                logging.info(f"Skipping already renamed file: {filename}")
-                print(f"Skipping: {filename}")
-                continue
-
-            old_path = os.path.join(folder_path, filename)
-            invoice_number = filename.split('_')[0]
-            invoice_date = extract_date_from_pdf(old_path)
-
-            if invoice_date:
-                formatted_date = invoice_date.replace('/', '-')
-                new_filename = f"{formatted_date} AliExpress {invoice_number}.pdf"
-                new_path = os.path.join(folder_path, new_filename)
+
+def scan_invoice(pdf_path, extract=False):
+    """
+    Open a PDF once and return {'date', 'error', 'invoice', 'invoice_error'} (runs in a worker process).
+    With extract, the invoice is also parsed from the same document. The date is always the
+    first YYYY/MM/DD date (DATE_RE), so --extract renames exactly the files a plain run does;
+    the invoice parser also accepts YYYY-MM-DD, which is not a download's date of issue.
+    """
+    record = {'date': None, 'error': None, 'invoice': None, 'invoice_error': None}
+    try:
+        with fitz.open(pdf_path) as doc:
+            if extract:
                 try:
-                    os.rename(old_path, new_path)
-                    logging.info(f"Renamed: {filename} -> {new_filename}")
-                    print(f"Renamed: {filename} -> {new_filename}")
+                    record['invoice'] = parse_invoice(pdf_path, doc=doc)
                 except Exception as e:
-                    logging.error(f"Failed to rename {filename}: {e}")
-            else:
-                logging.warning(f"No date found in {filename}. Skipping.")
-                print(f"No date found in {filename}. Skipping.")
+                    record['invoice_error'] = str(e)
+            record['date'] = extract_date_from_doc(doc)
+    except Exception as e:
+        record['error'] = str(e)
+    return record
+
+
+def invoice_filename(filename, invoice_date):
+    """Build 'YYYY-MM-DD AliExpress <invoice_number>.pdf' from the download name and a YYYY/MM/DD date."""
+    invoice_number = filename.split('_')[0]
+    return f"{invoice_date.replace('/', '-')} AliExpress {invoice_number}.pdf"
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+
+def load_manifest(folder_path):
+    path = os.path.join(folder_path, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'Warning: ignoring unreadable manifest {path}: {e}', file=sys.stderr)
+        return {}
+
+
+def save_manifest(folder_path, manifest):
+    """Write the manifest atomically (temp file + os.replace)."""
+    path = os.path.join(folder_path, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def is_unchanged(manifest, folder_path, filename):
+    """True if `filename` is in the manifest with the same size and mtime (so needs no reopening)."""
+    entry = manifest.get(filename)
+    if not entry:
+        return False
+    try:
+        signature = file_signature(os.path.join(folder_path, filename))
+    except OSError:
+        return False
+    return entry.get('size') == signature['size'] and entry.get('mtime') == signature['mtime']
+
+
+def safe_rename(src, dst):
+    """Rename src to dst unless dst exists. os.link() fails atomically if it does. Returns True if renamed."""
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        return False
+    except OSError:
+        # Filesystem without hard links: check-then-rename
+        if os.path.exists(dst):
+            return False
+        os.rename(src, dst)
+        return True
+    os.unlink(src)
+    return True
+
+
+def seed_invoice_cache(folder_path, parsed):
+    """Store invoices parsed while renaming in aggregate_aliexpress_invoices' parse cache. parsed is [(path, record)]."""
+    try:
+        from aggregate_aliexpress_invoices import cache_entry, file_sha256, load_invoice_cache, save_invoice_cache
+    except ImportError:
+        from aliexpress.aggregate_aliexpress_invoices import (cache_entry, file_sha256, load_invoice_cache,
+                                                              save_invoice_cache)
+    cache = load_invoice_cache(folder_path)
+    for pdf_path, record in parsed:
+        cache[file_sha256(pdf_path)] = cache_entry(pdf_path, record['invoice'], record['invoice_error'])
+    save_invoice_cache(folder_path, cache)
+
+
+def pending_invoices(folder_path, manifest):
+    """Return the PDF file names in a folder that still need renaming, skipping renamed and manifest-recorded files."""
+    todo = []
+    for filename in sorted(os.listdir(folder_path)):
+        if not filename.lower().endswith('.pdf'):
+            continue
+        # Skip files already renamed (start with YYYY-MM-DD)
+        if RENAMED_RE.match(filename):
+            logging.info(f"Skipping already renamed file: {filename}")
+            print(f"Skipping: {filename}")
+            continue
+        if is_unchanged(manifest, folder_path, filename):
+            continue
+        todo.append(filename)
+    return todo
+
+
+def rename_invoice(folder_path, filename, record, manifest, dry_run=False):
+    """
+    Rename one scanned PDF (record from scan_invoice) and record it in the manifest.
+    Returns the new path, or None if it was not renamed (no date, target exists, error or dry run).
+    """
+    old_path = os.path.join(folder_path, filename)
+    if record['error'] or not record['date']:
+        if record['error']:
+            logging.error(f"Error reading {old_path}: {record['error']}")
+        logging.warning(f"No date found in {filename}. Skipping.")
+        print(f"No date found in {filename}. Skipping.")
+        if not dry_run:
+            manifest[filename] = dict(file_signature(old_path), status='no date', error=record['error'])
+        return None
+
+    new_filename = invoice_filename(filename, record['date'])
+    if dry_run:
+        print(f"Would rename: {filename} -> {new_filename}")
+        return None
+    new_path = os.path.join(folder_path, new_filename)
+    try:
+        renamed = safe_rename(old_path, new_path)
+    except OSError as e:
+        logging.error(f"Failed to rename {filename}: {e}")
+        print(f"Failed to rename {filename}: {e}")
+        return None
+    if not renamed:
+        logging.warning(f"Not renamed: {filename} ({new_filename} already exists)")
+        print(f"Not renamed: {filename} ({new_filename} already exists)")
+        manifest[filename] = dict(file_signature(old_path), status='exists', target=new_filename)
+        return None
+    manifest.pop(filename, None)
+    manifest[new_filename] = dict(file_signature(new_path), status='renamed', original=filename)
+    logging.info(f"Renamed: {filename} -> {new_filename}")
+    print(f"Renamed: {filename} -> {new_filename}")
+    return new_path
+
+
+def scan_invoices(folder_path, filenames, jobs=None, extract=False):
+    """Yield (filename, scan_invoice record) in order, scanning the PDFs across a process pool."""
+    paths = [os.path.join(folder_path, f) for f in filenames]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from zip(filenames, executor.map(scan_invoice, paths, [extract] * len(paths),
+                                               chunksize=max(1, len(paths) // 64)))
+
+
+def rename_invoices(folder_path, dry_run=False, jobs=None, force=False, extract=False):
+    """Renames all PDF files in the folder to 'YYYY-MM-DD AliExpress <invoice_number>.pdf'. Returns the number not renamed."""
+    manifest = {} if force else load_manifest(folder_path)
+    todo = pending_invoices(folder_path, manifest)
+    if not todo:
+        return 0
+
+    failures = 0
+    parsed = []
+    for filename, record in scan_invoices(folder_path, todo, jobs, extract):
+        new_path = rename_invoice(folder_path, filename, record, manifest, dry_run)
+        if new_path is None:
+            failures += not (dry_run and record['date'])
+            continue
+        if extract:
+            parsed.append((new_path, record))
+
+    if not dry_run:
+        save_manifest(folder_path, manifest)
+        if parsed:
+            seed_invoice_cache(folder_path, parsed)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rename AliExpress invoice PDFs to "YYYY-MM-DD AliExpress <invoice_number>.pdf"')
+    parser.add_argument('folder', nargs='?', default='.', help='Folder containing invoice PDFs (default: current folder)')
+    parser.add_argument('--dry-run', action='store_true', help='Show the new names without renaming anything')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help=f'Ignore {MANIFEST_NAME} and re-scan every PDF')
+    parser.add_argument('--extract', action='store_true',
+                        help='Also parse each invoice from the same open PDF for aggregate_aliexpress_invoices.py')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f'Error: Folder not found: {args.folder}', file=sys.stderr)
+        sys.exit(1)
+
+    # Configure logging
+    logging.basicConfig(filename=os.path.join(args.folder, LOG_NAME), level=logging.INFO,
+                        format='%(asctime)s - %(message)s')
+    failures = rename_invoices(args.folder, args.dry_run, args.jobs, args.force, args.extract)
+    sys.exit(1 if failures else 0)
+
 
-# Example usage:
-rename_invoices('.')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark the AliExpress invoice item-table parser on synthetic invoices.
+
+Writes invoices with an increasing number of items to a temporary folder and
+reports items/sec for the word-box table parser and the text-line parser
+alone, and for parse_invoice() including PDF text extraction. The line parser
+runs on invoices written as one text column; the others on invoices laid out
+like the real PDF (see _write_table in test_parse_invoice.py).
+
+Usage:
+    python3 aliexpress/test/bench_parse_invoice.py [--items 10 100 1000] [--repeat 5]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from aliexpress.aliexpress2json import parse_invoice, parse_invoice_lines, parse_invoice_words, read_invoice_lines  # noqa: E402
+from aliexpress.test.test_parse_invoice import HEADER, DELIVERY, TOTAL, _item, _write, _write_table  # noqa: E402
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the AliExpress invoice parser')
+    parser.add_argument('--items', type=int, nargs='+', default=[10, 100, 300, 1000], help='Items per invoice')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per size (best is reported)')
+    args = parser.parse_args()
+
+    print(f"{'items':>6} {'pages':>6} {'items/s (words)':>16} {'items/s (lines)':>16} {'items/s (pdf)':>14}")
+    with tempfile.TemporaryDirectory() as folder:
+        for count in args.items:
+            items = [([f'Bulk item {n}', 'Hook And Loop Pad'], n % 7 + 1, 1.0 + n) for n in range(count)]
+            column_pdf = os.path.join(folder, f'2024-07-01 AliExpress {8200000000000000 + count}.pdf')
+            _write(column_pdf, HEADER + [line for item in items for line in _item(*item)] + DELIVERY + TOTAL)
+            table_pdf = os.path.join(folder, f'2024-07-01 AliExpress {8300000000000000 + count}.pdf')
+            _write_table(table_pdf, items + [(['Delivery Charge'], None, 3.3)], rows_per_page=15)
+            _, column_lines, _ = read_invoice_lines(column_pdf)
+            _, _, table_pages = read_invoice_lines(table_pdf)
+
+            for parsed in (parse_invoice_lines(column_lines), parse_invoice_words(table_pages)):
+                if len(parsed['items']) != count:
+                    print(f'Error: parsed {len(parsed["items"])} of {count} items', file=sys.stderr)
+                    sys.exit(1)
+
+            words_time = best_of(args.repeat, parse_invoice_words, table_pages)
+            lines_time = best_of(args.repeat, parse_invoice_lines, column_lines)
+            pdf_time = best_of(args.repeat, parse_invoice, table_pdf)
+            print(f'{count:>6} {len(table_pages):>6} {count / words_time:>16.0f} '
+                  f'{count / lines_time:>16.0f} {count / pdf_time:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+
+class FakeRatesServer(ThreadingHTTPServer):
+    """Local stand-in for the exchangerate.host API.
+
+    `rates` maps currency -> AUD rate (the same rate is returned for every day).
+    If `available` has an entry for a currency, /convert only succeeds on those dates.
+    `delay` adds latency to every response and the next `fail_next` requests get a 503.
+    If `throttle` is set, requests beyond `throttle` per `throttle_window` seconds get a
+    429 with a Retry-After of `retry_after` seconds (counted in `throttled`).
+    Every request is recorded in `requests` as (path, params); `max_inflight` is the
+    highest number of requests seen being handled at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRatesHandler)
+        self.rates = {}
+        self.available = {}
+        self.delay = 0.0
+        self.fail_next = 0
+        self.throttle = None
+        self.throttle_window = 1.0
+        self.retry_after = None
+        self.throttled = 0
+        self._recent = []
+        self.requests = []
+        self.inflight = 0
+        self.max_inflight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, path):
+        return sum(1 for p, _ in self.requests if p == path)
+
+
+class FakeRatesHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.inflight += 1
+            server.max_inflight = max(server.max_inflight, server.inflight)
+        try:
+            self._handle()
+        finally:
+            with server.lock:
+                server.inflight -= 1
+
+    def _handle(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            server.requests.append((url.path, params))
+            fail = server.fail_next > 0
+            if fail:
+                server.fail_next -= 1
+            throttled = False
+            if server.throttle is not None:
+                now = time.monotonic()
+                server._recent = [t for t in server._recent if now - t < server.throttle_window]
+                throttled = len(server._recent) >= server.throttle
+                if throttled:
+                    server.throttled += 1
+                else:
+                    server._recent.append(now)
+        if server.delay:
+            time.sleep(server.delay)
+        if fail:
+            return self._send(503, {"success": False})
+        if throttled:
+            headers = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else None
+            return self._send(429, {"success": False, "error": {"code": 429}}, headers)
+
+        if url.path == "/convert":
+            rate = server.rates.get(params.get("from"))
+            dates = server.available.get(params.get("from"))
+            if rate is None or (dates is not None and params.get("date") not in dates):
+                return self._send(200, {"success": False, "error": {"code": 202}})
+            return self._send(200, {"success": True, "date": params.get("date"), "result": rate})
+
+        if url.path == "/timeseries":
+            source = params.get("source")
+            rate = server.rates.get(source)
+            if rate is None:
+                return self._send(200, {"success": False, "error": {"code": 202}})
+            start = date.fromisoformat(params["start_date"])
+            end = date.fromisoformat(params["end_date"])
+            quotes = {}
+            day = start
+            while day <= end:
+                quotes[day.isoformat()] = {f"{source}AUD": rate}
+                day += timedelta(days=1)
+            return self._send(200, {"success": True, "timeseries": True, "source": source, "quotes": quotes})
+
+        if url.path == "/historical":
+            # Multi-currency quotes from AUD, e.g. {"AUDUSD": 0.66}
+            day = params.get("date")
+            quotes = {}
+            for currency in params.get("currencies", "").split(","):
+                rate = server.rates.get(currency)
+                dates = server.available.get(currency)
+                if rate and (dates is None or day in dates):
+                    quotes[f"AUD{currency}"] = 1.0 / rate
+            return self._send(200, {"success": True, "historical": True, "date": day, "source": "AUD",
+                                    "quotes": quotes})
+
+        self._send(404, {"success": False})
+
+
+@pytest.fixture
+def rates_server():
+    server = FakeRatesServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# Rates the baseline tests take from the real cache they were written against:
+# test_multi_item_invoice_aud_conversion expects 22.45 CNY on 2025-11-08 to be
+# 4.94 AUD. No other CNY date is seeded, so the nearest cached CNY rate to any
+# sample invoice is this one (test_cny_invoice_nearest_cached_rate).
+SEEDED_RATES = {
+    "2025-09-28_USD": 1.53,
+    "2025-11-08_CNY": 0.2200000785,
+}
+
+
+@pytest.fixture(autouse=True)
+def scratch_rate_store(monkeypatch, tmp_path_factory):
+    """Keep every test's rate store, offline table and legacy cache in a scratch folder.
+
+    The lazily loaded globals are cleared (or set) in the module dict directly:
+    monkeypatch.setattr() would read the old value first, and that read opens the
+    real store (module __getattr__). Any ExchangeRateStore opened outside the
+    scratch folder fails the test. The folder is not tmp_path, which some tests
+    list. The scratch legacy cache is seeded with SEEDED_RATES, which the
+    fresh store imports on first use. Returns the module namespace.
+    """
+    import aliexpress.aliexpress2json as module
+    from aliexpress.exchange_rates import ExchangeRateStore
+
+    scratch = tmp_path_factory.mktemp("rates")
+    opened = []
+    outside = []
+
+    def scratch_store(path, *args, **kwargs):
+        # Also checked at teardown, in case the caller swallows the error
+        if not os.path.abspath(path).startswith(str(scratch)):
+            outside.append(path)
+        assert not outside, f"rate store opened outside {scratch}: {path}"
+        store = ExchangeRateStore(path, *args, **kwargs)
+        opened.append(store)
+        return store
+
+    monkeypatch.setattr(module, "ExchangeRateStore", scratch_store)
+    monkeypatch.setattr(module, "RATE_STORE_FILE", str(scratch / "rates.sqlite"))
+    monkeypatch.setattr(module, "OFFLINE_RATES_FILE", str(scratch / "offline_rates.npz"))
+    monkeypatch.setattr(module, "CACHE_FILE", str(scratch / "exchange_rate_cache.json"))
+    with open(module.CACHE_FILE, "w") as f:
+        json.dump(SEEDED_RATES, f)
+    namespace = vars(module)
+    for name in ("rate_store", "exchange_rate_cache", "offline_rates"):
+        monkeypatch.delitem(namespace, name, raising=False)
+    yield namespace
+    for store in opened:
+        store.close()
+    assert outside == [], f"rate store opened outside {scratch}: {outside}"
+
+
+@pytest.fixture
+def fx(rates_server, scratch_rate_store, monkeypatch, tmp_path):
+    """Point aliexpress2json at the local rates server with an empty cache, a scratch store and no offline table."""
+    import aliexpress.aliexpress2json as module
+    from aliexpress.exchange_rates import ExchangeRateCache, ExchangeRateStore
+
+    store = ExchangeRateStore(str(tmp_path / "fx_rates.sqlite"))
+    monkeypatch.setattr(module, "API_BASE_URL", rates_server.url)
+    monkeypatch.setitem(scratch_rate_store, "ACCESS_KEY", "dummy")
+    monkeypatch.setitem(scratch_rate_store, "exchange_rate_cache", ExchangeRateCache())
+    monkeypatch.setitem(scratch_rate_store, "rate_store", store)
+    monkeypatch.setitem(scratch_rate_store, "offline_rates", None)
+    yield rates_server
+    assert scratch_rate_store.get("rate_store") is store, "the scratch rate store was replaced"
+    store.close()
@@ -0,0 +1,131 @@
+import os
+
+import fitz
+import pandas as pd
+
+import aliexpress.aliexpress2json as module
+from aliexpress.aggregate_aliexpress_invoices import process_folder
+
+
+def _invoice(path, invoice_date, currency, items):
+    lines = [
+        "Supplier name", "Test Store", "Platform name", "Alibaba.com Singapore E-Commerce Private",
+        "Date of issue", invoice_date.replace("-", "/"),
+        "Transaction", "Quantity", "Price exclusive of GST", "GST Rate", "GST Amount", "Price inclusive of GST",
+        f"({currency})", f"({currency})", f"({currency})",
+    ]
+    for description, price in items:
+        lines += [description, "1", f"{price / 1.1:.2f}", "10.0 %", f"{price - price / 1.1:.2f}", f"{price:.2f}"]
+    lines.append(f"Total amount inclusive of GST in {currency}")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "\n".join(lines))
+    doc.save(str(path))
+    doc.close()
+
+
+def test_parallel_aggregation_is_ordered_and_captures_errors(fx, tmp_path, capsys):
+    fx.rates = {"USD": 1.5, "CNY": 0.2}
+    folder = tmp_path / "invoices"
+    folder.mkdir()
+    _invoice(folder / "2024-07-10 AliExpress 1000000000001.pdf", "2024-07-10", "USD", [("Widget", 11.0)])
+    _invoice(folder / "2024-08-20 AliExpress 1000000000002.pdf", "2024-08-20", "CNY", [("Gadget", 22.0), ("Gizmo", 5.0)])
+    _invoice(folder / "2024-09-05 AliExpress 1000000000003.pdf", "2024-09-05", "USD", [("Doohickey", 33.0)])
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Not an invoice")
+    doc.save(str(folder / "receipt.pdf"))
+    doc.close()
+
+    output = tmp_path / "out.xlsx"
+    process_folder(str(folder), str(output), jobs=2)
+
+    df = pd.read_excel(output)
+    assert list(df["Description"]) == ["Widget", "Gadget", "Gizmo", "Doohickey"]
+    assert df["Item Cost (AUD)"].iloc[0] == round(11.0 * 1.5 * module.EXCHANGE_RATE_SCALE_FACTOR, 2)
+    # Rates came from one timeseries request per currency, never per invoice
+    assert fx.count("/timeseries") == 2
+    assert fx.count("/convert") == 0
+    assert "receipt.pdf: Error: This does not appear to be an AliExpress invoice" in capsys.readouterr().out
+
+
+def test_rerun_only_parses_new_or_changed_invoices(fx, tmp_path, monkeypatch):
+    import aliexpress.aggregate_aliexpress_invoices as aggregate
+
+    fx.rates = {"USD": 1.5}
+    folder = tmp_path / "invoices"
+    folder.mkdir()
+    _invoice(folder / "2024-07-10 AliExpress 1000000000001.pdf", "2024-07-10", "USD", [("Widget", 11.0)])
+    _invoice(folder / "2024-08-20 AliExpress 1000000000002.pdf", "2024-08-20", "USD", [("Gadget", 22.0)])
+    output = tmp_path / "out.xlsx"
+    process_folder(str(folder), str(output))
+    assert (folder / aggregate.INVOICE_CACHE_NAME).exists()
+
+    parsed = []
+    real_parse = aggregate.parse_invoice
+    monkeypatch.setattr(aggregate, "parse_invoice", lambda path: parsed.append(os.path.basename(path)) or real_parse(path))
+
+    # Change one invoice and rename the other: only the changed one is parsed again
+    _invoice(folder / "2024-08-20 AliExpress 1000000000002.pdf", "2024-08-20", "USD", [("Gadget", 44.0)])
+    os.rename(folder / "2024-07-10 AliExpress 1000000000001.pdf", folder / "2024-07-10 AliExpress 1000000000009.pdf")
+    process_folder(str(folder), str(output))
+
+    assert parsed == ["2024-08-20 AliExpress 1000000000002.pdf"]
+    df = pd.read_excel(output, dtype={"Invoice Number": str})
+    assert list(df["Invoice Number"]) == ["1000000000009", "1000000000002"]
+    assert list(df["Item Cost"]) == [11.0, 44.0]
+    assert df["Item Cost (AUD)"].iloc[0] == round(11.0 * 1.5 * module.EXCHANGE_RATE_SCALE_FACTOR, 2)
+
+    # A parser version bump invalidates every entry
+    parsed.clear()
+    monkeypatch.setattr(aggregate, "PARSER_VERSION", "test")
+    process_folder(str(folder), str(output))
+    assert len(parsed) == 2
+
+
+def test_batch_conversion_matches_per_invoice_conversion(fx):
+    import random
+
+    fx.rates = {"USD": 1.53, "CNY": 0.213, "EUR": 1.67}
+    rng = random.Random(7)
+    invoices = []
+    for n in range(60):
+        currency = rng.choice(["USD", "CNY", "EUR"])
+        fee = rng.choice([None, 0.0, round(rng.uniform(0.01, 9.99), 2)])
+        invoices.append({
+            "invoice_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "currency": currency,
+            "delivery_fee": fee,
+            "delivery_currency": currency if fee is not None else None,
+            "items": [{"Invoice Date": f"2024-01-{n % 28 + 1:02d}", "Invoice Number": str(1000 + n),
+                       "Description": f"Item {n}.{i}", "Quantity": 1, "Item Cost": round(rng.uniform(0.01, 99.99), 2)}
+                      for i in range(rng.randint(1, 7))],
+        })
+    invoices.append({"invoice_date": "2024-05-01", "currency": "USD", "delivery_fee": None,
+                     "delivery_currency": None, "items": []})
+
+    expected = [module.convert_invoice(invoice) for invoice in invoices]
+    items = module.convert_invoices(invoices)
+
+    assert items.to_dict("records") == [item for result in expected for item in result["items"]]
+    assert list(module.invoice_totals(items)) == [result["total_aud"] for result in expected if result["items"]]
+
+
+def test_delivery_is_pro_rated_and_totalled_per_source_invoice(fx):
+    fx.rates = {"USD": 1.5}
+    scale = module.EXCHANGE_RATE_SCALE_FACTOR
+    items = [{"Invoice Number": "1000", "Description": f"Item {i}", "Item Cost": 1.0} for i in range(3)]
+    # Two downloads of different orders that carry the same invoice number
+    invoices = [
+        {"invoice_date": "2024-03-04", "currency": "USD", "delivery_fee": 5.0, "delivery_currency": "USD",
+         "items": items},
+        {"invoice_date": "2024-03-04", "currency": "USD", "delivery_fee": None, "delivery_currency": None,
+         "items": items[:1]},
+    ]
+
+    converted = module.convert_invoices(invoices)
+
+    fee_aud = round(5.0 * 1.5 * scale, 2)
+    share_aud = round(fee_aud / 3, 2)
+    assert list(converted["Prorated Delivery Fee"]) == [1.67, 1.67, 1.67, 0.0]
+    assert list(converted["Prorated Delivery Fee (AUD)"]) == [share_aud, share_aud, round(fee_aud - 2 * share_aud, 2), 0.0]
+    item_aud = round(1.5 * scale, 2)
+    assert list(module.invoice_totals(converted)) == [round(3 * item_aud + fee_aud, 2), item_aud]
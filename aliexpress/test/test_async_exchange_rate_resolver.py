@@ -0,0 +1,35 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import aliexpress.aliexpress2json as module
+from aliexpress.exchange_rates import AsyncExchangeRateResolver, ExchangeRateResolver
+
+
+def test_concurrent_identical_lookups_share_one_request(fx):
+    fx.rates = {"USD": 1.5}
+    fx.delay = 0.3
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        rates = list(executor.map(lambda _: module.get_exchange_rate("2025-03-04", "USD"), range(8)))
+
+    assert fx.count("/convert") == 1
+    assert rates == [pytest.approx(1.5 * module.EXCHANGE_RATE_SCALE_FACTOR)] * 8
+
+
+def test_async_resolver_bounds_concurrency(rates_server):
+    rates_server.rates = {"CNY": 0.2}
+    rates_server.delay = 0.1
+    http = ExchangeRateResolver("dummy", rates_server.url)
+    resolver = AsyncExchangeRateResolver(http.fetch_rate, max_concurrency=2)
+    pairs = [(f"2025-03-0{day}", "CNY") for day in range(1, 7)] * 2
+
+    try:
+        results = asyncio.run(resolver.resolve_many(pairs))
+    finally:
+        resolver.close()
+        http.close()
+
+    assert results == [0.2] * len(pairs)
+    assert rates_server.count("/convert") == 6
+    assert rates_server.max_inflight <= 2
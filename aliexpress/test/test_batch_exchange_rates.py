@@ -0,0 +1,39 @@
+import pytest
+import aliexpress.aliexpress2json as module
+
+
+def test_prefetch_fetches_each_dates_currencies_in_one_request(fx):
+    fx.rates = {"USD": 1.5, "CNY": 0.2, "EUR": 1.6}
+    pairs = [("2024-03-04", "USD"), ("2024-03-04", "CNY"), ("2024-03-04", "EUR"),
+             ("2025-06-10", "USD"), ("2025-06-10", "CNY"), ("2024-03-04", "USD")]
+
+    # Two dates beat five timeseries windows (three currencies, dates over a year apart)
+    assert module.prefetch_exchange_rates(pairs) == 2
+    assert fx.count("/historical") == 2
+    assert fx.count("/timeseries") == 0
+
+    rates = [module.get_exchange_rate(d, c) for d, c in pairs[:3]]
+    assert rates == [pytest.approx(r * module.EXCHANGE_RATE_SCALE_FACTOR) for r in (1.5, 0.2, 1.6)]
+    assert fx.count("/convert") == 0
+    assert module.rate_store.provenance("2024-03-04", "CNY")["source"] == "historical"
+
+
+def test_prefetch_keeps_timeseries_for_one_currency_over_many_dates(fx):
+    fx.rates = {"USD": 1.5}
+    pairs = [("2024-07-10", "USD"), ("2024-08-20", "USD"), ("2024-09-05", "USD")]
+
+    assert module.prefetch_exchange_rates(pairs) == 1
+    assert fx.count("/timeseries") == 1
+    assert fx.count("/historical") == 0
+
+
+def test_currencies_missing_from_a_dates_batch_fall_back(fx):
+    fx.rates = {"USD": 1.5, "CNY": 0.2}
+    fx.available = {"CNY": {"2025-03-05"}}
+
+    assert module.prefetch_exchange_rates([("2025-03-04", "USD"), ("2025-03-04", "CNY")]) == 1
+    assert module.get_exchange_rate("2025-03-04", "USD", return_date=True)[1] == "2025-03-04"
+    # CNY had no quote for the date: get_exchange_rate probes the nearby dates itself
+    cny = module.get_exchange_rate("2025-03-04", "CNY", return_date=True)
+    assert cny == (pytest.approx(0.2 * module.EXCHANGE_RATE_SCALE_FACTOR), "2025-03-05")
+    assert fx.count("/historical") == 1
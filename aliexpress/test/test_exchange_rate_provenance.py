@@ -0,0 +1,62 @@
+import sqlite3
+from datetime import date
+
+import pytest
+import aliexpress.aliexpress2json as module
+from aliexpress.exchange_rates import ExchangeRateStore
+
+
+def test_fallback_rate_records_provenance(fx):
+    fx.rates = {"USD": 1.5}
+    fx.available = {"USD": {"2025-08-31"}}
+    module.get_exchange_rate("2025-08-30", "USD")
+
+    record = module.rate_store.provenance("2025-08-31", "USD")
+    assert record["raw_rate"] == 1.5
+    assert record["scale_factor"] == module.EXCHANGE_RATE_SCALE_FACTOR
+    assert record["rate"] == pytest.approx(1.5 * module.EXCHANGE_RATE_SCALE_FACTOR)
+    assert record["source"] == "fallback"
+    assert record["fetched_at"]
+    # Nothing is stored under the requested date
+    assert module.rate_store.provenance("2025-08-30", "USD") is None
+
+
+def test_rescale_without_refetching(tmp_path):
+    store = ExchangeRateStore(str(tmp_path / "rates.sqlite"))
+    store.put("2025-01-02", "USD", 1.6, scale_factor=1.0165)
+    assert store.load(scale_factor=1.0) == {"2025-01-02_USD": 1.6}
+
+    assert store.rescale(1.02) == 1
+    assert store.get("2025-01-02", "USD") == pytest.approx(1.632)
+    assert store.provenance("2025-01-02", "USD")["scale_factor"] == 1.02
+
+
+def test_retention_eviction_and_compaction(tmp_path):
+    store = ExchangeRateStore(str(tmp_path / "rates.sqlite"))
+    store.put_many([(f"2024-0{m}-01", "USD", 1.5) for m in range(1, 10)])
+    store.put_many([(f"2024-0{m}-01", "CNY", 0.2) for m in range(1, 10)])
+
+    assert store.prune(keep_days=220, today=date(2024, 12, 31)) == 10  # Jan-May dropped
+    assert store.evict(max_rows=4) == 4
+    assert sorted(store.load()) == ["2024-08-01_CNY", "2024-08-01_USD", "2024-09-01_CNY", "2024-09-01_USD"]
+
+    store._connect().execute("INSERT INTO rates (date, currency, rate) VALUES ('bad', 'USD', 0)")
+    assert store.compact() == 1
+    assert store.stats()["rows"] == 4
+
+
+def test_store_from_before_provenance_is_upgraded(tmp_path):
+    path = str(tmp_path / "rates.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE rates (date TEXT NOT NULL, currency TEXT NOT NULL, rate REAL NOT NULL,"
+                 " PRIMARY KEY (currency, date))")
+    conn.execute("INSERT INTO rates VALUES ('2025-01-02', 'USD', 1.6)")
+    conn.commit()
+    conn.close()
+
+    store = ExchangeRateStore(path)
+    # Without a raw rate the stored value is kept as is, even when rescaling
+    assert store.load(scale_factor=2.0) == {"2025-01-02_USD": 1.6}
+    assert store.rescale(2.0) == 0
+    store.put("2025-01-03", "USD", 1.5, 1.0165)
+    assert store.stats()["without_raw_rate"] == 1
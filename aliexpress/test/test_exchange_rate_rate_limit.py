@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import aliexpress.aliexpress2json as module
+from aliexpress.exchange_rates import ExchangeRateResolver, RequestBudgetExceeded, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_rate_burst_and_pause():
+    clock = FakeClock()
+    bucket = TokenBucket(2, capacity=2, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire() == 0 and bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock.now += 10
+    bucket.pause(1.0)
+    assert bucket.acquire() == pytest.approx(1.5)
+
+
+def test_resolver_backs_off_on_429(rates_server):
+    rates_server.rates = {"USD": 1.5}
+    rates_server.throttle = 2
+    rates_server.throttle_window = 0.3
+    rates_server.retry_after = 0.3
+    # The limiter allows far more than the server does; 429s pause it for every thread
+    resolver = ExchangeRateResolver("dummy", rates_server.url, retries=8, backoff=0.05, rate_limit=50, burst=4)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        rates = list(executor.map(lambda d: resolver.fetch_rate(f"2024-07-{d:02d}", "USD"), range(1, 9)))
+    resolver.close()
+
+    assert rates == [1.5] * 8
+    assert rates_server.throttled > 0
+    assert resolver.stats["throttled"] == rates_server.throttled
+    assert resolver.stats["requests"] == len(rates_server.requests)
+
+
+def test_token_bucket_keeps_resolver_under_server_limit(rates_server):
+    rates_server.rates = {"USD": 1.5}
+    rates_server.throttle = 3
+    rates_server.throttle_window = 0.5
+    resolver = ExchangeRateResolver("dummy", rates_server.url, retries=0, rate_limit=4, burst=1)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        rates = list(executor.map(lambda d: resolver.fetch_rate(f"2024-07-{d:02d}", "USD"), range(1, 7)))
+    resolver.close()
+
+    assert rates == [1.5] * 6
+    assert rates_server.throttled == 0
+    assert resolver.stats["limiter_wait"] > 0
+
+
+def test_request_budget(rates_server):
+    rates_server.rates = {"USD": 1.5}
+    resolver = ExchangeRateResolver("dummy", rates_server.url, budget=2)
+    resolver.fetch_rate("2024-07-01", "USD")
+    resolver.fetch_timeseries("USD", "2024-07-01", "2024-07-05")
+    with pytest.raises(RequestBudgetExceeded):
+        resolver.fetch_rate("2024-07-02", "USD")
+    resolver.close()
+    assert len(rates_server.requests) == 2
+    assert resolver.stats["over_budget"] == 1
+
+
+def test_exhausted_budget_falls_back_visibly_and_is_reported(fx, monkeypatch, capsys):
+    monkeypatch.setattr(module, "REQUEST_BUDGET", 1)
+    monkeypatch.setattr(module, "_fallback_warned", set())
+    before = module.exchange_rate_stats()
+
+    fx.rates = {"USD": 1.5, "CNY": 0.2}
+    first = module.get_exchange_rate("2024-07-01", "USD")
+    again = module.get_exchange_rate("2024-07-01", "USD")
+    over_budget = module.get_exchange_rate("2024-07-01", "CNY")
+
+    assert first == again == pytest.approx(1.5 * module.EXCHANGE_RATE_SCALE_FACTOR)
+    assert over_budget == 1.0
+    assert fx.count("/convert") == 1 and len(fx.requests) == 1
+    err = capsys.readouterr().err
+    assert "request budget of 1 used up" in err
+    assert "no CNY rate available for 2024-07-01; using 1.0" in err
+
+    after = module.exchange_rate_stats()
+    assert after["requests"] == 1
+    assert after["over_budget"] >= 1
+    assert after["api"] - before["api"] == 1
+    assert after["cache"] - before["cache"] == 1
+    assert after["default"] - before["default"] == 1
+    assert "1 API request(s) for" in module.format_exchange_rate_stats(after)
@@ -0,0 +1,60 @@
+import time
+import pytest
+import aliexpress.aliexpress2json as module
+from aliexpress.exchange_rates import ExchangeRateResolver
+
+
+@pytest.fixture
+def resolver(rates_server):
+    r = ExchangeRateResolver("dummy", rates_server.url, backoff=0.01)
+    yield r
+    r.close()
+
+
+def test_fallback_probes_go_outward_and_stop_at_the_nearest(rates_server, resolver):
+    rates_server.rates = {"CNY": 0.2}
+    rates_server.available = {"CNY": {"2025-08-26", "2025-09-01", "2025-09-03"}}
+    rates_server.delay = 0.2
+
+    start = time.monotonic()
+    assert resolver.probe_nearest("2025-08-29", "CNY") == (0.2, "2025-09-01")
+    # Both dates at each distance are probed together: 3 round trips, not 6, and nothing past 3 days
+    assert time.monotonic() - start < 1.0
+    assert rates_server.count("/convert") == 6
+    assert resolver.stats["requests"] == 6
+
+
+def test_probe_returns_none_when_all_fail(rates_server, resolver):
+    rates_server.rates = {"CNY": 0.2}
+    rates_server.available = {"CNY": set()}
+    assert resolver.probe_nearest("2025-08-29", "CNY", max_days=2) == (None, None)
+    assert rates_server.count("/convert") == 4
+
+
+def test_probes_stop_when_the_budget_runs_out(rates_server):
+    rates_server.rates = {"CNY": 0.2}
+    rates_server.available = {"CNY": {"2025-09-03"}}
+    resolver = ExchangeRateResolver("dummy", rates_server.url, budget=3)
+    try:
+        assert resolver.probe_nearest("2025-08-29", "CNY") == (None, None)
+    finally:
+        resolver.close()
+    assert rates_server.count("/convert") == 3
+    assert resolver.stats["requests"] == 3
+
+
+def test_transient_errors_are_retried(rates_server, resolver):
+    rates_server.rates = {"USD": 1.5}
+    rates_server.fail_next = 2
+    assert resolver.fetch_rate("2025-08-29", "USD") == 1.5
+    assert rates_server.count("/convert") == 3
+
+
+def test_get_exchange_rate_uses_nearest_fallback(fx):
+    fx.rates = {"USD": 1.5}
+    fx.available = {"USD": {"2025-08-31"}}
+
+    rate, rate_date = module.get_exchange_rate("2025-08-30", "USD", return_date=True)
+    assert rate_date == "2025-08-31"
+    assert rate == pytest.approx(1.5 * module.EXCHANGE_RATE_SCALE_FACTOR)
+    assert module.exchange_rate_cache.get_rate("2025-08-31", "USD") == rate
@@ -0,0 +1,46 @@
+import json
+from multiprocessing import get_context
+
+import aliexpress.aliexpress2json as module
+from aliexpress.exchange_rates import ExchangeRateStore
+
+
+def _write_rates(args):
+    path, currency = args
+    store = ExchangeRateStore(path)
+    for day in range(1, 29):
+        store.put(f"2025-02-{day:02d}", currency, day / 100)
+    store.close()
+
+
+def test_concurrent_processes_share_the_store(tmp_path):
+    path = str(tmp_path / "rates.sqlite")
+    currencies = ["USD", "CNY", "EUR", "GBP"]
+    with get_context("spawn").Pool(4) as pool:
+        pool.map(_write_rates, [(path, c) for c in currencies])
+
+    rates = ExchangeRateStore(path).load()
+    assert len(rates) == 28 * len(currencies)
+    assert rates["2025-02-14_EUR"] == 0.14
+
+
+def test_legacy_json_is_imported_without_overwriting(tmp_path):
+    legacy = tmp_path / "exchange_rate_cache.json"
+    legacy.write_text(json.dumps({"2025-08-29_CNY": 0.22, "2025-10-10_USD": 1.5}))
+    store = ExchangeRateStore(str(tmp_path / "rates.sqlite"))
+    store.put("2025-10-10", "USD", 1.6)
+
+    assert store.import_json(str(legacy)) == 2
+    assert store.load() == {"2025-08-29_CNY": 0.22, "2025-10-10_USD": 1.6}
+
+
+def test_fetched_rates_are_persisted_immediately(fx):
+    fx.rates = {"USD": 1.5}
+    rate = module.get_exchange_rate("2025-03-04", "USD")
+
+    # A fresh connection (as another process would open) sees the rate at once
+    assert ExchangeRateStore(module.rate_store.path).get("2025-03-04", "USD") == rate
+
+    # Rates seeded straight into the in-memory cache are not persisted
+    module.exchange_rate_cache["2025-03-05_USD"] = 9.9
+    assert module.rate_store.get("2025-03-05", "USD") is None
@@ -0,0 +1,38 @@
+import json
+from aliexpress.exchange_rates import ExchangeRateCache
+
+
+def test_nearest_and_latest_lookups():
+    cache = ExchangeRateCache({
+        "2025-08-29_CNY": 0.22,
+        "2025-11-08_CNY": 0.2200000785,
+        "2025-10-10_USD": 1.5,
+        "2025-09-01_CNY": 0.215,
+    })
+    assert cache.dates("CNY") == ["2025-08-29", "2025-09-01", "2025-11-08"]
+    assert cache.nearest("2025-08-30", "CNY") == (0.22, "2025-08-29")
+    assert cache.nearest("2025-10-20", "CNY") == (0.2200000785, "2025-11-08")
+    assert cache.nearest("2026-01-01", "CNY") == (0.2200000785, "2025-11-08")
+    assert cache.nearest("2025-10-20", "CNY", max_days=7) == (None, None)
+    assert cache.nearest("2025-10-20", "EUR") == (None, None)
+    assert cache.nearest("not-a-date", "CNY") == (None, None)
+    assert cache.latest("CNY") == (0.2200000785, "2025-11-08")
+    assert cache.latest("EUR") == (None, None)
+
+
+def test_index_follows_dict_mutations_and_json_round_trip():
+    cache = ExchangeRateCache()
+    cache["2025-08-29_CNY"] = 0.22
+    cache["2025-08-29_CNY"] = 0.23  # overwrite does not duplicate the date
+    cache.setdefault("2025-07-01_CNY", 0.21)
+    assert cache.dates("CNY") == ["2025-07-01", "2025-08-29"]
+
+    del cache["2025-08-29_CNY"]
+    assert cache.latest("CNY") == (0.21, "2025-07-01")
+    cache.pop("2025-07-01_CNY")
+    assert cache.currencies() == []
+
+    cache["2025-10-10_USD"] = 1.5
+    reloaded = ExchangeRateCache(json.loads(json.dumps(cache)))
+    assert reloaded == {"2025-10-10_USD": 1.5}
+    assert reloaded.nearest("2025-10-11", "USD") == (1.5, "2025-10-10")
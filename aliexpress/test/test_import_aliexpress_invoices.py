@@ -0,0 +1,53 @@
+import os
+
+import fitz
+import pandas as pd
+
+import aliexpress.aggregate_aliexpress_invoices as aggregate
+import aliexpress.aliexpress2json as module
+from aliexpress.import_aliexpress_invoices import import_invoices
+from aliexpress.test.test_aggregate_aliexpress_invoices import _invoice
+
+
+def test_import_renames_and_appends_to_fy_workbooks(fx, tmp_path, monkeypatch):
+    fx.rates = {"USD": 1.5, "CNY": 0.2}
+    _invoice(tmp_path / "1000000000001_payment.pdf", "2024-06-20", "USD", [("Widget", 11.0)])
+    _invoice(tmp_path / "1000000000002_payment.pdf", "2024-08-20", "CNY", [("Gadget", 22.0), ("Gizmo", 5.0)])
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Not an invoice 2024/08/21")
+    doc.save(str(tmp_path / "receipt_1.pdf"))
+    doc.close()
+
+    assert import_invoices(str(tmp_path), jobs=2) == 1
+
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith(".pdf")) == [
+        "2024-06-20 AliExpress 1000000000001.pdf",
+        "2024-08-20 AliExpress 1000000000002.pdf",
+        "receipt_1.pdf",
+    ]
+    fy2024 = pd.read_excel(tmp_path / "AliExpress Transactions FY2024.xlsx", dtype={"Invoice Number": str})
+    fy2025 = pd.read_excel(tmp_path / "AliExpress Transactions FY2025.xlsx", dtype={"Invoice Number": str})
+    assert list(fy2024["Invoice Number"]) == ["1000000000001"]
+    assert list(fy2025["Description"]) == ["Gadget", "Gizmo"]
+    assert fy2025["Item Cost (AUD)"].iloc[0] == round(22.0 * 0.2 * module.EXCHANGE_RATE_SCALE_FACTOR, 2)
+
+    # A new download is appended; the imported PDFs are neither reopened nor duplicated
+    _invoice(tmp_path / "1000000000003_payment.pdf", "2024-09-01", "USD", [("Doohickey", 33.0)])
+    assert import_invoices(str(tmp_path), jobs=2) == 0
+    fy2025 = pd.read_excel(tmp_path / "AliExpress Transactions FY2025.xlsx", dtype={"Invoice Number": str})
+    assert list(fy2025["Invoice Number"]) == ["1000000000002", "1000000000002", "1000000000003"]
+
+    # The aggregation parse cache was filled by the import
+    monkeypatch.setattr(aggregate, "parse_invoice", lambda path: (_ for _ in ()).throw(AssertionError(path)))
+    pdf_files = sorted(str(tmp_path / f) for f in os.listdir(tmp_path) if f.startswith("2024-"))
+    items, errors = aggregate.extract_invoices(pdf_files, cache=aggregate.load_invoice_cache(str(tmp_path)))
+    assert errors == [] and len(items) == 4
+
+
+def test_appending_an_invoice_again_replaces_its_rows(tmp_path):
+    item = {"Invoice Date": "2024-08-20", "Invoice Number": "1000000000002", "Description": "Gadget", "Item Cost": 22.0}
+    aggregate.append_to_fy_workbooks([item, dict(item, Description="Gizmo")], str(tmp_path))
+    aggregate.append_to_fy_workbooks([dict(item, **{"Invoice Number": "1000000000001", "Invoice Date": "2024-07-01"}),
+                                      dict(item, **{"Item Cost": 23.0})], str(tmp_path))
+    df = pd.read_excel(tmp_path / "AliExpress Transactions FY2025.xlsx", dtype={"Invoice Number": str})
+    assert list(zip(df["Invoice Number"], df["Item Cost"])) == [("1000000000001", 22.0), ("1000000000002", 23.0)]
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import aliexpress.aliexpress2json as module
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_import_needs_no_api_key_and_loads_nothing(tmp_path):
+    db = tmp_path / "rates.sqlite"
+    env = {k: v for k, v in os.environ.items() if k != "API_KEY"}
+    env.update(EXCHANGE_RATE_DB=str(db), PYTHONPATH=REPO_ROOT)
+    code = (
+        "import aliexpress.aliexpress2json as m\n"
+        "assert 'exchange_rate_cache' not in vars(m) and 'ACCESS_KEY' not in vars(m)\n"
+        "assert 'dotenv' not in __import__('sys').modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, check=True)
+    assert not db.exists()
+
+
+def test_missing_api_key_skips_http(fx, monkeypatch):
+    monkeypatch.setattr(module, "ACCESS_KEY", None)
+    fx.rates = {"USD": 1.5}
+    module.exchange_rate_cache["2025-01-01_USD"] = 1.4
+
+    # Cached rates still work; uncached currencies fall back without any request
+    assert module.get_exchange_rate("2025-03-04", "USD") == 1.4
+    assert module.get_exchange_rate("2025-03-04", "EUR") == 1.0
+    assert module.prefetch_exchange_rates([("2025-03-04", "EUR")]) == 0
+    assert fx.requests == []
@@ -0,0 +1,59 @@
+import pytest
+import aliexpress.aliexpress2json as module
+from aliexpress.exchange_rates import OfflineRateTable, main, parse_rba_csv
+
+# Trimmed-down layout of the RBA F11.1 table (foreign currency per A$1)
+F11_CSV = """﻿F11.1  EXCHANGE RATES,,,
+Title,A$1=USD,Trade-weighted Index May 1970 = 100,A$1=CNY
+Description,AUD/USD Exchange Rate,Trade-weighted Index,AUD/CNY Exchange Rate
+Frequency,Daily,Daily,Daily
+Type,Indicative,Indicative,Indicative
+Units,USD,Index,CNY
+,,,
+Source,WM/Reuters,RBA,WM/Reuters
+Publication date,02-Jan-2025,02-Jan-2025,02-Jan-2025
+Series ID,FXRUSD,FXRTWI,FXRCR
+02-Jan-2025,0.6200,60.10,4.5400
+03-Jan-2025,0.6250,60.20,4.5500
+06-Jan-2025,0.6300,60.30,
+"""
+
+
+@pytest.fixture
+def f11(tmp_path):
+    path = tmp_path / "f11.1-data.csv"
+    path.write_text(F11_CSV, encoding="utf-8")
+    return str(path)
+
+
+def test_parse_rba_csv_inverts_to_aud_per_unit(f11):
+    rates = parse_rba_csv(f11)
+    assert set(rates) == {"USD", "CNY"}
+    assert rates["USD"]["2025-01-02"] == pytest.approx(1 / 0.62)
+    assert "2025-01-06" not in rates["CNY"]
+
+
+def test_import_and_nearest_lookup(f11, tmp_path):
+    out = str(tmp_path / "offline_rates.npz")
+    assert main(["import-rba", f11, "-o", out]) == 0
+
+    table = OfflineRateTable.load(out)
+    assert table.date_range("USD") == ("2025-01-02", "2025-01-06")
+    # Saturday 4 Jan is nearest to Friday 3 Jan
+    assert table.lookup("2025-01-04", "USD") == (pytest.approx(1 / 0.625), "2025-01-03")
+    assert table.lookup("2025-02-20", "USD") == (None, None)
+    assert table.lookup("2025-01-04", "EUR") == (None, None)
+
+
+def test_offline_table_is_used_before_http(f11, tmp_path, fx, monkeypatch):
+    table = OfflineRateTable()
+    for currency, rates in parse_rba_csv(f11).items():
+        table.add(currency, rates)
+    monkeypatch.setattr(module, "offline_rates", table)
+    fx.rates = {"USD": 9.9}
+
+    rate, rate_date = module.get_exchange_rate("2025-01-02", "USD", return_date=True)
+    assert rate_date == "2025-01-02"
+    assert rate == pytest.approx(module.EXCHANGE_RATE_SCALE_FACTOR / 0.62)
+    assert module.prefetch_exchange_rates([("2025-01-03", "CNY")]) == 0
+    assert fx.requests == []
@@ -0,0 +1,148 @@
+import fitz
+
+from aliexpress.aliexpress2json import parse_invoice, parse_invoice_lines, parse_invoice_words, read_invoice_lines
+
+HEADER = [
+    "Supplier name", "Test Store", "Platform name", "Alibaba.com Singapore E-Commerce Private",
+    "Date of issue", "2024/07/01",
+    "Transaction", "Quantity", "Price exclusive of GST", "GST Rate", "GST Amount", "Price inclusive of GST",
+    "(USD)", "(USD)", "(USD)",
+]
+DELIVERY = ["Delivery Charge", "3.00", "10.0 %", "0.30", "3.30"]
+TOTAL = ["Total amount inclusive of GST in USD", "1.00", "2.00"]
+
+
+def _item(description, quantity, price):
+    return description + [str(quantity), f"{price / 1.1:.2f}", "10.0 %", f"{price - price / 1.1:.2f}", f"{price:.2f}"]
+
+
+def _write(path, lines, lines_per_page=60):
+    doc = fitz.open()
+    for start in range(0, len(lines), lines_per_page):
+        doc.new_page().insert_text((50, 50), "\n".join(lines[start:start + lines_per_page]), fontsize=9)
+    doc.save(str(path))
+    doc.close()
+
+
+# Right edges of the numeric columns in a real AliExpress tax invoice
+COLUMNS = {"Quantity": 458.2, "Price exclusive of GST": 540.3, "GST Rate": 595.0,
+           "GST Amount": 649.7, "Price inclusive of GST": 731.7}
+ROW_HEIGHT = 17.0
+FONT_SIZE = 7
+
+
+def _right(page, y, text, right_edge):
+    page.insert_text((right_edge - fitz.get_text_length(text, fontsize=FONT_SIZE), y), text, fontsize=FONT_SIZE)
+
+
+def _write_table(path, rows, rows_per_page=40):
+    """Lay invoice rows out like the real PDF: wrapped descriptions on the left, right-aligned numbers
+    vertically centred on the description. Rows are (description_lines, quantity or None, price)."""
+    doc = fitz.open()
+    page = None
+    for n, (description, quantity, price) in enumerate(rows):
+        if n % rows_per_page == 0:
+            page = doc.new_page(width=810, height=954)
+            if n == 0:
+                page.insert_text((78, 125), "Supplier name", fontsize=FONT_SIZE)
+                page.insert_text((187, 125), "Test Store", fontsize=FONT_SIZE)
+                page.insert_text((187, 145), "Alibaba.com Singapore E-Commerce Private", fontsize=FONT_SIZE)
+                page.insert_text((607, 238), "2024/07/01", fontsize=FONT_SIZE)
+            page.insert_text((78, 265), "Transaction", fontsize=FONT_SIZE)
+            for label, right_edge in COLUMNS.items():
+                _right(page, 265, label, right_edge)
+            for right_edge in list(COLUMNS.values())[1::2] + [COLUMNS["Price inclusive of GST"]]:
+                _right(page, 283, "(USD)", right_edge)
+            y = 303.0
+        for k, line in enumerate(description):
+            page.insert_text((78, y + k * ROW_HEIGHT), line, fontsize=FONT_SIZE)
+        middle = y + (len(description) - 1) * ROW_HEIGHT / 2
+        cells = {"Price exclusive of GST": f"{price / 1.1:.2f}", "GST Rate": "10.0 %",
+                 "GST Amount": f"{price - price / 1.1:.2f}", "Price inclusive of GST": f"{price:.2f}"}
+        if quantity is not None:
+            cells["Quantity"] = str(quantity)
+        for label, text in cells.items():
+            _right(page, middle, text, COLUMNS[label])
+        y += len(description) * ROW_HEIGHT + 2
+    page.insert_text((78, y), "Total amount inclusive of GST in USD", fontsize=FONT_SIZE)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_large_multipage_invoice(tmp_path):
+    items = [([f"Bulk item {n}", "Hook And Loop Pad"], n % 7 + 1, 1.0 + n) for n in range(300)]
+    lines = HEADER + [line for item in items for line in _item(*item)] + DELIVERY + TOTAL
+    pdf = tmp_path / "2024-07-01 AliExpress 8200000000000001.pdf"
+    _write(pdf, lines)
+    with fitz.open(str(pdf)) as doc:
+        assert len(doc) > 1
+
+    invoice = parse_invoice(str(pdf))
+
+    assert invoice["invoice_date"] == "2024-07-01"
+    assert invoice["currency"] == "USD"
+    assert invoice["delivery_fee"] == 3.3
+    assert len(invoice["items"]) == 300
+    for row, (description, quantity, price) in zip(invoice["items"], items):
+        assert row["Description"] == " ".join(description)
+        assert row["Quantity"] == quantity
+        assert row["Item Cost"] == price
+        assert row["Invoice Number"] == "8200000000000001"
+        assert row["Branch"] == "Test Store"
+
+
+def test_shipping_in_description_is_not_the_delivery_row():
+    lines = ["Shipping address", "1 Test St"] + HEADER + _item(["Free Shipping Widget"], 3, 7.5) + DELIVERY + TOTAL
+    parsed = parse_invoice_lines(lines)
+    assert parsed["items"] == [("Free Shipping Widget", 3, 7.5)]
+    assert parsed["delivery_fee"] == 3.3
+
+
+def test_no_item_table():
+    parsed = parse_invoice_lines(HEADER[:6] + ["no table here"])
+    assert parsed["invoice_date"] == "2024-07-01"
+    assert parsed["currency"] is None
+    assert parsed["items"] == []
+    assert parsed["delivery_fee"] is None
+
+
+def test_word_parser_handles_wrapped_descriptions(tmp_path):
+    rows = [
+        (["Brand® Gadget with a long", "description that wraps", "over three lines"], 2, 9.9),
+        (["Plain"], 1, 4.0),
+        (["1PC 2/3/5/6 Inch Hook And Loop", "Backing Pad"], 5, 113.96),
+        (["Delivery Charge"], None, 21.36),
+    ]
+    pdf = tmp_path / "2024-07-01 AliExpress 8200000000000002.pdf"
+    _write_table(pdf, rows)
+
+    _, _, pages = read_invoice_lines(str(pdf))
+    table = parse_invoice_words(pages)
+
+    assert table["currency"] == "USD"
+    assert table["delivery_fee"] == 21.36
+    assert table["items"] == [
+        ("Brand® Gadget with a long description that wraps over three lines", 2, 9.9),
+        ("Plain", 1, 4.0),
+        ("1PC 2/3/5/6 Inch Hook And Loop Backing Pad", 5, 113.96),
+    ]
+    invoice = parse_invoice(str(pdf))
+    assert [row["Description"] for row in invoice["items"]] == [item[0] for item in table["items"]]
+    assert invoice["invoice_date"] == "2024-07-01"
+    assert invoice["items"][0]["Branch"] == "Test Store"
+
+
+def test_word_parser_reads_tables_continued_across_pages(tmp_path):
+    rows = [([f"Bulk item {n}", "Hook And Loop Pad"], n % 7 + 1, 1.0 + n) for n in range(45)]
+    pdf = tmp_path / "2024-07-01 AliExpress 8200000000000003.pdf"
+    _write_table(pdf, rows, rows_per_page=15)
+
+    _, _, pages = read_invoice_lines(str(pdf))
+    assert len(pages) == 3
+    table = parse_invoice_words(pages)
+    assert table["items"] == [(" ".join(d), q, p) for d, q, p in rows]
+
+
+def test_word_parser_needs_a_positional_header():
+    words = [(78, 100, 120, 107, "Transaction", 0, 0, 0), (78, 110, 120, 117, "Quantity", 0, 1, 0)]
+    assert parse_invoice_words([words]) is None
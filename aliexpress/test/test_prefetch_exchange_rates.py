@@ -0,0 +1,50 @@
+import fitz
+import aliexpress.aliexpress2json as module
+from aliexpress.exchange_rates import timeseries_windows
+
+
+def _invoice(path, invoice_date, currency, price):
+    text = "\n".join([
+        "Supplier name", "Test Store", "Platform name", "Alibaba.com Singapore E-Commerce Private",
+        "Date of issue", invoice_date.replace("-", "/"),
+        "Transaction", "Quantity", "Price exclusive of GST", "GST Rate", "GST Amount", "Price inclusive of GST",
+        f"({currency})", f"({currency})", f"({currency})",
+        "Widget", "1", f"{price / 1.1:.2f}", "10.0 %", f"{price - price / 1.1:.2f}", f"{price:.2f}",
+        f"Total amount inclusive of GST in {currency}",
+    ])
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_timeseries_windows_pad_and_split():
+    assert timeseries_windows(["2024-07-10"]) == [("2024-07-03", "2024-07-17")]
+    assert timeseries_windows(["2024-07-10", "2024-09-01"]) == [("2024-07-03", "2024-09-08")]
+    # A span longer than a year needs a second request
+    assert len(timeseries_windows(["2023-01-10", "2024-06-01"])) == 2
+
+
+def test_prefetch_makes_one_request_per_currency(fx, tmp_path):
+    fx.rates = {"USD": 1.5, "CNY": 0.2}
+    invoices = [
+        _invoice(tmp_path / "a.pdf", "2024-07-10", "USD", 11.0),
+        _invoice(tmp_path / "b.pdf", "2024-08-20", "USD", 22.0),
+        _invoice(tmp_path / "c.pdf", "2024-09-05", "CNY", 33.0),
+        _invoice(tmp_path / "d.pdf", "2025-02-14", "CNY", 44.0),
+    ]
+    pairs = [module.extract_invoice_header(p) for p in invoices]
+    assert pairs[0] == ("2024-07-10", "USD")
+
+    assert module.prefetch_exchange_rates(pairs) == 2
+    assert fx.count("/timeseries") == 2
+
+    # Extraction is then served entirely from the cache
+    results = [module.extract_invoice_data(p) for p in invoices]
+    assert fx.count("/convert") == 0
+    assert results[0]["items"][0]["Item Cost (AUD)"] == round(11.0 * 1.5 * module.EXCHANGE_RATE_SCALE_FACTOR, 2)
+    assert results[3]["items"][0]["Item Cost (AUD)"] == round(44.0 * 0.2 * module.EXCHANGE_RATE_SCALE_FACTOR, 2)
+
+    # A second prefetch has nothing left to fetch
+    assert module.prefetch_exchange_rates(pairs) == 0
@@ -0,0 +1,88 @@
+import json
+import os
+
+import fitz
+
+import aliexpress.aggregate_aliexpress_invoices as aggregate
+from aliexpress.rename_AliExpress_invoices import MANIFEST_NAME, extract_date_from_pdf, rename_invoices
+from aliexpress.test.test_aggregate_aliexpress_invoices import _invoice
+
+
+def _pdf(path, *pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_date_probe_falls_back_to_later_pages(tmp_path):
+    _pdf(tmp_path / "a.pdf", "Receipt 2024/01/02", "Page two 2023/05/06")
+    _pdf(tmp_path / "b.pdf", "No date here", "Issued 2023/05/06")
+    _pdf(tmp_path / "c.pdf", "No date here")
+    assert extract_date_from_pdf(str(tmp_path / "a.pdf")) == "2024/01/02"
+    assert extract_date_from_pdf(str(tmp_path / "b.pdf")) == "2023/05/06"
+    assert extract_date_from_pdf(str(tmp_path / "c.pdf")) is None
+
+
+def test_extract_uses_the_same_date_rule(fx, tmp_path):
+    fx.rates = {"USD": 1.5}
+    _invoice(tmp_path / "1000000000001_payment.pdf", "2024-07-10", "USD", [("Widget", 11.0)])
+    # An invoice the parser reads (it also accepts YYYY-MM-DD) but with no YYYY/MM/DD date of issue
+    _invoice(tmp_path / "1000000000002_payment.pdf", "2024-07-11", "USD", [("Gadget", 22.0)])
+    dashed = fitz.open(str(tmp_path / "1000000000002_payment.pdf"))
+    page = dashed[0]
+    for rect in page.search_for("2024/07/11"):
+        page.add_redact_annot(rect, text="2024-07-11")
+    page.apply_redactions()
+    dashed.saveIncr()
+    dashed.close()
+    assert aggregate.parse_invoice(str(tmp_path / "1000000000002_payment.pdf"))["invoice_date"] == "2024-07-11"
+
+    for extract in (False, True):
+        assert rename_invoices(str(tmp_path), dry_run=True, jobs=1, extract=extract) == 1
+    rename_invoices(str(tmp_path), jobs=1, extract=True)
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith(".pdf")) == [
+        "1000000000002_payment.pdf", "2024-07-10 AliExpress 1000000000001.pdf"]
+
+
+def test_rename_dry_run_manifest_and_no_overwrite(tmp_path):
+    _pdf(tmp_path / "8158599067129326_payment.pdf", "Tax invoice", "Date of issue 2022/11/28")
+    _pdf(tmp_path / "8158599067129327_payment.pdf", "Date of issue 2022/12/01")
+    _pdf(tmp_path / "8158599067129328_payment.pdf", "No date")
+    _pdf(tmp_path / "2022-12-01 AliExpress 8158599067129327.pdf", "Date of issue 2022/12/01 (earlier copy)")
+
+    assert rename_invoices(str(tmp_path), dry_run=True, jobs=2) == 1
+    assert not (tmp_path / MANIFEST_NAME).exists()
+    assert (tmp_path / "8158599067129326_payment.pdf").exists()
+
+    assert rename_invoices(str(tmp_path), jobs=2) == 2
+    assert sorted(os.listdir(tmp_path)) == [
+        MANIFEST_NAME,
+        "2022-11-28 AliExpress 8158599067129326.pdf",
+        "2022-12-01 AliExpress 8158599067129327.pdf",
+        "8158599067129327_payment.pdf",
+        "8158599067129328_payment.pdf",
+    ]
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text())
+    assert manifest["2022-11-28 AliExpress 8158599067129326.pdf"]["original"] == "8158599067129326_payment.pdf"
+    assert manifest["8158599067129327_payment.pdf"]["status"] == "exists"
+    assert manifest["8158599067129328_payment.pdf"]["status"] == "no date"
+
+    # Files recorded in the manifest are not reopened
+    assert rename_invoices(str(tmp_path), jobs=2) == 0
+
+
+def test_extract_seeds_the_aggregate_parse_cache(fx, tmp_path, monkeypatch):
+    fx.rates = {"USD": 1.5}
+    _invoice(tmp_path / "1000000000001_payment.pdf", "2024-07-10", "USD", [("Widget", 11.0)])
+    assert rename_invoices(str(tmp_path), jobs=1, extract=True) == 0
+    assert (tmp_path / aggregate.INVOICE_CACHE_NAME).exists()
+
+    def fail(path):
+        raise AssertionError(f"{path} parsed again")
+    monkeypatch.setattr(aggregate, "parse_invoice", fail)
+    pdf_files = [str(tmp_path / "2024-07-10 AliExpress 1000000000001.pdf")]
+    items, errors = aggregate.extract_invoices(pdf_files, cache=aggregate.load_invoice_cache(str(tmp_path)))
+    assert errors == []
+    assert list(zip(items["Invoice Number"], items["Description"])) == [("1000000000001", "Widget")]
@@ -5,15 +5,21 @@ with the same columns as `parse_bunnings_transactions.py`.
 
 This script attempts text extraction with PyPDF2 first. If the extracted
 text is empty or clearly not useful, it falls back to OCR using
-`pdf2image` + `pytesseract`.
+PyMuPDF + `pytesseract`. Pages are rendered in-process straight to greyscale
+at --dpi (400 by default) and handed to Tesseract without upscaling. Every
+page is OCR'd across a process pool (one worker per CPU core by default) and
+the page lines are merged in page order before parsing. Each worker takes a
+run of pages and renders, preprocesses, OCRs and frees them one at a time, so
+memory use is one page per worker whatever the page count. The OCR rate
+(pages/sec), latency and peak memory are logged.
 
 Usage:
     python3 parse_scanned_bunnings.py receipt.pdf
     python3 parse_scanned_bunnings.py --ocr receipt.pdf   # force OCR
+    python3 parse_scanned_bunnings.py --ocr --jobs 4 --dpi 300 statement.pdf
 
 Requirements (for OCR fallback):
-    pip install pdf2image pytesseract
-    # On macOS, install poppler: brew install poppler
+    pip install pymupdf pytesseract pillow
     # Install Tesseract: brew install tesseract
 
 Output:
@@ -28,8 +34,10 @@ import sys
 import os
 import csv
 import re
+import time
 import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
 try:
     import PyPDF2
@@ -37,11 +45,18 @@ except Exception:
     PyPDF2 = None
 
 try:
-    from pdf2image import convert_from_path
+    import fitz  # PyMuPDF
+except Exception:
+    fitz = None
+
+try:
     import pytesseract
 except Exception:
-    convert_from_path = None
     pytesseract = None
+try:
+    import resource
+except Exception:
+    resource = None
 try:
     from PIL import Image, ImageFilter, ImageOps
 except Exception:
@@ -50,6 +65,13 @@ except Exception:
     ImageOps = None
 import difflib
 
+# Rendering resolution for OCR. At 400 dpi the capitals on an 80 mm till
+# receipt are ~35 px tall, within Tesseract's usual best range. On the sample
+# receipt (scanned at ~330 dpi) rendering below the scan's resolution lost most
+# prices, and 400 read as many as the old 400 dpi + 2x upscale in half the time
+# (test/bench_ocr_dpi.py). One receipt only, so provisional.
+OCR_DPI = 400
+
 
 def replace_EACH(text):
     pattern = re.compile(r'(\d)EACH')
@@ -80,21 +102,50 @@ def get_store(s):
     return "Bunnings " + s.replace(' Warehouse', '')
 
 
-def ocr_pdf_first_page(pdf_path):
-    if convert_from_path is None or pytesseract is None:
-        raise RuntimeError('OCR dependencies not available: install pdf2image and pytesseract')
-    images = convert_from_path(pdf_path, first_page=1, last_page=1)
-    if not images:
-        return ''
-    text = pytesseract.image_to_string(images[0])
+def require_ocr():
+    if fitz is None or pytesseract is None or Image is None:
+        raise RuntimeError('OCR dependencies not available: install pymupdf, pytesseract and pillow')
+
+
+def render_page(page, dpi=OCR_DPI):
+    """Render a PyMuPDF page to a greyscale PIL image.
+    Returns (image, pixmap). The image is a view of the pixmap's pixel buffer
+    (no copy), so keep the pixmap referenced while the image is in use.
+    """
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    img = Image.frombuffer('L', (pix.width, pix.height), pix.samples_mv, 'raw', 'L', pix.stride, 1)
+    return img, pix
+
+
+def ocr_pdf_first_page(pdf_path, dpi=200):
+    require_ocr()
+    with fitz.open(pdf_path) as doc:
+        if len(doc) == 0:
+            return ''
+        img, pix = render_page(doc[0], dpi)
+        return pytesseract.image_to_string(img)
+
+
+def ocr_pdf(pdf_path, dpi=200):
+    """Plain OCR of every page, without preprocessing; pages are joined in order."""
+    require_ocr()
+    text = ''
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            img, pix = render_page(page, dpi)
+            text += pytesseract.image_to_string(img) + '\n'
+            # free this page before rendering the next
+            del img, pix
+            fitz.TOOLS.store_shrink(100)
     return text
 
 
-def preprocess_image_for_ocr(img, upscale=2, median_radius=1, threshold=True):
+def preprocess_image_for_ocr(img, upscale=1, median_radius=1, threshold=True):
     if Image is None:
         return img
-    # convert to grayscale
-    img = img.convert("L")
+    # convert to grayscale (pages from render_page already are)
+    if img.mode != "L":
+        img = img.convert("L")
     # upscale to make small text clearer
     if upscale and upscale != 1:
         w, h = img.size
@@ -111,24 +162,8 @@ def preprocess_image_for_ocr(img, upscale=2, median_radius=1, threshold=True):
     return img
 
 
-def ocr_with_preprocessing_first_page(pdf_path, dpi=400, psm=6, oem=1, whitelist=None):
-    """Return (full_text, line_tuples) where line_tuples is list of (line_text, avg_conf).
-    Requires pdf2image and pytesseract (and Pillow for preprocessing).
-    """
-    if convert_from_path is None or pytesseract is None:
-        raise RuntimeError('OCR dependencies not available: install pdf2image and pytesseract')
-    pages = convert_from_path(pdf_path, dpi=dpi, first_page=1, last_page=1)
-    if not pages:
-        return '', []
-    img = pages[0]
-    img = preprocess_image_for_ocr(img, upscale=2, median_radius=1, threshold=True)
-
-    cfg = f'--oem {oem} --psm {psm}'
-    if whitelist:
-        cfg += f' -c tessedit_char_whitelist={whitelist}'
-
-    data = pytesseract.image_to_data(img, config=cfg, output_type=pytesseract.Output.DICT)
-
+def ocr_data_to_lines(data):
+    """Group pytesseract image_to_data() words into (line_text, avg_conf) tuples, in line order."""
     lines = {}
     texts = data.get('text', [])
     confs = data.get('conf', [])
@@ -150,7 +185,6 @@ def ocr_with_preprocessing_first_page(pdf_path, dpi=400, psm=6, oem=1, whitelist
         lines[line_num]['confs'].append(conf)
 
     line_tuples = []
-    assembled_text_lines = []
     for ln in sorted(lines):
         words = lines[ln]['words']
         confs_ln = lines[ln]['confs']
@@ -158,9 +192,118 @@ def ocr_with_preprocessing_first_page(pdf_path, dpi=400, psm=6, oem=1, whitelist
         good_confs = [c for c in confs_ln if c >= 0]
         avg_conf = sum(good_confs) / max(1, len(good_confs))
         line_tuples.append((line_text, avg_conf))
-        assembled_text_lines.append(line_text)
+    return line_tuples
+
+
+def ocr_image(img, psm=6, oem=1, whitelist=None):
+    """OCR a preprocessed page image and return its (line_text, avg_conf) tuples."""
+    cfg = f'--oem {oem} --psm {psm}'
+    if whitelist:
+        cfg += f' -c tessedit_char_whitelist={whitelist}'
+
+    data = pytesseract.image_to_data(img, config=cfg, output_type=pytesseract.Output.DICT)
+    return ocr_data_to_lines(data)
+
 
-    full_text = '\n'.join(assembled_text_lines)
+def iter_ocr_pages(pdf_path, page_numbers=None, dpi=OCR_DPI, psm=6, oem=1, whitelist=None):
+    """Yield (page_number, line_tuples) for the given 1-based pages (default: all), in order.
+    Pages are rendered, preprocessed and OCR'd one at a time, and each page's
+    pixels are freed before the next is rendered. Memory holds one page, however
+    many the PDF has. Page numbers past the end are skipped.
+    """
+    with fitz.open(pdf_path) as doc:
+        if page_numbers is None:
+            page_numbers = range(1, len(doc) + 1)
+        for page_number in page_numbers:
+            if page_number > len(doc):
+                continue
+            img, pix = render_page(doc[page_number - 1], dpi)
+            img = preprocess_image_for_ocr(img, median_radius=1, threshold=True)
+            line_tuples = ocr_image(img, psm, oem, whitelist)
+            # free the page image, its pixmap and MuPDF's decoded copy of the scan
+            del img, pix
+            fitz.TOOLS.store_shrink(100)
+            yield page_number, line_tuples
+
+
+def ocr_pages(pdf_path, page_numbers, dpi=OCR_DPI, psm=6, oem=1, whitelist=None):
+    """OCR a run of pages in a worker process. Returns one list of (line_text, avg_conf) per page."""
+    return [line_tuples for _, line_tuples in iter_ocr_pages(pdf_path, page_numbers, dpi, psm, oem, whitelist)]
+
+
+def pdf_page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+def peak_memory_mb():
+    """Peak resident memory in MB of this process and of its finished workers (incl. Tesseract), or None."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS, KB elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def page_runs(page_count, jobs):
+    """Split pages 1..page_count into at most `jobs` contiguous runs of near-equal length, in page order."""
+    jobs = max(1, min(jobs, page_count))
+    size, extra = divmod(page_count, jobs)
+    runs = []
+    first = 1
+    for n in range(jobs):
+        last = first + size + (n < extra)
+        runs.append(range(first, last))
+        first = last
+    return [run for run in runs if run]
+
+
+def _init_ocr_worker():
+    # One Tesseract thread per worker: the pool already uses every core
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def ocr_with_preprocessing(pdf_path, dpi=OCR_DPI, psm=6, oem=1, whitelist=None, jobs=None):
+    """OCR every page of a PDF across a process pool.
+    Each worker gets a contiguous run of pages and streams through them with
+    iter_ocr_pages(), so at most one page per worker is in memory.
+    Returns (full_text, line_tuples) with the lines of all pages merged in page order.
+    Requires PyMuPDF, pytesseract and Pillow.
+    """
+    require_ocr()
+    page_count = pdf_page_count(pdf_path)
+    if page_count == 0:
+        return '', []
+    jobs = min(jobs or os.cpu_count() or 1, page_count)
+
+    start = time.perf_counter()
+    if jobs == 1:
+        pages = ocr_pages(pdf_path, None, dpi, psm, oem, whitelist)
+    else:
+        runs = page_runs(page_count, jobs)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_ocr_worker) as executor:
+            pages = [page for run in executor.map(ocr_pages, [pdf_path] * len(runs), runs, [dpi] * len(runs),
+                                                  [psm] * len(runs), [oem] * len(runs), [whitelist] * len(runs))
+                     for page in run]
+    elapsed = time.perf_counter() - start
+    peak_mb = peak_memory_mb()
+    logging.info('OCR: %d page(s) at %d dpi in %.1fs with %d worker(s) (%.2f pages/sec, peak memory %s)',
+                 page_count, dpi, elapsed, jobs, page_count / elapsed if elapsed else 0,
+                 f'{peak_mb:.0f} MB' if peak_mb is not None else 'unknown')
+
+    line_tuples = [line for page in pages for line in page]
+    full_text = '\n'.join(line_text for line_text, _ in line_tuples)
+    return full_text, line_tuples
+
+
+def ocr_with_preprocessing_first_page(pdf_path, dpi=OCR_DPI, psm=6, oem=1, whitelist=None):
+    """Return (full_text, line_tuples) for page 1 only, where line_tuples is list of (line_text, avg_conf).
+    Requires PyMuPDF, pytesseract and Pillow.
+    """
+    require_ocr()
+    line_tuples = [line for page in ocr_pages(pdf_path, [1], dpi, psm, oem, whitelist) for line in page]
+    full_text = '\n'.join(line_text for line_text, _ in line_tuples)
     return full_text, line_tuples
 
 
@@ -366,6 +509,8 @@ def main():
     parser = argparse.ArgumentParser(description='Parse a single Bunnings receipt PDF (OCR fallback)')
     parser.add_argument('pdf', help='Input PDF file')
     parser.add_argument('--ocr', action='store_true', help='Force OCR (skip PyPDF2 text extraction)')
+    parser.add_argument('--dpi', type=int, default=OCR_DPI, help=f'OCR rendering resolution (default: {OCR_DPI})')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='OCR worker processes (default: CPU count)')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
     args = parser.parse_args()
 
@@ -394,12 +539,13 @@ def main():
         try:
             # prefer the preprocessing OCR which returns per-line confidences
             try:
-                text, line_tuples = ocr_with_preprocessing_first_page(pdf_path, dpi=400, psm=6, oem=1,
-                                                                      whitelist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789$().:-/%\"\' )')
+                text, line_tuples = ocr_with_preprocessing(pdf_path, dpi=args.dpi, psm=6, oem=1,
+                                                           whitelist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789$().:-/%\"\' )',
+                                                           jobs=args.jobs)
             except Exception:
                 # fallback to simple OCR
                 logging.debug('Preprocessing OCR not available, falling back to simple OCR')
-                text = ocr_pdf_first_page(pdf_path)
+                text = ocr_pdf(pdf_path)
                 line_tuples = [(l, 0) for l in text.split('\n') if l.strip()]
             logging.debug('OCR extracted text length=%d', len(text) if text else 0)
             if text:
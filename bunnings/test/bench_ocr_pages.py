@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark multi-page OCR of scanned Bunnings receipts in pages/sec.
+
+Writes synthetic scans (each page a greyscale image of receipt-like text, as a
+scanner produces) with an increasing number of pages to a temporary folder and
+reports pages/sec for parse_scanned_bunnings.ocr_with_preprocessing() at each
+worker count. With --fake-ocr, Tesseract is replaced by a no-op so rendering,
+preprocessing and the process pool are measured on their own (also works
+where Tesseract is not installed).
+
+Usage:
+    python3 bunnings/test/bench_ocr_pages.py [--pages 1 4 16] [--jobs 1 2 4] [--dpi 400] [--fake-ocr]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import functools
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+import fitz  # noqa: E402
+import bunnings.parse_scanned_bunnings as module  # noqa: E402
+
+RECEIPT_LINES = [
+    'BUNNINGS GROUP LIMITED', 'CHATSWOOD WAREHOUSE', 'TAX INVOICE', 'INVOICE DATE 19/04/2020',
+] + [f'{1234560 + n} 1 EACH TIMBER PINE 90X45 2.4M H3 {n}.50 0% {n}.50 0.{n % 10}0 {n}.50' for n in range(40)]
+
+
+def write_scan(path, pages, dpi=200):
+    """Write a scanned-style PDF: every page is an A4 greyscale image of receipt text."""
+    text_doc = fitz.open()
+    page = text_doc.new_page(width=595, height=842)
+    page.insert_text((40, 40), '\n'.join(RECEIPT_LINES), fontsize=9)
+    image = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes('png')
+    text_doc.close()
+
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page(width=595, height=842).insert_image(fitz.Rect(0, 0, 595, 842), stream=image)
+    doc.save(path)
+    doc.close()
+
+
+def use_fake_ocr():
+    """Replace Tesseract with a no-op; pool workers get it through fork."""
+    module.pytesseract.image_to_data = lambda img, config='', output_type=None: {'text': [], 'conf': [], 'line_num': []}
+    module.ProcessPoolExecutor = functools.partial(module.ProcessPoolExecutor,
+                                                   mp_context=multiprocessing.get_context('fork'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark multi-page OCR of scanned Bunnings receipts')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 4, 16], help='Pages per scan')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, os.cpu_count() or 1], help='Worker counts')
+    parser.add_argument('--dpi', type=int, default=module.OCR_DPI, help='OCR rendering resolution')
+    parser.add_argument('--fake-ocr', action='store_true', help='Skip Tesseract (measure rendering and the pool only)')
+    args = parser.parse_args()
+
+    if args.fake_ocr:
+        use_fake_ocr()
+    module.require_ocr()
+
+    print(f"{'pages':>6} {'jobs':>5} {'seconds':>9} {'pages/sec':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            pdf_path = os.path.join(tmp, f'scan{pages}.pdf')
+            write_scan(pdf_path, pages)
+            for jobs in sorted(set(args.jobs)):
+                start = time.perf_counter()
+                module.ocr_with_preprocessing(pdf_path, dpi=args.dpi, jobs=jobs)
+                elapsed = time.perf_counter() - start
+                print(f'{pages:>6} {jobs:>5} {elapsed:>9.2f} {pages / elapsed:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
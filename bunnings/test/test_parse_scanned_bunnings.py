@@ -0,0 +1,92 @@
+import functools
+import multiprocessing
+
+import fitz
+import pytest
+
+pytest.importorskip("PIL")
+pytesseract = pytest.importorskip("pytesseract")
+
+import bunnings.parse_scanned_bunnings as module  # noqa: E402
+
+PAGES = 5
+
+
+def _scan(path, pages=PAGES):
+    """A PDF whose page n is 100 + 10n points tall, so a fake OCR can tell the pages apart at 72 dpi."""
+    doc = fitz.open()
+    for n in range(1, pages + 1):
+        doc.new_page(width=200, height=100 + 10 * n)
+    doc.save(str(path))
+    doc.close()
+
+
+def fake_image_to_data(img, config='', output_type=None):
+    page = (img.size[1] - 100) // 10
+    return {
+        'text': ['PAGE', str(page), '', 'TOTAL', f'{page}.00'],
+        'conf': ['96', '-1', '-1', '90.5', '80'],
+        'line_num': [1, 1, 1, 2, 2],
+    }
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip('the fake OCR reaches pool workers by fork')
+    # Workers inherit the patched image_to_data through fork
+    monkeypatch.setattr(pytesseract, 'image_to_data', fake_image_to_data)
+    monkeypatch.setattr(module, 'ProcessPoolExecutor',
+                        functools.partial(module.ProcessPoolExecutor, mp_context=multiprocessing.get_context('fork')))
+
+
+def test_ocr_data_to_lines_groups_words_by_line():
+    lines = module.ocr_data_to_lines(fake_image_to_data(type('Img', (), {'size': (200, 130)})))
+    # Blank words are dropped, confidences are truncated to int and -1 (no confidence) is ignored
+    assert lines == [('PAGE 3', 96.0), ('TOTAL 3.00', 85.0)]
+
+
+@pytest.mark.parametrize('jobs', [1, 2, PAGES + 3])
+def test_every_page_is_ocrd_and_merged_in_page_order(fake_ocr, tmp_path, jobs):
+    pdf_path = tmp_path / 'scan.pdf'
+    _scan(pdf_path)
+
+    text, lines = module.ocr_with_preprocessing(str(pdf_path), dpi=72, jobs=jobs)
+
+    expected = [line for n in range(1, PAGES + 1) for line in (f'PAGE {n}', f'TOTAL {n}.00')]
+    assert text.split('\n') == expected
+    assert [line for line, _ in lines] == expected
+
+
+def test_first_page_only(fake_ocr, tmp_path):
+    pdf_path = tmp_path / 'scan.pdf'
+    _scan(pdf_path)
+    assert module.ocr_with_preprocessing_first_page(str(pdf_path), dpi=72)[0] == 'PAGE 1\nTOTAL 1.00'
+
+
+@pytest.mark.parametrize('page_count, jobs', [(1, 4), (5, 2), (7, 3), (30, 4), (10, 10), (3, 8)])
+def test_page_runs_cover_every_page_once_in_order(page_count, jobs):
+    runs = module.page_runs(page_count, jobs)
+    assert [n for run in runs for n in run] == list(range(1, page_count + 1))
+    assert len(runs) == min(jobs, page_count)
+    assert max(map(len, runs)) - min(map(len, runs)) <= 1
+
+
+def test_each_page_is_freed_before_the_next_is_rendered(fake_ocr, monkeypatch, tmp_path):
+    import weakref
+
+    pdf_path = tmp_path / 'scan.pdf'
+    _scan(pdf_path)
+    live = []
+    render_page = module.render_page
+
+    def tracked_render_page(page, dpi):
+        # Nothing from earlier pages may still be alive when a page is rendered
+        assert [ref() for ref in live if ref() is not None] == []
+        img, pix = render_page(page, dpi)
+        live.append(weakref.ref(pix))
+        return img, pix
+
+    monkeypatch.setattr(module, 'render_page', tracked_render_page)
+    pages = [page for page, _ in module.iter_ocr_pages(str(pdf_path), dpi=72)]
+    assert pages == list(range(1, PAGES + 1))
@@ -12,10 +12,20 @@ import argparse
 from typing import Optional, Tuple
 
 try:
-    import fitz
+    import pymupdf as fitz
 except Exception:
     fitz = None
 
+try:
+    from statement_metadata import build_sidecar, write_sidecar, balances_from_rows
+    from cba_auto2tsv import detect_statement_type
+except ImportError:
+    from cba.statement_metadata import build_sidecar, write_sidecar, balances_from_rows
+    from cba.cba_auto2tsv import detect_statement_type
+
+# Bump when parsing changes in a way that alters the TSV output (recorded in the .meta.json sidecar)
+PARSER_VERSION = '1.0'
+
 
 def extract_text_from_page(page) -> str:
     """Extract text from a PDF page, skipping image blocks."""
@@ -38,7 +48,7 @@ def extract_text_from_page(page) -> str:
     return '\n'.join(lines)
 
 
-def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optional[str], Optional[str], Optional[int]]:
+def extract_first_page_info(pdf_path: str, debug: bool = False, doc=None) -> Tuple[Optional[str], Optional[str], Optional[int]]:
     """
     Extract from first page:
     - Account Number
@@ -53,9 +63,13 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
     if fitz is None:
         raise RuntimeError('PyMuPDF (fitz) not available; please install it in the venv')
     
-    doc = fitz.open(pdf_path)
+    # A caller that already has the PDF open (scan_metadata) passes it in and keeps it open
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(pdf_path)
+    close_doc = doc.close if own_doc else (lambda: None)
     if len(doc) == 0:
-        doc.close()
+        close_doc()
         raise ValueError('PDF has no pages')
     
     # helper: check if a page is a notice letter that should be skipped
@@ -89,7 +103,7 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
             break
     
     if first_statement_page_idx is None:
-        doc.close()
+        close_doc()
         raise ValueError('This does not appear to be a CBA Everyday Account statement. Could not find "Everyday Offset", "Smart Access", or "NetBank Saver" after skipping notice letters.')
     
     first_page = doc[first_statement_page_idx]
@@ -99,7 +113,7 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
     # Validate that this is an Everyday Account statement
     text_lower = ' '.join(lines).lower()
     if 'everyday offset' not in text_lower and 'smart access' not in text_lower and 'netbank saver' not in text_lower:
-        doc.close()
+        close_doc()
         raise ValueError('This does not appear to be a CBA Everyday Account statement. Could not find "Everyday Offset", "Smart Access", or "NetBank Saver" on the statement page.')
     
     # Check for CBA indicators (optional - if we have account type, it's likely CBA)
@@ -167,7 +181,7 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
                 print(f'Found period: {period_string}, year: {year}', file=sys.stderr)
             break
     
-    doc.close()
+    close_doc()
     
     if not account_number:
         print('Warning: Could not find account number on first page', file=sys.stderr)
@@ -773,6 +787,12 @@ def main():
     with open(output_path, 'w') as f:
         write_tsv(rows, account_number or '', f)
     
+    # Write the .meta.json sidecar next to the TSV
+    opening_balance, closing_balance = balances_from_rows(rows)
+    metadata = build_sidecar(args.pdf, output_path, 'CBA', detect_statement_type(args.pdf), account_number or '', period_string,
+                             opening_balance, closing_balance, len(rows), 'cba_account2tsv', PARSER_VERSION)
+    write_sidecar(output_path, metadata)
+    
     if args.debug:
         print(f'Output written to: {output_path}', file=sys.stderr)
 
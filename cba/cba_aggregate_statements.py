@@ -9,6 +9,9 @@ Usage:
 Options:
     --fy          Create one XLSX per financial year (FY spans Jul 1 - Jun 30)
                   Each file will have one tab per account/card number
+    --dedupe      Drop transactions repeated across overlapping statements
+                  (e.g. a mid-cycle and a full-month download, or the same PDF
+                  saved twice) and write a report of the removed rows
 
 Author:
     Mark Cowley, 2025-01-17
@@ -22,6 +25,14 @@ import re
 import pandas as pd
 from datetime import datetime
 
+try:
+    from statement_metadata import read_sidecar
+except ImportError:
+    from cba.statement_metadata import read_sidecar
+
+# Report of rows dropped by --dedupe; excluded when globbing for statement TSVs
+DUPLICATES_REPORT = "duplicates_removed.tsv"
+
 
 def extract_value_date(transaction_str):
     """Extract 'Value Date: DD/MM/YYYY' from transaction string.
@@ -78,7 +89,23 @@ def get_financial_year(date_str):
 
 
 def read_tsv_file(tsv_path):
-    """Read a TSV file and return a DataFrame with account/card identifier."""
+    """Read a TSV file and return a DataFrame with account/card identifier.
+    
+    If the parser wrote a .meta.json sidecar, the account/card identifier comes from
+    it, and statements with no transactions are skipped without opening the TSV.
+    """
+    meta = read_sidecar(tsv_path)
+    if meta is not None and meta.get('account'):
+        account_type = 'Card' if meta.get('statement_type') == 'mastercard' else 'Account'
+        if meta.get('row_count') == 0:
+            return pd.DataFrame(), meta['account'], account_type
+        try:
+            df = pd.read_csv(tsv_path, sep='\t', dtype=str)
+            return df, meta['account'], account_type
+        except Exception as e:
+            print(f"Error reading {tsv_path}: {e}", file=sys.stderr)
+            return None, None, None
+    
     try:
         df = pd.read_csv(tsv_path, sep='\t', dtype=str)
         
@@ -105,7 +132,109 @@ def read_tsv_file(tsv_path):
         return None, None, None
 
 
-def process_folder(folder_path, output_file=None):
+def _normalise_date(value):
+    """Return a DD/MM/YYYY string for a date cell (string or Timestamp), or '' if missing."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    if isinstance(value, str):
+        return value.strip()
+    return value.strftime('%d/%m/%Y')
+
+
+def _normalise_cents(value):
+    """Return an amount/balance cell as integer cents, or None if missing/unparseable."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    try:
+        return int(round(float(str(value).replace(',', '').replace('$', '')) * 100))
+    except ValueError:
+        return None
+
+
+def _normalise_description(value):
+    """Collapse whitespace and case so re-parsed descriptions compare equal."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    return ' '.join(str(value).split()).casefold()
+
+
+def transaction_key(account_id, row):
+    """Hashable key for a transaction row: (account, date, amount, description, balance).
+
+    The balance is part of the key, so genuine same-day repeats (same payee, same
+    amount) stay distinct: the running balance differs after each one.
+    """
+    return (
+        account_id,
+        _normalise_date(row.get('Date')),
+        _normalise_cents(row.get('Amount')),
+        _normalise_description(row.get('Transaction')),
+        _normalise_cents(row.get('Balance')),
+    )
+
+
+def dedupe_transactions(df, account_id):
+    """Remove rows that appear in more than one source statement.
+
+    Builds a hash index over transaction_key() in a single pass, counting how often
+    each key occurs in each 'Source File'. Repeats within one statement are genuine
+    (e.g. two identical coffees where the statement has no balance column), so for
+    each key the statement with the most occurrences is kept and the same key from
+    any other statement is dropped as an overlap.
+    Runs in O(n) over the combined rows.
+
+    Returns (kept_df, removed_df). removed_df has an extra 'Duplicate Of' column naming
+    the statement whose copy was kept.
+    """
+    if len(df) == 0 or 'Source File' not in df.columns:
+        return df, df.iloc[0:0]
+
+    # {key: {source_file: count}}, sources in first-seen order
+    index = {}
+    keys = []
+    for row in df.to_dict('records'):
+        key = transaction_key(account_id, row)
+        keys.append(key)
+        per_source = index.setdefault(key, {})
+        source = row['Source File']
+        per_source[source] = per_source.get(source, 0) + 1
+
+    # The owning statement for each key is the one with the most occurrences; ties go
+    # to the longer statement (so a full-month download wins over a mid-cycle one),
+    # then to the first statement seen
+    source_sizes = df['Source File'].value_counts().to_dict()
+    owners = {
+        key: max(per_source, key=lambda source: (per_source[source], source_sizes[source]))
+        for key, per_source in index.items()
+    }
+
+    keep_mask = []
+    duplicate_of = []
+    for key, source in zip(keys, df['Source File']):
+        owner = owners[key]
+        keep_mask.append(source == owner)
+        duplicate_of.append(owner)
+
+    keep_mask = pd.Series(keep_mask, index=df.index)
+    kept_df = df[keep_mask]
+    removed_df = df[~keep_mask].copy()
+    removed_df['Duplicate Of'] = pd.Series(duplicate_of, index=df.index)[~keep_mask]
+    return kept_df, removed_df
+
+
+def write_duplicates_report(removed_frames, report_path):
+    """Write the rows removed by dedupe_transactions() to a TSV report."""
+    if removed_frames:
+        removed_df = pd.concat(removed_frames, ignore_index=True)
+        if 'Date' in removed_df.columns:
+            removed_df['Date'] = removed_df['Date'].apply(_normalise_date)
+    else:
+        removed_df = pd.DataFrame(columns=['Date', 'Transaction', 'Amount', 'Balance', 'Source File', 'Duplicate Of'])
+    removed_df.to_csv(report_path, sep='\t', index=False)
+    print(f"\n✓ Duplicate report: {report_path} ({len(removed_df)} row(s) removed)")
+
+
+def process_folder(folder_path, output_file=None, dedupe=False):
     """Process all TSV files in a folder and create a spreadsheet with one tab per account/card."""
     if not os.path.isdir(folder_path):
         print(f"Error: Folder not found: {folder_path}", file=sys.stderr)
@@ -113,7 +242,7 @@ def process_folder(folder_path, output_file=None):
     
     # Find all TSV files
     tsv_files = glob.glob(os.path.join(folder_path, "*.tsv"))
-    tsv_files = [f for f in tsv_files if os.path.isfile(f)]
+    tsv_files = [f for f in tsv_files if os.path.isfile(f) and os.path.basename(f) != DUPLICATES_REPORT]
     
     if not tsv_files:
         print(f"No TSV files found in {folder_path}", file=sys.stderr)
@@ -171,11 +300,20 @@ def process_folder(folder_path, output_file=None):
     # Create Excel file with one sheet per account/card
     print(f"\nCreating Excel file: {output_file}")
     
+    removed_frames = []
+    
     with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
         for account_id, dfs in sorted(account_data.items()):
             # Combine all DataFrames for this account
             combined_df = pd.concat(dfs, ignore_index=True)
             
+            # Drop rows repeated across overlapping statements
+            if dedupe:
+                combined_df, removed_df = dedupe_transactions(combined_df, account_id)
+                if len(removed_df) > 0:
+                    print(f"  - {account_id}: removed {len(removed_df)} duplicate transaction(s)")
+                    removed_frames.append(removed_df)
+            
             # Extract Value Date from Transaction column if present
             # Do this BEFORE converting Date to datetime for sorting
             # Actual Date should be in column 2 (after Date, before Account/Card Number)
@@ -254,13 +392,17 @@ def process_folder(folder_path, output_file=None):
     print(f"\n✓ Spreadsheet created: {output_file}")
     print(f"  Total accounts/cards: {len(account_data)}")
     
+    if dedupe:
+        report_path = os.path.join(os.path.dirname(os.path.abspath(output_file)), DUPLICATES_REPORT)
+        write_duplicates_report(removed_frames, report_path)
+    
     if errors:
         print(f"\n⚠ {len(errors)} error(s) encountered:")
         for error in errors:
             print(f"  - {error}")
 
 
-def process_folder_by_fy(folder_path, output_dir=None):
+def process_folder_by_fy(folder_path, output_dir=None, dedupe=False):
     """Process all TSV files and create one XLSX per financial year, with one tab per account/card."""
     if not os.path.isdir(folder_path):
         print(f"Error: Folder not found: {folder_path}", file=sys.stderr)
@@ -273,7 +415,7 @@ def process_folder_by_fy(folder_path, output_dir=None):
     
     # Find all TSV files
     tsv_files = glob.glob(os.path.join(folder_path, "*.tsv"))
-    tsv_files = [f for f in tsv_files if os.path.isfile(f)]
+    tsv_files = [f for f in tsv_files if os.path.isfile(f) and os.path.basename(f) != DUPLICATES_REPORT]
     
     if not tsv_files:
         print(f"No TSV files found in {folder_path}", file=sys.stderr)
@@ -347,17 +489,29 @@ def process_folder_by_fy(folder_path, output_dir=None):
     # Create Excel file per financial year
     print("\nCreating per-financial-year spreadsheets:")
     
+    removed_frames = []
+    
     for fy in sorted(fy_account_data.keys()):
         account_data = fy_account_data[fy]
         
         # Create output filename
         output_file = os.path.join(output_dir, f"CBA Statements FY{fy}.xlsx")
         
+        fy_removed = 0
+        
         with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
             for account_id, dfs in sorted(account_data.items()):
                 # Combine all DataFrames for this account
                 combined_df = pd.concat(dfs, ignore_index=True)
                 
+                # Drop rows repeated across overlapping statements. Every statement
+                # contributes its rows for this FY here, so the whole corpus is covered.
+                if dedupe:
+                    combined_df, removed_df = dedupe_transactions(combined_df, account_id)
+                    if len(removed_df) > 0:
+                        removed_frames.append(removed_df)
+                        fy_removed += len(removed_df)
+                
                 # Extract Value Date from Transaction column if present
                 # Do this BEFORE converting Date to datetime for sorting
                 # Value Date should be in column 2 (after Date, before Account/Card Number)
@@ -444,11 +598,16 @@ def process_folder_by_fy(folder_path, output_dir=None):
             max_date = max(all_dates).strftime('%d/%m/%Y')
             date_range = f" ({min_date} to {max_date})"
         
-        total_transactions = sum(len(df) for dfs in account_data.values() for df in dfs)
+        total_transactions = sum(len(df) for dfs in account_data.values() for df in dfs) - fy_removed
         
         print(f"  ✓ FY{fy}{date_range}")
         print(f"    {output_file}")
         print(f"    Total accounts/cards: {len(account_data)}, Total transactions: {total_transactions}")
+        if fy_removed:
+            print(f"    Duplicates removed: {fy_removed}")
+    
+    if dedupe:
+        write_duplicates_report(removed_frames, os.path.join(output_dir, DUPLICATES_REPORT))
     
     if errors:
         print(f"\n⚠ {len(errors)} error(s) encountered:")
@@ -479,10 +638,16 @@ if __name__ == "__main__":
         help="Create one XLSX per financial year (FY spans Jul 1 - Jun 30). Each file will have one tab per account/card number."
     )
     
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Remove transactions repeated across overlapping statements and write duplicates_removed.tsv next to the output"
+    )
+    
     args = parser.parse_args()
     
     if args.fy:
-        process_folder_by_fy(args.folder, args.output)
+        process_folder_by_fy(args.folder, args.output, dedupe=args.dedupe)
     else:
-        process_folder(args.folder, args.output)
+        process_folder(args.folder, args.output, dedupe=args.dedupe)
 
@@ -12,17 +12,31 @@ Supported statement types:
 
 Usage:
     python3 cba/cba_auto2tsv.py input.pdf [--out output.tsv] [--debug]
+    python3 cba/cba_auto2tsv.py --metadata-only *.pdf [--jobs N] [--out catalogue.jsonl]
+
+--metadata-only skips transaction parsing: it reads just the first statement page
+of each PDF and writes one JSON line per PDF with the account number, statement
+type, period and opening/closing balances, using a process pool.
 """
 import sys
+import re
+import json
 import subprocess
 import argparse
+import importlib
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 try:
-    import fitz
+    import pymupdf as fitz
 except Exception:
     fitz = None
 
+try:
+    from statement_metadata import parse_period
+except ImportError:
+    from cba.statement_metadata import parse_period
+
 
 def extract_text_from_page(page) -> str:
     """Extract text from a PDF page, skipping image blocks."""
@@ -45,7 +59,7 @@ def extract_text_from_page(page) -> str:
     return '\n'.join(lines)
 
 
-def detect_statement_type(pdf_path: str, debug: bool = False) -> str:
+def detect_statement_type(pdf_path: str, debug: bool = False, doc=None) -> str:
     """
     Detect the type of CBA statement by examining the first page.
     
@@ -56,9 +70,13 @@ def detect_statement_type(pdf_path: str, debug: bool = False) -> str:
             print('Warning: PyMuPDF not available, cannot auto-detect statement type', file=sys.stderr)
         return 'unknown'
     
-    doc = fitz.open(pdf_path)
+    # A caller that already has the PDF open (scan_metadata) passes it in and keeps it open
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(pdf_path)
+    close_doc = doc.close if own_doc else (lambda: None)
     if len(doc) == 0:
-        doc.close()
+        close_doc()
         return 'unknown'
     
     # Check first few pages for statement type indicators
@@ -83,35 +101,35 @@ def detect_statement_type(pdf_path: str, debug: bool = False) -> str:
         # Check for account-specific keywords FIRST (these are more reliable than generic Mastercard detection)
         # Check for Home Loan
         if 'home loan summary' in text_lower:
-            doc.close()
+            close_doc()
             if debug:
                 print('Detected: Home Loan', file=sys.stderr)
             return 'homeloan'
         
         # Check for Youth Saver
         if 'youth saver' in text_lower or 'youthsaver' in text_lower:
-            doc.close()
+            close_doc()
             if debug:
                 print('Detected: Youth Saver', file=sys.stderr)
             return 'youthsaver'
         
         # Check for Everyday Offset
         if 'everyday offset' in text_lower:
-            doc.close()
+            close_doc()
             if debug:
                 print('Detected: Everyday Offset', file=sys.stderr)
             return 'offset'
         
         # Check for Smart Access
         if 'smart access' in text_lower:
-            doc.close()
+            close_doc()
             if debug:
                 print('Detected: Smart Access', file=sys.stderr)
             return 'smartaccess'
         
         # Check for NetBank Saver
         if 'netbank saver' in text_lower:
-            doc.close()
+            close_doc()
             if debug:
                 print('Detected: NetBank Saver', file=sys.stderr)
             return 'smartaccess'  # Use same parser as Smart Access
@@ -135,30 +153,181 @@ def detect_statement_type(pdf_path: str, debug: bool = False) -> str:
                     first_four_digits = int(first_four)
                     # Mastercard ranges: 51-55 or 2221-2720
                     if 51 <= first_two <= 55 or (2221 <= first_four_digits <= 2720):
-                        doc.close()
+                        close_doc()
                         if debug:
                             print(f'Detected: Mastercard (indicator: {indicator}, card number: {" ".join(match)})', file=sys.stderr)
                         return 'mastercard'
                 # If we found the indicator but no valid card number, still likely Mastercard
-                doc.close()
+                close_doc()
                 if debug:
                     print(f'Detected: Mastercard (indicator: {indicator})', file=sys.stderr)
                 return 'mastercard'
     
-    doc.close()
+    close_doc()
     if debug:
         print('Warning: Could not detect statement type', file=sys.stderr)
     return 'unknown'
 
 
+# Parser module for each statement type (used by --metadata-only)
+PARSER_MODULES = {
+    'mastercard': 'cba_mastercard2tsv',
+    'homeloan': 'cba_homeloan2tsv',
+    'youthsaver': 'cba_youthsaver2tsv',
+    'offset': 'cba_account2tsv',
+    'smartaccess': 'cba_account2tsv',
+}
+
+
+def load_parser_module(stmt_type: str):
+    """Import the parser module for a statement type (imported lazily; the parsers import this module)."""
+    module_name = PARSER_MODULES[stmt_type]
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        return importlib.import_module(f'cba.{module_name}')
+
+
+def find_first_page_balance(lines: list, label: str):
+    """
+    Find the balance following `label` ('opening balance' or 'closing balance') on the same
+    or the next line of first-page text. 'Nil' is 0.0; 'DR' or 'in debit' makes it negative.
+    Returns None if not found.
+    """
+    amount_pattern = re.compile(r'(?i)(nil\b|-?\s*\$?\s*[\d,]+\.\d{2})(\s*(?:CR|DR)\b)?')
+    for i, line in enumerate(lines):
+        pos = line.lower().find(label)
+        if pos < 0:
+            continue
+        for candidate in (line[pos + len(label):], lines[i + 1] if i + 1 < len(lines) else ''):
+            m = amount_pattern.search(candidate)
+            if not m:
+                continue
+            if m.group(1).lower() == 'nil':
+                return 0.0
+            raw = m.group(1).replace('$', '').replace(',', '').replace(' ', '')
+            amount = float(raw)
+            is_debit = (m.group(2) or '').strip().upper() == 'DR' or 'in debit' in line.lower()
+            return -abs(amount) if is_debit else amount
+    return None
+
+
+def first_statement_page_balances(doc):
+    """
+    Return (opening_balance, closing_balance) of an open statement, reading from its first
+    non-notice page. Most statements show both in a summary on that page; where they don't
+    (Youth Saver opens with a letter and only has them as rows of the transaction list, the
+    closing one possibly pages later) the following pages are read until both are found.
+    """
+    opening_balance = closing_balance = None
+    for page in doc:
+        text = extract_text_from_page(page)
+        text_lower = text.lower()
+        if 'notice of increase to repayments' in text_lower or ('yours sincerely' in text_lower and 'the commbank team' in text_lower):
+            continue
+        lines = [l.strip() for l in text.split('\n') if l.strip()]
+        if opening_balance is None:
+            opening_balance = find_first_page_balance(lines, 'opening balance')
+        if closing_balance is None:
+            closing_balance = find_first_page_balance(lines, 'closing balance')
+        if opening_balance is not None and closing_balance is not None:
+            break
+    return opening_balance, closing_balance
+
+
+def scan_metadata(pdf_path: str) -> dict:
+    """
+    Catalogue one statement from its first statement page, without parsing transactions.
+    Uses detect_statement_type() and the matching parser's extract_first_page_info(),
+    sharing one open document between them. Balances not on that page are looked for on
+    the following ones (see first_statement_page_balances).
+    Returns a dict with the same keys as the .meta.json sidecars (minus parser details),
+    plus 'pdf' and 'error' (None on success).
+    """
+    record = {
+        'pdf': pdf_path,
+        'source_pdf': os.path.basename(pdf_path),
+        'bank': 'CBA',
+        'statement_type': 'unknown',
+        'account': '',
+        'period': '',
+        'period_start': None,
+        'period_end': None,
+        'opening_balance': None,
+        'closing_balance': None,
+        'error': None,
+    }
+    try:
+        with fitz.open(pdf_path) as doc:
+            stmt_type = detect_statement_type(pdf_path, doc=doc)
+            record['statement_type'] = stmt_type
+            if stmt_type == 'unknown':
+                record['error'] = 'Could not detect statement type'
+                return record
+            module = load_parser_module(stmt_type)
+            if stmt_type == 'mastercard':
+                opening_balance, closing_balance, period_string, account, _ = \
+                    module.extract_first_page_info(pdf_path, doc=doc)[:5]
+            else:
+                account, period_string, _ = module.extract_first_page_info(pdf_path, doc=doc)
+                # The parser only reads account and period; take balances from the same first statement page
+                opening_balance, closing_balance = first_statement_page_balances(doc)
+        period_start, period_end = parse_period(period_string or '')
+        record.update({
+            'account': ' '.join((account or '').split()),
+            'period': period_string or '',
+            'period_start': period_start.isoformat() if period_start else None,
+            'period_end': period_end.isoformat() if period_end else None,
+            'opening_balance': opening_balance,
+            'closing_balance': closing_balance,
+        })
+    except Exception as e:
+        record['error'] = str(e)
+    return record
+
+
+def scan_metadata_parallel(pdf_paths: list, jobs: int = None, out=None):
+    """Scan PDFs across a process pool, writing one JSON line per PDF (in input order) to `out`."""
+    out = out or sys.stdout
+    failures = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Small chunks keep all workers busy while amortising the per-task IPC
+        chunksize = max(1, min(32, len(pdf_paths) // ((jobs or os.cpu_count() or 1) * 4)))
+        for record in executor.map(scan_metadata, pdf_paths, chunksize=chunksize):
+            if record['error']:
+                failures += 1
+            out.write(json.dumps(record) + '\n')
+    return failures
+
+
 def main():
     parser = argparse.ArgumentParser(description='Automatically detect and parse CBA statement PDF to TSV')
-    parser.add_argument('pdf', help='Input PDF file')
-    parser.add_argument('--out', help='Output TSV path (default: replace .pdf with .tsv)')
+    parser.add_argument('pdf', nargs='+', help='Input PDF file (several with --metadata-only)')
+    parser.add_argument('--out', help='Output TSV path (default: replace .pdf with .tsv); JSONL path with --metadata-only (default: stdout)')
     parser.add_argument('--debug', action='store_true', help='Show debug info')
     parser.add_argument('--dry-run', action='store_true', help='Print PDF name and detected statement type, then exit')
+    parser.add_argument('--metadata-only', action='store_true', help='Only read first-page metadata and print one JSON line per PDF')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes for --metadata-only (default: CPU count)')
     args = parser.parse_args()
     
+    if args.metadata_only:
+        missing = [p for p in args.pdf if not os.path.exists(p)]
+        for p in missing:
+            print(f'Error: File not found: {p}', file=sys.stderr)
+        pdf_paths = [p for p in args.pdf if os.path.exists(p)]
+        if args.out:
+            with open(args.out, 'w') as f:
+                failures = scan_metadata_parallel(pdf_paths, args.jobs, f)
+        else:
+            failures = scan_metadata_parallel(pdf_paths, args.jobs)
+        if failures and args.debug:
+            print(f'{failures} PDF(s) could not be catalogued', file=sys.stderr)
+        sys.exit(1 if missing or failures else 0)
+    
+    if len(args.pdf) > 1:
+        parser.error('only one PDF can be parsed at a time (use --metadata-only to catalogue several)')
+    args.pdf = args.pdf[0]
+    
     if not os.path.exists(args.pdf):
         print(f'Error: File not found: {args.pdf}', file=sys.stderr)
         sys.exit(1)
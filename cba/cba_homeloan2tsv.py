@@ -12,10 +12,18 @@ import argparse
 from typing import Optional, Tuple
 
 try:
-    import fitz
+    import pymupdf as fitz
 except Exception:
     fitz = None
 
+try:
+    from statement_metadata import build_sidecar, write_sidecar, balances_from_rows
+except ImportError:
+    from cba.statement_metadata import build_sidecar, write_sidecar, balances_from_rows
+
+# Bump when parsing changes in a way that alters the TSV output (recorded in the .meta.json sidecar)
+PARSER_VERSION = '1.0'
+
 
 def extract_text_from_page(page) -> str:
     """Extract text from a PDF page, skipping image blocks."""
@@ -38,7 +46,7 @@ def extract_text_from_page(page) -> str:
     return '\n'.join(lines)
 
 
-def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optional[str], Optional[str], Optional[int]]:
+def extract_first_page_info(pdf_path: str, debug: bool = False, doc=None) -> Tuple[Optional[str], Optional[str], Optional[int]]:
     """
     Extract from first page:
     - Account Number
@@ -53,9 +61,13 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
     if fitz is None:
         raise RuntimeError('PyMuPDF (fitz) not available; please install it in the venv')
     
-    doc = fitz.open(pdf_path)
+    # A caller that already has the PDF open (scan_metadata) passes it in and keeps it open
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(pdf_path)
+    close_doc = doc.close if own_doc else (lambda: None)
     if len(doc) == 0:
-        doc.close()
+        close_doc()
         raise ValueError('PDF has no pages')
     
     # helper: check if a page is a notice letter that should be skipped
@@ -92,7 +104,7 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
             break
     
     if first_statement_page_idx is None:
-        doc.close()
+        close_doc()
         raise ValueError('This does not appear to be a CBA Home Loan statement. Could not find "Home Loan Summary" after skipping notice letters.')
     
     first_page = doc[first_statement_page_idx]
@@ -102,7 +114,7 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
     # Validate that this is a Home Loan statement
     text_lower = ' '.join(lines).lower()
     if 'home loan summary' not in text_lower:
-        doc.close()
+        close_doc()
         raise ValueError('This does not appear to be a CBA Home Loan statement. Could not find "Home Loan Summary" on the statement page.')
     
     # Check for CBA indicators (optional - if we have "Home Loan Summary", it's likely CBA)
@@ -164,7 +176,7 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
                 print(f'Found period: {period_string}, year: {year}', file=sys.stderr)
             break
     
-    doc.close()
+    close_doc()
     
     if not account_number:
         print('Warning: Could not find account number on first page', file=sys.stderr)
@@ -583,6 +595,12 @@ def main():
     with open(output_path, 'w') as f:
         write_tsv(rows, account_number or '', f)
     
+    # Write the .meta.json sidecar next to the TSV
+    opening_balance, closing_balance = balances_from_rows(rows)
+    metadata = build_sidecar(args.pdf, output_path, 'CBA', 'homeloan', account_number or '', period_string,
+                             opening_balance, closing_balance, len(rows), 'cba_homeloan2tsv', PARSER_VERSION)
+    write_sidecar(output_path, metadata)
+    
     if args.debug:
         print(f'Output written to: {output_path}', file=sys.stderr)
 
@@ -12,10 +12,18 @@ import argparse
 from typing import Optional, Tuple
 
 try:
-    import fitz
+    import pymupdf as fitz
 except Exception:
     fitz = None
 
+try:
+    from statement_metadata import build_sidecar, write_sidecar
+except ImportError:
+    from cba.statement_metadata import build_sidecar, write_sidecar
+
+# Bump when parsing changes in a way that alters the TSV output (recorded in the .meta.json sidecar)
+PARSER_VERSION = '1.0'
+
 
 def extract_text_from_page(page) -> str:
     """Extract text from a PDF page, skipping image blocks."""
@@ -61,7 +69,7 @@ def is_mastercard_number(card_number: str) -> bool:
     return False
 
 
-def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optional[float], Optional[float], Optional[str], Optional[str], Optional[str]]:
+def extract_first_page_info(pdf_path: str, debug: bool = False, doc=None) -> Tuple[Optional[float], Optional[float], Optional[str], Optional[str], Optional[str]]:
     """
     Extract from first page:
     - Opening balance
@@ -78,9 +86,13 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
     if fitz is None:
         raise RuntimeError('PyMuPDF (fitz) not available; please install it in the venv')
     
-    doc = fitz.open(pdf_path)
+    # A caller that already has the PDF open (scan_metadata) passes it in and keeps it open
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(pdf_path)
+    close_doc = doc.close if own_doc else (lambda: None)
     if len(doc) == 0:
-        doc.close()
+        close_doc()
         return None, None, None, None, None, None
     
     first_page = doc[0]
@@ -263,7 +275,7 @@ def extract_first_page_info(pdf_path: str, debug: bool = False) -> Tuple[Optiona
     # Close document before returning or raising errors
     # Use a try/except to handle cases where doc might already be closed
     try:
-        doc.close()
+        close_doc()
     except (ValueError, AttributeError):
         pass  # Document may already be closed
     
@@ -672,6 +684,11 @@ def main():
     with open(output_path, 'w') as f:
         write_tsv(rows, card_number or '', f)
     
+    # Write the .meta.json sidecar next to the TSV
+    metadata = build_sidecar(args.pdf, output_path, 'CBA', 'mastercard', card_number or '', period_string,
+                             opening_balance, closing_balance, len(rows), 'cba_mastercard2tsv', PARSER_VERSION)
+    write_sidecar(output_path, metadata)
+    
     if args.debug:
         print(f'Output written to: {output_path}', file=sys.stderr)
 
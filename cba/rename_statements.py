@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Rename CBA and NAB statement PDFs from their first-page metadata:
+
+    Statement20220328.pdf -> 2022-03-28 CBA smartaccess 06269246879707.pdf
+
+The name is "<period end> <bank> <statement type> <account>.pdf", with spaces
+removed from the account number. Metadata is read from the first statement
+page only (see `cba_auto2tsv.py --metadata-only`), across a process pool.
+
+Renames are collision-safe: an existing file is never overwritten. If the target
+name exists with identical content the PDF is a duplicate download and is left
+alone; otherwise a " (2)", " (3)", ... suffix is added.
+
+Every rename (and every PDF that could not be recognised) is recorded in
+.rename_manifest.json in the folder, keyed by file name with size and mtime, so
+reruns skip those files without reopening them.
+
+Usage:
+    python3 cba/rename_statements.py /path/to/folder [--dry-run] [--jobs N] [--force]
+"""
+import sys
+import os
+import re
+import json
+import glob
+import hashlib
+import argparse
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from cba_auto2tsv import scan_metadata, extract_text_from_page, fitz
+    from statement_metadata import parse_period
+except ImportError:
+    from cba.cba_auto2tsv import scan_metadata, extract_text_from_page, fitz
+    from cba.statement_metadata import parse_period
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+NAB_PARSER = os.path.join(SCRIPT_DIR, '..', 'nab', 'nab_offset2tsv.py')
+MANIFEST_NAME = '.rename_manifest.json'
+
+_nab_module = None
+
+
+def load_nab_parser():
+    """Load nab/nab_offset2tsv.py as a module (it lives outside this folder)."""
+    global _nab_module
+    if _nab_module is None:
+        spec = importlib.util.spec_from_file_location('nab_offset2tsv', NAB_PARSER)
+        _nab_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_nab_module)
+    return _nab_module
+
+
+def scan_nab_metadata(pdf_path: str, record: dict) -> dict:
+    """Fill `record` from a NAB statement's first page. Leaves record['error'] set if it is not NAB."""
+    with fitz.open(pdf_path) as doc:
+        if len(doc) == 0:
+            return record
+        first_page_text = extract_text_from_page(doc[0]).lower()
+    if 'national australia bank' not in first_page_text:
+        return record
+    account, period_string, _ = load_nab_parser().extract_first_page_info(pdf_path)
+    period_start, period_end = parse_period(period_string or '')
+    record.update({
+        'bank': 'NAB',
+        'statement_type': 'offset',
+        'account': ' '.join((account or '').split()),
+        'period': period_string or '',
+        'period_start': period_start.isoformat() if period_start else None,
+        'period_end': period_end.isoformat() if period_end else None,
+        'error': None,
+    })
+    return record
+
+
+def scan_statement(pdf_path: str) -> dict:
+    """Return first-page metadata for a CBA or NAB statement (runs in a worker process)."""
+    record = scan_metadata(pdf_path)
+    if record['statement_type'] == 'unknown':
+        try:
+            record = scan_nab_metadata(pdf_path, record)
+        except Exception as e:
+            record['error'] = str(e)
+    return record
+
+
+def statement_filename(record: dict) -> str:
+    """Build 'YYYY-MM-DD <bank> <type> <account>.pdf' from a metadata record, or None if incomplete."""
+    if record.get('error') or not record.get('period_end') or not record.get('account'):
+        return None
+    account = re.sub(r'[^\w-]', '', record['account'])
+    return f"{record['period_end']} {record['bank']} {record['statement_type']} {account}.pdf"
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_signature(path: str) -> dict:
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': int(st.st_mtime)}
+
+
+def load_manifest(folder_path: str) -> dict:
+    path = os.path.join(folder_path, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'Warning: ignoring unreadable manifest {path}: {e}', file=sys.stderr)
+        return {}
+
+
+def save_manifest(folder_path: str, manifest: dict):
+    """Write the manifest atomically (temp file + os.replace)."""
+    path = os.path.join(folder_path, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def is_unchanged(manifest: dict, folder_path: str, filename: str) -> bool:
+    """True if `filename` is in the manifest with the same size and mtime (so needs no reopening)."""
+    entry = manifest.get(filename)
+    if not entry:
+        return False
+    try:
+        signature = file_signature(os.path.join(folder_path, filename))
+    except OSError:
+        return False
+    return entry.get('size') == signature['size'] and entry.get('mtime') == signature['mtime']
+
+
+def safe_rename(src: str, dst: str) -> str:
+    """
+    Rename src to dst without ever overwriting an existing file.
+    os.link() fails atomically if dst exists, so two runs cannot clobber each other.
+    Returns the final path, or None if dst already holds identical content.
+    """
+    base, ext = os.path.splitext(dst)
+    candidate = dst
+    n = 1
+    while True:
+        try:
+            os.link(src, candidate)
+        except FileExistsError:
+            if file_sha256(candidate) == file_sha256(src):
+                return None
+            n += 1
+            candidate = f'{base} ({n}){ext}'
+            continue
+        except OSError:
+            # Filesystem without hard links: check-then-rename (not atomic, but never overwrites knowingly)
+            if os.path.exists(candidate):
+                if file_sha256(candidate) == file_sha256(src):
+                    return None
+                n += 1
+                candidate = f'{base} ({n}){ext}'
+                continue
+            os.rename(src, candidate)
+            return candidate
+        os.unlink(src)
+        return candidate
+
+
+def rename_statements(folder_path: str, dry_run: bool = False, jobs: int = None, force: bool = False) -> int:
+    """Rename all statement PDFs in a folder. Returns the number of PDFs that could not be renamed."""
+    manifest = {} if force else load_manifest(folder_path)
+    pdf_files = sorted(os.path.basename(p) for p in glob.glob(os.path.join(folder_path, '*.pdf')))
+    todo = [f for f in pdf_files if not is_unchanged(manifest, folder_path, f)]
+    skipped = len(pdf_files) - len(todo)
+    if skipped:
+        print(f'Skipping {skipped} file(s) recorded in {MANIFEST_NAME}')
+    if not todo:
+        return 0
+
+    paths = [os.path.join(folder_path, f) for f in todo]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        records = list(executor.map(scan_statement, paths, chunksize=max(1, len(paths) // 64)))
+
+    failures = 0
+    for filename, record in zip(todo, records):
+        src = os.path.join(folder_path, filename)
+        new_name = statement_filename(record)
+        if new_name is None:
+            failures += 1
+            print(f"Not renamed: {filename} ({record.get('error') or 'missing period or account'})")
+            if not dry_run:
+                manifest[filename] = dict(file_signature(src), status='unrecognised', error=record.get('error'))
+            continue
+        if new_name == filename:
+            if not dry_run:
+                manifest[filename] = dict(file_signature(src), status='renamed', original=filename)
+            continue
+        if dry_run:
+            print(f'Would rename: {filename} -> {new_name}')
+            continue
+        final_path = safe_rename(src, os.path.join(folder_path, new_name))
+        if final_path is None:
+            print(f'Duplicate of existing {new_name}: {filename} left in place')
+            manifest[filename] = dict(file_signature(src), status='duplicate', duplicate_of=new_name)
+            continue
+        final_name = os.path.basename(final_path)
+        manifest.pop(filename, None)
+        manifest[final_name] = dict(file_signature(final_path), status='renamed', original=filename)
+        print(f'Renamed: {filename} -> {final_name}')
+
+    if not dry_run:
+        save_manifest(folder_path, manifest)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rename CBA/NAB statement PDFs to "YYYY-MM-DD <bank> <type> <account>.pdf"')
+    parser.add_argument('folder', help='Folder containing statement PDFs')
+    parser.add_argument('--dry-run', action='store_true', help='Show the new names without renaming anything')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help=f'Ignore {MANIFEST_NAME} and re-scan every PDF')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f'Error: Folder not found: {args.folder}', file=sys.stderr)
+        sys.exit(1)
+
+    failures = rename_statements(args.folder, args.dry_run, args.jobs, args.force)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
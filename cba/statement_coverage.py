@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Statement coverage index: which periods each account's statements cover.
+
+Builds, per account, a list of statement intervals (period start/end, opening
+and closing balance, source PDF) sorted by start date, from the .meta.json
+sidecars written by the statement parsers. From that it can:
+
+- list the statements covering a given date (bisect on the sorted starts)
+- list gaps between consecutive statements
+- list overlapping statements
+- check closing balance -> next opening balance continuity
+
+Gaps, overlaps and continuity for the whole corpus are found in one pass over
+each account's sorted intervals.
+
+Usage:
+    python3 cba/statement_coverage.py /path/to/folder
+    python3 cba/statement_coverage.py catalogue.jsonl      # from cba_auto2tsv.py --metadata-only
+    python3 cba/statement_coverage.py /path/to/folder --date 2021-10-05 [--account "06 2692 46879707"]
+
+Exit status is 1 if any gap or continuity break is found, so it can gate a build.
+"""
+import sys
+import os
+import glob
+import json
+import argparse
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
+
+try:
+    from statement_metadata import SIDECAR_SUFFIX, read_sidecar
+except ImportError:
+    from cba.statement_metadata import SIDECAR_SUFFIX, read_sidecar
+
+# Balances closer than this are treated as equal (floating point rounding of cents)
+BALANCE_TOLERANCE = 0.005
+
+
+class StatementInterval(NamedTuple):
+    start: date
+    end: date
+    opening_balance: Optional[float]
+    closing_balance: Optional[float]
+    source: str
+
+
+class CoverageIndex:
+    """Sorted interval structure of statement periods per account."""
+
+    def __init__(self):
+        self._intervals = {}   # {account: [StatementInterval]} sorted by (start, end)
+        self._starts = {}      # {account: [start]} parallel to _intervals, for bisect
+        self._max_ends = {}    # {account: [max end of intervals[0..i]]}, bounds stabbing queries
+        self._pending = {}     # {account: [StatementInterval]} added since the last sort
+
+    def add(self, account: str, start: date, end: date, opening_balance: Optional[float] = None,
+            closing_balance: Optional[float] = None, source: str = ''):
+        """Add one statement period. Intervals are sorted lazily on the next query."""
+        if start is None or end is None:
+            return
+        account = ' '.join((account or '').split())
+        self._pending.setdefault(account, []).append(
+            StatementInterval(start, end, opening_balance, closing_balance, source))
+
+    def add_record(self, record: dict, source: Optional[str] = None) -> bool:
+        """Add a sidecar-style record (period_start/period_end as ISO strings). Returns False if it has no period."""
+        try:
+            start = date.fromisoformat(record['period_start'])
+            end = date.fromisoformat(record['period_end'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        self.add(record.get('account', ''), start, end, record.get('opening_balance'),
+                 record.get('closing_balance'), source or record.get('source_pdf', ''))
+        return True
+
+    def _sorted(self, account: str):
+        """Return the sorted intervals for an account, merging in any pending additions."""
+        pending = self._pending.pop(account, None)
+        if pending:
+            intervals = sorted(self._intervals.get(account, []) + pending, key=lambda iv: (iv.start, iv.end, iv.source))
+            self._intervals[account] = intervals
+            self._starts[account] = [iv.start for iv in intervals]
+            max_ends = []
+            running = None
+            for iv in intervals:
+                running = iv.end if running is None or iv.end > running else running
+                max_ends.append(running)
+            self._max_ends[account] = max_ends
+        return self._intervals.get(account, [])
+
+    def accounts(self) -> list:
+        return sorted(set(self._intervals) | set(self._pending))
+
+    def intervals(self, account: str) -> list:
+        return list(self._sorted(account))
+
+    def covering(self, account: str, when: date) -> list:
+        """Return the source PDFs of statements whose period includes `when`."""
+        intervals = self._sorted(account)
+        if not intervals:
+            return []
+        starts = self._starts[account]
+        max_ends = self._max_ends[account]
+        # Only intervals starting on or before `when` can cover it; walk back while
+        # some earlier interval could still reach `when`
+        i = bisect_right(starts, when) - 1
+        found = []
+        while i >= 0 and max_ends[i] >= when:
+            if intervals[i].end >= when:
+                found.append(intervals[i].source)
+            i -= 1
+        found.reverse()
+        return found
+
+    def check_account(self, account: str) -> dict:
+        """
+        Walk one account's sorted intervals once and return
+        {'gaps': [(first_missing_day, last_missing_day)],
+         'overlaps': [(source_a, source_b)],
+         'breaks': [(source_a, closing_balance, source_b, opening_balance)]}.
+        """
+        gaps = []
+        overlaps = []
+        breaks = []
+        covered_to = None      # latest end date seen so far
+        covered_by = None      # interval that reaches covered_to
+        for iv in self._sorted(account):
+            if covered_to is not None:
+                if iv.start > covered_to + timedelta(days=1):
+                    gaps.append((covered_to + timedelta(days=1), iv.start - timedelta(days=1)))
+                if iv.start <= covered_to:
+                    overlaps.append((covered_by.source, iv.source))
+                elif (covered_by.closing_balance is not None and iv.opening_balance is not None
+                        and abs(covered_by.closing_balance - iv.opening_balance) > BALANCE_TOLERANCE):
+                    # Closing -> opening continuity between consecutive (non-overlapping) statements
+                    breaks.append((covered_by.source, covered_by.closing_balance, iv.source, iv.opening_balance))
+            if covered_to is None or iv.end >= covered_to:
+                covered_to = iv.end
+                covered_by = iv
+        return {'gaps': gaps, 'overlaps': overlaps, 'breaks': breaks}
+
+    def check(self) -> dict:
+        """Return {account: check_account(account)} for every account in the corpus."""
+        return {account: self.check_account(account) for account in self.accounts()}
+
+
+def build_index_from_sidecars(folder_path: str) -> CoverageIndex:
+    """Build a CoverageIndex from all .meta.json sidecars in a folder."""
+    index = CoverageIndex()
+    for path in sorted(glob.glob(os.path.join(folder_path, '*' + SIDECAR_SUFFIX))):
+        meta = read_sidecar(path)
+        if meta is None:
+            continue
+        if not index.add_record(meta):
+            print(f'Warning: no statement period in {os.path.basename(path)}', file=sys.stderr)
+    return index
+
+
+def build_index_from_jsonl(jsonl_path: str) -> CoverageIndex:
+    """Build a CoverageIndex from the JSON lines written by `cba_auto2tsv.py --metadata-only`."""
+    index = CoverageIndex()
+    with open(jsonl_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('error'):
+                continue
+            if not index.add_record(record):
+                print(f"Warning: no statement period in {record.get('source_pdf', '?')}", file=sys.stderr)
+    return index
+
+
+def print_report(index: CoverageIndex, accounts: list) -> bool:
+    """Print gaps, overlaps and balance breaks. Returns True if the coverage is clean."""
+    clean = True
+    for account in accounts:
+        intervals = index.intervals(account)
+        if not intervals:
+            continue
+        result = index.check_account(account)
+        print(f'{account}: {len(intervals)} statement(s), '
+              f'{intervals[0].start.isoformat()} to {max(iv.end for iv in intervals).isoformat()}')
+        for first, last in result['gaps']:
+            clean = False
+            print(f'  ✗ gap: {first.isoformat()} to {last.isoformat()} ({(last - first).days + 1} day(s))')
+        for source_a, source_b in result['overlaps']:
+            print(f'  ⚠ overlap: {source_a} and {source_b}')
+        for source_a, closing, source_b, opening in result['breaks']:
+            clean = False
+            print(f'  ✗ balance break: {source_a} closes {closing:.2f}, {source_b} opens {opening:.2f}')
+        if not any(result.values()):
+            print('  ✓ continuous')
+    return clean
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report statement coverage gaps, overlaps and balance continuity')
+    parser.add_argument('folder', help='Folder containing .meta.json statement sidecars, or a --metadata-only .jsonl catalogue')
+    parser.add_argument('--account', help='Only report this account/card number')
+    parser.add_argument('--date', help='List statements covering this date (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    if os.path.isfile(args.folder):
+        index = build_index_from_jsonl(args.folder)
+    elif os.path.isdir(args.folder):
+        index = build_index_from_sidecars(args.folder)
+    else:
+        print(f'Error: Folder not found: {args.folder}', file=sys.stderr)
+        sys.exit(1)
+
+    accounts = [' '.join(args.account.split())] if args.account else index.accounts()
+    if not accounts:
+        print(f'No statement sidecars found in {args.folder}', file=sys.stderr)
+        sys.exit(1)
+
+    if args.date:
+        when = date.fromisoformat(args.date)
+        for account in accounts:
+            for source in index.covering(account, when):
+                print(f'{account}\t{source}')
+        return
+
+    if not print_report(index, accounts):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
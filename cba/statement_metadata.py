@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Statement metadata sidecar files.
+
+Each statement parser writes a small JSON file next to its TSV output
+(Statement.tsv -> Statement.meta.json) describing the statement:
+
+    bank, statement_type, account, period, period_start, period_end,
+    opening_balance, closing_balance, row_count, parser, parser_version,
+    source_pdf, source_pdf_sha256, tsv
+
+Aggregation, gap detection and incremental rebuilds can plan from these
+sidecars without opening the TSVs or re-reading the PDFs.
+
+Usage:
+    python3 cba/statement_metadata.py Statement.meta.json [...]   # pretty-print sidecars
+"""
+import sys
+import os
+import re
+import json
+import hashlib
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+SIDECAR_SUFFIX = '.meta.json'
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+
+def sidecar_path(tsv_path: str) -> str:
+    """Return the sidecar path for a TSV (Statement.tsv -> Statement.meta.json)."""
+    return os.path.splitext(tsv_path)[0] + SIDECAR_SUFFIX
+
+
+def file_sha256(path: str) -> str:
+    """Return the hex SHA-256 of a file, read in 1 MB chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_statement_date(date_str: str) -> Optional[date]:
+    """
+    Parse a statement date such as "24 Aug 2020", "20 November 2024" or "Dec 17, 2021".
+    Returns a datetime.date, or None if the string is not recognised.
+    """
+    if not date_str:
+        return None
+    s = date_str.strip().replace(',', '')
+    m = re.match(r'^(\d{1,2})\s+([A-Za-z]{3,})\s+(\d{4})$', s)
+    if m:
+        day, mon, year = m.group(1), m.group(2), m.group(3)
+    else:
+        m = re.match(r'^([A-Za-z]{3,})\s+(\d{1,2})\s+(\d{4})$', s)
+        if not m:
+            return None
+        mon, day, year = m.group(1), m.group(2), m.group(3)
+    month = MONTHS.get(mon.lower()[:3])
+    if month is None:
+        return None
+    try:
+        return date(int(year), month, int(day))
+    except ValueError:
+        return None
+
+
+def parse_period(period_string: str) -> Tuple[Optional[date], Optional[date]]:
+    """Split a period string like "24 Aug 2020 - 31 Dec 2020" into (start, end) dates."""
+    if not period_string or '-' not in period_string:
+        return None, None
+    start_str, _, end_str = period_string.partition('-')
+    return parse_statement_date(start_str), parse_statement_date(end_str)
+
+
+def balances_from_rows(rows: list) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Derive (opening_balance, closing_balance) from parsed [date, transaction, amount, balance] rows.
+    The opening balance is the first row's balance less its amount.
+    """
+    opening_balance = None
+    closing_balance = None
+    if rows:
+        _, _, amount, balance = rows[0][:4]
+        if amount is not None and balance is not None:
+            opening_balance = round(balance - amount, 2)
+        for row in reversed(rows):
+            if row[3] is not None:
+                closing_balance = round(row[3], 2)
+                break
+    return opening_balance, closing_balance
+
+
+def build_sidecar(pdf_path: str, tsv_path: str, bank: str, statement_type: str, account: str,
+                  period_string: Optional[str], opening_balance: Optional[float],
+                  closing_balance: Optional[float], row_count: int, parser: str,
+                  parser_version: str) -> dict:
+    """Assemble the sidecar dictionary for one parsed statement."""
+    period_start, period_end = parse_period(period_string or '')
+    return {
+        'bank': bank,
+        'statement_type': statement_type,
+        'account': ' '.join((account or '').split()),
+        'period': period_string or '',
+        'period_start': period_start.isoformat() if period_start else None,
+        'period_end': period_end.isoformat() if period_end else None,
+        'opening_balance': opening_balance,
+        'closing_balance': closing_balance,
+        'row_count': row_count,
+        'parser': parser,
+        'parser_version': parser_version,
+        'source_pdf': os.path.basename(pdf_path),
+        'source_pdf_sha256': file_sha256(pdf_path),
+        'tsv': os.path.basename(tsv_path),
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def write_sidecar(tsv_path: str, metadata: dict) -> str:
+    """Atomically write the sidecar for tsv_path. Returns the sidecar path."""
+    path = sidecar_path(tsv_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_sidecar(tsv_path: str) -> Optional[dict]:
+    """Return the sidecar for tsv_path (or a .meta.json path itself), or None if missing/unreadable."""
+    path = tsv_path if tsv_path.endswith(SIDECAR_SUFFIX) else sidecar_path(tsv_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'Warning: could not read sidecar {path}: {e}', file=sys.stderr)
+        return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python3 statement_metadata.py Statement.meta.json [...]', file=sys.stderr)
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        meta = read_sidecar(path)
+        if meta is None:
+            print(f'{path}: no sidecar', file=sys.stderr)
+            continue
+        print(json.dumps(meta, indent=2))
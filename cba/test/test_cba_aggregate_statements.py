@@ -0,0 +1,47 @@
+import pandas as pd
+from cba.cba_aggregate_statements import dedupe_transactions
+
+
+def _statement(source, rows):
+    df = pd.DataFrame(rows, columns=['Date', 'Account Number', 'Transaction', 'Amount', 'Balance'])
+    df['Source File'] = source
+    return df
+
+
+def test_dedupe_removes_overlap_between_statements():
+    """A mid-cycle statement overlapping a full-month one should only contribute its rows once."""
+    mid_cycle = _statement('Statement20220315.tsv', [
+        ['01/03/2022', '06 2692 46879707', 'COLES 0123 BOWRAL', '-12.50', '987.50'],
+        ['02/03/2022', '06 2692 46879707', 'Direct Credit  PAYPAL', '20.00', '1007.50'],
+    ])
+    full_month = _statement('Statement20220331.tsv', [
+        ['01/03/2022', '06 2692 46879707', 'COLES 0123 BOWRAL', '-12.50', '987.50'],
+        ['02/03/2022', '06 2692 46879707', 'Direct Credit PAYPAL', '20.00', '1007.50'],
+        ['20/03/2022', '06 2692 46879707', 'BUNNINGS 697000', '-30.00', '977.50'],
+    ])
+    combined = pd.concat([mid_cycle, full_month], ignore_index=True)
+
+    kept, removed = dedupe_transactions(combined, '06 2692 46879707')
+
+    assert len(kept) == 3
+    assert len(removed) == 2
+    assert set(removed['Duplicate Of']) == {'Statement20220331.tsv'}
+
+
+def test_dedupe_keeps_genuine_same_day_repeats():
+    """Identical purchases on the same day differ by running balance, or repeat within one statement."""
+    statement = _statement('Statement20220331.tsv', [
+        ['05/03/2022', '06 2692 46879707', 'CAFFE ROSSO BOWRAL', '-4.50', '995.50'],
+        ['05/03/2022', '06 2692 46879707', 'CAFFE ROSSO BOWRAL', '-4.50', '991.00'],
+        ['06/03/2022', '06 2692 46879707', 'PARKING', '-2.00', None],
+        ['06/03/2022', '06 2692 46879707', 'PARKING', '-2.00', None],
+    ])
+    saved_twice = statement.copy()
+    saved_twice['Source File'] = 'Statement20220331 (1).tsv'
+    combined = pd.concat([statement, saved_twice], ignore_index=True)
+
+    kept, removed = dedupe_transactions(combined, '06 2692 46879707')
+
+    assert len(kept) == 4
+    assert (kept['Source File'] == 'Statement20220331.tsv').all()
+    assert len(removed) == 4
@@ -0,0 +1,71 @@
+import os
+import json
+import subprocess
+import sys
+
+import cba.cba_auto2tsv as auto
+from cba.cba_auto2tsv import find_first_page_balance, scan_metadata
+
+TEST_DIR = os.path.dirname(__file__)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(TEST_DIR)))
+
+
+def test_find_first_page_balance_signs():
+    lines = [
+        'Loan snapshot  Opening balance 25 August 2020',
+        'Nil',
+        'Closing balance 4 November 2020 in debit',
+        '$612,492.80',
+    ]
+    assert find_first_page_balance(lines, 'opening balance') == 0.0
+    assert find_first_page_balance(lines, 'closing balance') == -612492.80
+    assert find_first_page_balance(['Closing Balance', '$1,304.30 CR'], 'closing balance') == 1304.30
+    assert find_first_page_balance(['Statement period'], 'closing balance') is None
+
+
+def test_scan_metadata_reads_first_page_only_fields():
+    record = scan_metadata(os.path.join(TEST_DIR, 'Statement20201231_offset.pdf'))
+    assert record['error'] is None
+    assert record['statement_type'] == 'offset'
+    assert record['account'] == '06 2799 12928793'
+    assert (record['period_start'], record['period_end']) == ('2020-08-24', '2020-12-31')
+    assert (record['opening_balance'], record['closing_balance']) == (0.0, 8835.67)
+
+
+def test_scan_metadata_youthsaver_balances_match_the_full_parse():
+    from cba.cba_youthsaver2tsv import extract_first_page_info, parse_transactions
+    from cba.statement_metadata import balances_from_rows
+
+    # Youth Saver statements open with a letter; the balances are rows of the transaction list
+    for name in ('Statement20211016_YouthSaver.pdf', 'Statement20220416_YouthSaver.pdf'):
+        pdf_path = os.path.join(TEST_DIR, name)
+        record = scan_metadata(pdf_path)
+        assert record['statement_type'] == 'youthsaver'
+        account, _, year = extract_first_page_info(pdf_path)
+        expected = balances_from_rows(parse_transactions(pdf_path, account, year))
+        assert (record['opening_balance'], record['closing_balance']) == expected, name
+        assert None not in expected
+
+
+def test_scan_metadata_opens_each_pdf_once(monkeypatch):
+    opened = []
+    fitz_open = auto.fitz.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args)
+        return fitz_open(*args, **kwargs)
+
+    # The parser modules share the same pymupdf module object
+    monkeypatch.setattr(auto.fitz, 'open', counting_open)
+    for name in ('Statement20201231_offset.pdf', 'Statement20220328_SmartAccess.pdf'):
+        opened.clear()
+        assert scan_metadata(os.path.join(TEST_DIR, name))['error'] is None
+        assert len(opened) == 1, name
+
+
+def test_metadata_only_stdout_is_jsonl():
+    pdfs = [os.path.join(TEST_DIR, name) for name in ('Statement20201231_offset.pdf', 'Statement20220328_SmartAccess.pdf')]
+    result = subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'cba', 'cba_auto2tsv.py'), '--metadata-only',
+                             '--jobs', '2', *pdfs], capture_output=True, text=True, check=True)
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [record['source_pdf'] for record in records] == [os.path.basename(p) for p in pdfs]
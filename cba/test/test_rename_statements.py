@@ -0,0 +1,28 @@
+from cba.rename_statements import statement_filename, safe_rename
+
+
+def test_statement_filename():
+    record = {'bank': 'CBA', 'statement_type': 'smartaccess', 'account': '06 2692 46879707',
+              'period_end': '2022-03-28', 'error': None}
+    assert statement_filename(record) == '2022-03-28 CBA smartaccess 06269246879707.pdf'
+    assert statement_filename(dict(record, error='Could not detect statement type')) is None
+    assert statement_filename(dict(record, period_end=None)) is None
+
+
+def test_safe_rename_never_overwrites(tmp_path):
+    target = tmp_path / '2022-03-28 CBA smartaccess 06269246879707.pdf'
+    target.write_bytes(b'statement A')
+    same = tmp_path / 'Statement20220328.pdf'
+    same.write_bytes(b'statement A')
+    different = tmp_path / 'Statement20220328 (1).pdf'
+    different.write_bytes(b'statement B')
+
+    # Identical content: duplicate download, left in place
+    assert safe_rename(str(same), str(target)) is None
+    assert same.exists()
+
+    # Different content: suffixed, original target untouched
+    final = safe_rename(str(different), str(target))
+    assert final.endswith('2022-03-28 CBA smartaccess 06269246879707 (2).pdf')
+    assert not different.exists()
+    assert target.read_bytes() == b'statement A'
@@ -0,0 +1,29 @@
+from datetime import date
+from cba.statement_coverage import CoverageIndex
+
+
+def _index():
+    index = CoverageIndex()
+    account = '06 2692 46879707'
+    # Added out of order; one statement saved twice, a gap, and a balance break
+    index.add(account, date(2021, 10, 29), date(2021, 11, 28), 100.00, 150.00, 'Statement20211128.pdf')
+    index.add(account, date(2021, 9, 28), date(2021, 10, 28), 0.00, 100.00, 'Statement20211028.pdf')
+    index.add(account, date(2021, 9, 28), date(2021, 10, 28), 0.00, 100.00, 'Statement20211028 (1).pdf')
+    index.add(account, date(2022, 1, 29), date(2022, 2, 28), 175.00, 180.00, 'Statement20220228.pdf')
+    return index, account
+
+
+def test_covering_date_lookup():
+    index, account = _index()
+    assert index.covering(account, date(2021, 10, 5)) == ['Statement20211028 (1).pdf', 'Statement20211028.pdf']
+    assert index.covering(account, date(2021, 10, 29)) == ['Statement20211128.pdf']
+    assert index.covering(account, date(2021, 12, 25)) == []
+    assert index.covering('unknown', date(2021, 10, 5)) == []
+
+
+def test_gaps_overlaps_and_balance_breaks():
+    index, account = _index()
+    result = index.check()[account]
+    assert result['gaps'] == [(date(2021, 11, 29), date(2022, 1, 28))]
+    assert result['overlaps'] == [('Statement20211028 (1).pdf', 'Statement20211028.pdf')]
+    assert result['breaks'] == [('Statement20211128.pdf', 150.00, 'Statement20220228.pdf', 175.00)]
@@ -0,0 +1,27 @@
+import json
+from datetime import date
+from cba.statement_metadata import parse_period, balances_from_rows, write_sidecar, read_sidecar, sidecar_path
+
+
+def test_parse_period_formats():
+    """CBA, CBA Mastercard and NAB period strings all parse to (start, end) dates."""
+    assert parse_period('24 Aug 2020 - 31 Dec 2020') == (date(2020, 8, 24), date(2020, 12, 31))
+    assert parse_period('Dec 17, 2021 - Jan 17, 2022') == (date(2021, 12, 17), date(2022, 1, 17))
+    assert parse_period('17 May 2024 - 20 November 2024') == (date(2024, 5, 17), date(2024, 11, 20))
+    assert parse_period('') == (None, None)
+
+
+def test_balances_from_rows_and_sidecar_round_trip(tmp_path):
+    rows = [
+        ['29/09/2021', 'Direct Credit', 471.78, 471.78],
+        ['05/10/2021', 'BPAY', -4.40, 467.38],
+        ['06/10/2021', 'Interest', 0.01, None],
+    ]
+    assert balances_from_rows(rows) == (0.0, 467.38)
+    assert balances_from_rows([]) == (None, None)
+
+    tsv_path = str(tmp_path / 'Statement20211028.tsv')
+    path = write_sidecar(tsv_path, {'account': '06 2692 46879707', 'row_count': 3})
+    assert path == sidecar_path(tsv_path)
+    assert path.endswith('Statement20211028.meta.json')
+    assert read_sidecar(tsv_path) == json.load(open(path))
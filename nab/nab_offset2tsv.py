@@ -10,6 +10,7 @@ nab_offset2tsv.sh, a wrapper script that runs the script with the correct virtua
 
 """
 import sys
+import os
 import re
 import argparse
 from typing import Optional, Tuple
@@ -19,6 +20,16 @@ try:
 except Exception:
     fitz = None
 
+# The .meta.json sidecar format is shared with the CBA parsers in ../cba
+try:
+    from cba.statement_metadata import build_sidecar, write_sidecar, balances_from_rows
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from cba.statement_metadata import build_sidecar, write_sidecar, balances_from_rows
+
+# Bump when parsing changes in a way that alters the TSV output (recorded in the .meta.json sidecar)
+PARSER_VERSION = '1.0'
+
 
 def extract_text_from_page(page) -> str:
     """Extract text from a PDF page, skipping image blocks."""
@@ -1178,6 +1189,12 @@ def main():
     with open(output_path, 'w') as f:
         write_tsv(rows, account_number or '', f)
     
+    # Write the .meta.json sidecar next to the TSV
+    opening_balance, closing_balance = balances_from_rows(rows)
+    metadata = build_sidecar(args.pdf, output_path, 'NAB', 'offset', account_number or '', period_string,
+                             opening_balance, closing_balance, len(rows), 'nab_offset2tsv', PARSER_VERSION)
+    write_sidecar(output_path, metadata)
+    
     if args.debug:
         print(f'Output written to: {output_path}', file=sys.stderr)
 